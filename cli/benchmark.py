@@ -0,0 +1,144 @@
+import copy
+import random
+import time
+
+import click
+import orjson as json
+
+from cross_arbitrage.fetch.agg_orderbook import (EntrySplicer,
+                                                 raw_orderbook_stamps)
+from cross_arbitrage.fetch.utils.common import ts_to_str
+from cross_arbitrage.fetch.utils.orderbook import (book_array, best_price,
+                                                   level_price_decimal,
+                                                   normalize_levels_to_ticks,
+                                                   normalize_orderbook_5)
+
+
+def _timeit(fn, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number
+
+
+def _report(name, seconds, baseline=None):
+    line = f"{name:<36} {seconds * 1e6:>10.2f} us/op"
+    if baseline:
+        line += f"  x{baseline / seconds:.2f}"
+    click.echo(line)
+
+
+def _binance_depth5_levels(price: float, tick: float, depth=5):
+    return [
+        [f"{price + i * tick:.8f}".rstrip("0"), f"{random.uniform(0.001, 50):.3f}"]
+        for i in range(depth)
+    ]
+
+
+@click.group()
+def main():
+    pass
+
+
+@main.command("normalize")
+@click.option("--number", "-n", default=20000, help="iterations")
+@click.option("--multiplier", "-m", default=1000, help="binance symbol multiplier")
+def normalize(number: int, multiplier: int):
+    """
+    decimal string vs integer tick orderbook normalization and reading
+    """
+    exchange_tick = 0.0000001
+    tick = exchange_tick / multiplier
+    bids = _binance_depth5_levels(0.0015123, -exchange_tick)
+    asks = _binance_depth5_levels(0.0015124, exchange_tick)
+
+    def str_path():
+        ob = {
+            "bids": normalize_orderbook_5(copy.deepcopy(bids), multiplier),
+            "asks": normalize_orderbook_5(copy.deepcopy(asks), multiplier),
+        }
+        ob = json.loads(json.dumps(ob))
+        best_price(ob, "asks")
+        level_price_decimal(ob, "asks")
+        book_array(ob, "bids")
+
+    def tick_path():
+        ob = {
+            "tick": tick,
+            "bids": normalize_levels_to_ticks(bids, exchange_tick),
+            "asks": normalize_levels_to_ticks(asks, exchange_tick),
+        }
+        ob = json.loads(json.dumps(ob))
+        best_price(ob, "asks")
+        level_price_decimal(ob, "asks")
+        book_array(ob, "bids")
+
+    def str_normalize():
+        normalize_orderbook_5(copy.deepcopy(bids), multiplier)
+
+    def tick_normalize():
+        normalize_levels_to_ticks(bids, exchange_tick)
+
+    base = _timeit(str_normalize, number)
+    _report("normalize 5 levels (str/Decimal)", base)
+    _report("normalize 5 levels (tick)", _timeit(tick_normalize, number), base)
+    base = _timeit(str_path, number)
+    _report("end to end (str/Decimal)", base)
+    _report("end to end (tick)", _timeit(tick_path, number), base)
+
+
+
+@main.command("agg")
+@click.option("--number", "-n", default=50000, help="iterations")
+@click.option("--levels", "-l", default=5, help="levels per side")
+def agg(number: int, levels: int):
+    """
+    aggregated entry of two serialized legs: decode and re-encode vs splice
+    """
+    now = time.time() * 1000
+    exchanges = ["okex", "binance"]
+    raws = [
+        json.dumps({
+            "ex": ex,
+            "symbol": "BTC/USDT",
+            "ts": int(now),
+            "tick": 0.1,
+            "bids": [[300000 - i, random.uniform(0.001, 50)] for i in range(levels)],
+            "asks": [[300001 + i, random.uniform(0.001, 50)] for i in range(levels)],
+            "recv_ts": now + 3.125,
+            "decode_ts": now + 3.25,
+            "publish_ts": now + 3.5,
+        })
+        for ex in exchanges
+    ]
+    ts = int(now) + 4
+    splicer = EntrySplicer(exchanges)
+
+    def decode_path():
+        order_book = {
+            "symbol": "BTC/USDT",
+            "ts": ts,
+            "datetime": ts_to_str(ts / 1000),
+            "exchange": "okex",
+        }
+        for ex, raw in zip(exchanges, raws):
+            order_book[ex] = json.loads(raw)
+        order_book["okex"].get("publish_ts")
+        return json.dumps(order_book)
+
+    def splice_path():
+        raw_orderbook_stamps(raws[0])
+        return splicer.splice("BTC/USDT", ts, "okex", raws)
+
+    base = _timeit(decode_path, number)
+    _report("agg entry (decode/re-encode)", base)
+    splice = _timeit(splice_path, number)
+    _report("agg entry (splice)", splice, base)
+    click.echo(
+        f"per core: {1 / base:,.0f} -> {1 / splice:,.0f} entries/s, "
+        f"{len(decode_path())} -> {len(splice_path())} bytes"
+    )
+
+
+if __name__ == "__main__":
+    main()
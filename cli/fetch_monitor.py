@@ -11,7 +11,9 @@ import redis
 from cross_arbitrage.fetch.config import get_config
 
 from cross_arbitrage.fetch.utils.common import base_name, get_project_root
+from cross_arbitrage.utils.clock import exchange_to_local_ms, start_clock_sync
 from cross_arbitrage.utils.context import CancelContext
+from cross_arbitrage.utils.exchange import create_exchange
 from cross_arbitrage.utils.logger import init_logger
 
 
@@ -42,6 +44,8 @@ def main(env: str):
     logger.setLevel(getattr(logging, config.log.level.upper()))
 
     config.print()
+    if config.redis.symbol_streams():
+        logging.warning("binary symbol streams are not shown, only the json orderbook stream")
 
     global redis_client
     if hasattr(config, "redis"):
@@ -62,6 +66,16 @@ def main(env: str):
     signal.signal(signal.SIGINT, _exit)
     signal.signal(signal.SIGTERM, _exit)
 
+    # exchange timestamps are compared on the local clock
+    start_clock_sync(
+        cancel_ctx,
+        {
+            ex_name: create_exchange(account, proxy=config.network.proxies())
+            for ex_name, account in config.exchanges.items()
+        },
+        "fetch_monitor",
+    )
+
     while True:
         if cancel_ctx.is_canceled():
             logging.info('exiting...')
@@ -79,14 +93,17 @@ def main(env: str):
                 current_ts = int(time.time() * 1000)
                 mdata = {
                     "process_ts": obj["ts"],
-                    "binance_ts": obj["binance"]["ts"],
-                    "okex_ts": int(obj["okex"]["ts"]),
+                    "binance_ts": int(exchange_to_local_ms("binance", obj["binance"]["ts"])),
+                    "okex_ts": int(exchange_to_local_ms("okex", obj["okex"]["ts"])),
                     "current_ts": current_ts,
                 }
                 # print(mdata)
-                logging.info(
-                        f"{symbol:>12} {current_ts} {(mdata['current_ts'] - mdata['process_ts']):>3}ms    bn diff: {(mdata['process_ts'] - mdata['binance_ts']):>4}ms   ok diff: {(mdata['process_ts'] - mdata['okex_ts']):>4}ms"
-            )
+                line = f"{symbol:>12} {current_ts} {(mdata['current_ts'] - mdata['process_ts']):>3}ms    bn diff: {(mdata['process_ts'] - mdata['binance_ts']):>4}ms   ok diff: {(mdata['process_ts'] - mdata['okex_ts']):>4}ms"
+                # with bbo feeds, how much newer the book is than the depth channel alone
+                for ex_name, short_name in [("binance", "bn"), ("okex", "ok")]:
+                    if "depth_ts" in obj[ex_name]:
+                        line += f"   {short_name} bbo gain: {(int(obj[ex_name]['ts']) - obj[ex_name]['depth_ts']):>4}ms"
+                logging.info(line)
         except Exception as ex:
             logging.error(ex)
 
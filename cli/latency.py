@@ -0,0 +1,74 @@
+import logging
+import time
+from os.path import exists, join
+
+import click
+import redis
+
+from cross_arbitrage.fetch.config import get_config
+from cross_arbitrage.fetch.utils.common import base_name, get_project_root
+from cross_arbitrage.utils.latency import (LATENCY_STAGES, get_latency_key,
+                                           load_latency_histograms)
+from cross_arbitrage.utils.logger import init_logger
+
+
+def _print_histograms(rc: redis.Redis, exchange: str, symbol: str):
+    histograms = load_latency_histograms(rc, exchange, symbol)
+    click.echo(
+        f"{'exchange':<8} {'symbol':<12} {'stage':<14} {'count':>10} "
+        f"{'p50':>10} {'p90':>10} {'p99':>10}"
+    )
+    stage_order = {stage: i for i, stage in enumerate(LATENCY_STAGES)}
+    for (ex_name, symbol_name, stage), hist in sorted(
+        histograms.items(),
+        key=lambda x: (x[0][0], x[0][1], stage_order.get(x[0][2], len(stage_order))),
+    ):
+        click.echo(
+            f"{ex_name:<8} {symbol_name:<12} {stage:<14} {hist.total:>10} "
+            + " ".join(f"{hist.percentile(q):>8.2f}ms" for q in (0.5, 0.9, 0.99))
+        )
+
+
+# entry
+@click.command()
+@click.option("--env", "-e", help="use a environment", default="dev")
+@click.option("--exchange", "-x", default="*", help="exchange name, glob pattern")
+@click.option("--symbol", "-s", default="*", help="symbol name, glob pattern")
+@click.option("--interval", "-i", default=0.0, help="refresh every n seconds, 0 to print once")
+@click.option("--reset", is_flag=True, help="delete the matched histograms")
+def main(env: str, exchange: str, symbol: str, interval: float, reset: bool):
+    logger = init_logger(base_name(__file__))
+
+    config_files = [
+        join(get_project_root(), "configs/common_config.json"),
+    ]
+    if env:
+        file_path = join(
+            get_project_root(), f"configs/fetch_config.{env.lower()}.json"
+        )
+        if exists(file_path):
+            config_files.append(file_path)
+        else:
+            logging.info(f"-- config file {file_path} is not exist, skipping")
+
+    config = get_config(file_path=config_files, env=env)
+    logger.setLevel(getattr(logging, config.log.level.upper()))
+    rc = redis.Redis.from_url(config.redis.url)
+
+    if reset:
+        keys = list(rc.scan_iter(match=get_latency_key(exchange, symbol)))
+        if keys:
+            rc.delete(*keys)
+        click.echo(f"deleted {len(keys)} histograms")
+        return
+
+    while True:
+        _print_histograms(rc, exchange, symbol)
+        if interval <= 0:
+            break
+        time.sleep(interval)
+        click.echo()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import logging
+import threading
+import time
+from os.path import exists, join
+
+import ccxt
+import click
+import orjson as json
+import redis
+
+from cross_arbitrage.exchange.stub_exchange import stub_exchanges
+from cross_arbitrage.fetch.agg_orderbook import agg_orderbook_mainloop
+from cross_arbitrage.fetch.config import get_config as get_fetch_config
+from cross_arbitrage.fetch.fetch_orderbook import (get_config_symbols,
+                                                   get_partition_number,
+                                                   get_process_task,
+                                                   get_route_key_fn,
+                                                   reset_orderbook_data)
+from cross_arbitrage.fetch.ingest_queue import PartitionedQueue
+from cross_arbitrage.fetch.publish import PublishStats
+from cross_arbitrage.fetch.replay import (StreamProbe, feed_capture,
+                                          replay_report, wait_drained)
+from cross_arbitrage.fetch.utils.common import base_name, get_project_root
+from cross_arbitrage.fetch.utils.orderbook import build_tick_table
+from cross_arbitrage.order import globals as order_globals
+from cross_arbitrage.order.config import get_config as get_order_config
+from cross_arbitrage.order.order import (clear_redis_status, order_loop,
+                                         refresh_account_balance)
+from cross_arbitrage.order.position_status import start_position_mirror
+from cross_arbitrage.order.process_threshold import process_threshold_mainloop
+from cross_arbitrage.order.threshold import Threshold
+from cross_arbitrage.utils.clock import start_clock_sync
+from cross_arbitrage.utils.context import CancelContext
+from cross_arbitrage.utils.exchange import set_exchanges
+from cross_arbitrage.utils.latency import start_latency_recorder
+from cross_arbitrage.utils.logger import init_logger
+from cross_arbitrage.utils.market_meta import start_market_meta
+from cross_arbitrage.utils.symbol_mapping import init_symbol_mapping_from_file
+
+EXCHANGE_NAMES = ["okex", "binance"]
+
+
+def _config_files(prefix: str, env: str, common=()):
+    config_files = [join(get_project_root(), "configs/common_config.json")]
+    config_files.extend(join(get_project_root(), f) for f in common)
+    if env:
+        file_path = join(get_project_root(), f"configs/{prefix}.{env.lower()}.json")
+        if exists(file_path):
+            config_files.append(file_path)
+        else:
+            logging.info(f"-- config file {file_path} is not exist, skipping")
+    return config_files
+
+
+def _start_thread(threads, target, args, name):
+    t = threading.Thread(target=target, args=args, name=name, daemon=True)
+    t.start()
+    threads.append(t)
+
+
+def start_order_side(ctx: CancelContext, env: str, redis_url: str, exchanges: dict, threads: list):
+    """
+    run the threshold and order loops of `start_loop` on the stub exchanges,
+    without the private order status and position streams
+    """
+    config = get_order_config(
+        file_path=_config_files(
+            "order_config", env, ["configs/order_config.common.json"]
+        ),
+        env=env,
+    )
+    config.redis.url = redis_url
+    config.redis.orderbook_stream_format = "json"
+    ctx.set("order_mode", config.order_mode)
+    order_globals.exchanges.update(exchanges)
+    order_globals.set_order_status_stream_is_ready({"replay": True})
+
+    rc = redis.Redis.from_url(redis_url)
+    start_latency_recorder(ctx, redis_url, "replay")
+    start_position_mirror(ctx, redis_url, "replay")
+    clear_redis_status(ctx, rc, config)
+    refresh_account_balance(ctx, exchanges, rc)
+
+    _start_thread(
+        threads, process_threshold_mainloop, (ctx, config),
+        "process_threshold_thread_loop_thread",
+    )
+    thresholds = {
+        ex_name: Threshold(config, rc, makeonly_exchange=ex_name)
+        for ex_name in EXCHANGE_NAMES
+    }
+    for threshold in thresholds.values():
+        _start_thread(
+            threads, threshold.refresh_loop, (ctx, 5),
+            f"{threshold.makeonly_exchange}_threshold_refresh_loop_thread",
+        )
+    _start_thread(
+        threads, order_loop, (ctx, config, thresholds, exchanges, rc),
+        "order_loop_thread",
+    )
+
+
+@click.group()
+def main():
+    pass
+
+
+@main.command("run")
+@click.option("--env", "-e", help="use a environment", default="dev")
+@click.option("--capture-dir", "-d", required=True, help="capture segment directory")
+@click.option("--markets", "-m", required=True, help="markets file from `dump-markets`")
+@click.option("--speed", "-s", default=1.0, help="replay speed, 0 for max speed")
+@click.option("--redis-url", default="redis://127.0.0.1:6379/15", help="local redis")
+@click.option("--order/--no-order", default=True, help="run the order loop on stub exchanges")
+def run(env: str, capture_dir: str, markets: str, speed: float, redis_url: str, order: bool):
+    logger = init_logger(base_name(__file__))
+
+    conf = get_fetch_config(file_path=_config_files("fetch_config", env), env=env)
+    conf.redis.url = redis_url
+    # the stream probe reads the json stream
+    conf.redis.orderbook_stream_format = "json"
+    if conf.agg_mode != "redis":
+        # the replay workers publish to redis, the aggregator reads it there
+        logging.info(f"-- agg_mode {conf.agg_mode} overridden by redis in replay")
+        conf.agg_mode = "redis"
+    logger.setLevel(getattr(logging, conf.log.level.upper()))
+    conf.print()
+    init_symbol_mapping_from_file(join(get_project_root(), "configs/common_config.json"))
+
+    with open(markets, "rb") as f:
+        markets_data = json.loads(f.read())
+    exchanges = {
+        ex_name: stub_exchanges[ex_name](markets_data[ex_name])
+        for ex_name in EXCHANGE_NAMES
+    }
+    # used by the helpers loading their own markets
+    set_exchanges(exchanges)
+
+    config_symbols = get_config_symbols(conf)
+    rc = redis.Redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+    reset_orderbook_data(rc, config_symbols)
+    rc.delete(conf.redis.orderbook_stream)
+
+    cancel_ctx = CancelContext()
+    # the stubs answer the local time, so the agg and order loops do not
+    # estimate offsets against the live exchanges
+    start_clock_sync(cancel_ctx, exchanges, "replay")
+    start_market_meta(cancel_ctx, exchanges, "replay")
+    threads = []
+    task_queues = {}
+    publish_stats = {}
+    partition_number = get_partition_number(conf, len(config_symbols))
+    for ex_name in EXCHANGE_NAMES:
+        tick_table = None
+        if conf.orderbook_price_format == "tick":
+            tick_table = build_tick_table(exchanges[ex_name], ex_name, config_symbols)
+        task_queues[ex_name] = PartitionedQueue(
+            ex_name, partition_number, get_route_key_fn(ex_name)
+        )
+        publish_stats[ex_name] = PublishStats(ex_name)
+        for i in range(partition_number):
+            _start_thread(
+                threads, get_process_task(ex_name),
+                (cancel_ctx, config_symbols, task_queues[ex_name][i], conf,
+                 publish_stats[ex_name], tick_table),
+                f"process_{ex_name}_ws_task_{i}",
+            )
+
+    probe = StreamProbe(redis_url, conf.redis.orderbook_stream)
+    _start_thread(threads, probe.run, (cancel_ctx,), "replay_stream_probe_thread")
+    _start_thread(
+        threads, agg_orderbook_mainloop, (conf, cancel_ctx),
+        "agg_orderbook_mainloop_thread",
+    )
+    if order:
+        start_order_side(cancel_ctx, env, redis_url, exchanges, threads)
+
+    start = time.time()
+    try:
+        frame_count = feed_capture(cancel_ctx, capture_dir, task_queues, speed)
+        end = wait_drained(cancel_ctx, task_queues, probe)
+    except KeyboardInterrupt:
+        frame_count = sum(q.message_count for q in task_queues.values())
+        end = time.time()
+    duration = end - start
+    cancel_ctx.cancel()
+    for t in threads:
+        t.join(timeout=15)
+
+    replay_report(
+        frame_count, duration, task_queues, publish_stats, probe,
+        exchanges if order else None,
+    )
+
+
+@main.command("dump-markets")
+@click.option("--output", "-o", required=True, help="markets json file")
+def dump_markets(output: str):
+    data = {}
+    for ex_name, exchange in [("okex", ccxt.okex()), ("binance", ccxt.binanceusdm())]:
+        data[ex_name] = exchange.load_markets()
+    with open(output, "wb") as f:
+        f.write(json.dumps(data))
+    click.echo(f"markets saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
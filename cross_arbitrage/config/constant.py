@@ -6,6 +6,18 @@ LOG_LEVELS = ["debug", "info", "warning", "error", "critical"]
 
 ORDER_MODES = ["pending", "reduce_only", "normal", "maintain"]
 
+INGEST_MODES = ["thread", "process"]
+
+ORDERBOOK_PRICE_FORMATS = ["tick", "str"]
+
+ORDERBOOK_FEEDS = ["snapshot", "incremental"]
+
+WS_TRANSPORTS = ["thread", "asyncio"]
+
+AGG_MODES = ["redis", "fused"]
+
+ORDERBOOK_STREAM_FORMATS = ["json", "binary"]
+
 
 def to_ccxt_exchange_name(ex_name: str) -> str:
     if ex_name == "binance":
@@ -1,7 +1,25 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
+
+from cross_arbitrage.config.constant import ORDERBOOK_STREAM_FORMATS
 
 
 class RedisConfig(BaseModel):
     url: str
     orderbook_stream: str
     orderbook_stream_size: int = 2000000
+    # json: one `orderbook_stream` of json entries, binary: one stream per
+    # symbol `<orderbook_stream>:<symbol>` of fixed layout binary entries
+    orderbook_stream_format: str = "json"
+    # entries kept in every symbol stream of the binary format
+    orderbook_symbol_stream_size: int = 100000
+
+    @validator("orderbook_stream_format")
+    def orderbook_stream_format_must_in_list(cls, value):
+        if value not in ORDERBOOK_STREAM_FORMATS:
+            raise ValueError(
+                f"orderbook_stream_format must in {','.join(ORDERBOOK_STREAM_FORMATS)}"
+            )
+        return value
+
+    def symbol_streams(self) -> bool:
+        return self.orderbook_stream_format == "binary"
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+import aiohttp
+
+from cross_arbitrage.exchange.binance_usdm_ws import \
+    BinanceUsdsPublicWebSocketClient
+from cross_arbitrage.exchange.okex_ws import OkexPublicWebSocketClient
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+class AsyncWsTransport:
+    """
+    one event loop thread running every websocket connection of the process
+    """
+
+    def __init__(self, name: str = "async_ws", use_uvloop: bool = True):
+        self.name = name
+        if use_uvloop and uvloop is None:
+            logging.warning("uvloop is not installed, using the asyncio event loop")
+        if use_uvloop and uvloop is not None:
+            self.loop = uvloop.new_event_loop()
+        else:
+            self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._run, name=f"{self.name}_loop", daemon=True
+        )
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback: Callable, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        return self.session
+
+    async def _close(self):
+        tasks = [
+            t for t in asyncio.all_tasks(self.loop) if t is not asyncio.current_task()
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+
+    def stop(self, timeout: float = 10):
+        if self.thread is None:
+            return
+        try:
+            self.submit(self._close()).result(timeout=timeout)
+        except Exception as ex:
+            logging.error(f"{self.name} close failed: {ex}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=timeout)
+        self.thread = None
+
+
+class AsyncWsClientMixin:
+    """
+    run a websocket client on an `AsyncWsTransport` instead of a
+    websocket-client thread. messages go inline to `message_handler` on the
+    event loop thread, or to `task_queue` when no handler is given.
+    the connection sends the messages queued while it was down, and on a
+    reconnect replays the order book subscriptions of the lost connection
+    """
+
+    # messages queued while disconnected, the oldest are dropped beyond
+    pending_limit = 1000
+
+    def _init_async(self, transport: AsyncWsTransport, message_handler=None):
+        self.name = self.context_args.get("name") or self.ws_url
+        self.transport = transport
+        self.message_handler = message_handler
+        self.connection_future = None
+        self.order_book_symbols = []
+        self.pending_messages = deque()
+        self.connected_before = False
+        self.ws = None
+
+    def ws_connect_url(self):
+        return self.ws_url
+
+    def watch_order_books(self, symbols, *args, **kwargs):
+        for symbol in symbols:
+            if symbol not in self.order_book_symbols:
+                self.order_book_symbols.append(symbol)
+        super().watch_order_books(symbols, *args, **kwargs)
+
+    def send_message(self, message):
+        logging.debug(f"websocket client send message: {message}")
+        self.transport.call_soon(self._send_nowait, message)
+
+    def _send_nowait(self, message):
+        if self.ws is None or self.ws.closed:
+            # (re)subscriptions must not be lost, send them once connected
+            if len(self.pending_messages) >= self.pending_limit:
+                dropped = self.pending_messages.popleft()
+                logging.warning(f"{self.name} is disconnected, drop pending message: {dropped}")
+            self.pending_messages.append(message)
+            return
+        asyncio.ensure_future(self.ws.send_str(message))
+
+    def send_ping(self, payload=""):
+        # aiohttp sends heartbeat pings and answers server pings
+        return
+
+    def send_pong(self, payload=""):
+        return
+
+    def on_message(self, ws, message):
+        try:
+            self.last_rev_timestamp = int(time.time())
+            self.message_count += 1
+            if self.capture is not None:
+                self.capture(message)
+            if self.message_handler:
+                self.message_handler(message)
+            else:
+                self.task_queue.put(message)
+        except Exception as ex:
+            logging.error(ex)
+            logging.exception(ex)
+
+    async def _run_connection(self):
+        session = await self.transport.get_session()
+        while self.ws_status != "DISCONNECTING":
+            try:
+                async with session.ws_connect(
+                    self.ws_connect_url(),
+                    heartbeat=self.ping_interval,
+                    proxy=self.http_proxy,
+                ) as ws:
+                    self.ws = ws
+                    self.on_open(ws)
+                    if self.pending_messages:
+                        logging.info(
+                            f"{self.name} connected, send {len(self.pending_messages)} pending messages"
+                        )
+                    while self.pending_messages:
+                        await ws.send_str(self.pending_messages.popleft())
+                    if self.connected_before and self.order_book_symbols:
+                        # reconnected, subscribe again
+                        super().watch_order_books(self.order_book_symbols)
+                    self.connected_before = True
+                    async for msg in ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            self.on_message(ws, msg.data)
+                        elif msg.type == aiohttp.WSMsgType.BINARY:
+                            self.on_message(ws, msg.data.decode("utf-8"))
+                        elif msg.type in (
+                            aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR
+                        ):
+                            break
+            except asyncio.CancelledError:
+                break
+            except Exception as ex:
+                self.on_error(self.ws, ex)
+            finally:
+                self.ws = None
+            self.on_close(None, None, None)
+            if self.ws_status == "DISCONNECTING":
+                break
+            await asyncio.sleep(2)
+
+    def start_client(self):
+        logging.info(f"async websocket client starting...")
+        if self.connection_future is not None:
+            logging.error(f"async websocket client is already started")
+            return
+        self.ws_status = "CONNECTING"
+        self.connection_future = self.transport.submit(self._run_connection())
+        self.last_rev_timestamp = int(time.time())
+
+    def stop_client(self):
+        logging.info("async websocket client is stopping...")
+        self.ws_status = "DISCONNECTING"
+        if self.connection_future is not None:
+            self.connection_future.cancel()
+        self.connection_future = None
+        self.ws_status = "DISCONNECTED"
+
+
+class OkexAsyncWebSocketClient(AsyncWsClientMixin, OkexPublicWebSocketClient):
+    def __init__(self, transport: AsyncWsTransport, context_args={}, message_handler=None):
+        context_args = dict(context_args)
+        context_args.setdefault("task_queue", None)
+        OkexPublicWebSocketClient.__init__(self, context_args)
+        self._init_async(transport, message_handler)
+
+
+class BinanceUsdsAsyncWebSocketClient(
+    AsyncWsClientMixin, BinanceUsdsPublicWebSocketClient
+):
+    def __init__(self, transport: AsyncWsTransport, context_args={}, message_handler=None):
+        context_args = dict(context_args)
+        context_args.setdefault("task_queue", None)
+        BinanceUsdsPublicWebSocketClient.__init__(self, context_args)
+        self._init_async(transport, message_handler)
+
+    def ws_connect_url(self):
+        return self.user_ws_url()
@@ -49,10 +49,16 @@ class BinanceUsdsPublicWebSocketClient:
             self.is_private = False
 
         self.task_queue = self.context_args.pop("task_queue")
+        # optional raw frame recorder, called with every message
+        self.capture = self.context_args.pop("capture", None)
         self.ping_interval = self.context_args.get("ping_interval") or 60
         self.ping_timeout = self.context_args.get("ping_timeout") or 10
         self.http_proxy = self.context_args.get("http_proxy")
         self.debug = self.context_args.get("debug")
+        # 5/10/20: partial depth snapshots, "": diff depth updates
+        self.order_book_depth = self.context_args.get("order_book_depth", 5)
+        # subscribe the real-time <symbol>@bookTicker stream with the books
+        self.watch_book_ticker = self.context_args.get("watch_book_ticker", False)
         if self.http_proxy:
             try:
                 urlobj = urlparse(self.http_proxy)
@@ -177,23 +183,50 @@ class BinanceUsdsPublicWebSocketClient:
     def _get_order_book_channel(self, symbol, depth=5, interval="100ms"):
         return f"{symbol.lower()}@depth{depth}@{interval}"
 
-    def watch_order_book(self, symbol, depth=5, interval="100ms"):
+    def _get_book_ticker_channel(self, symbol):
+        return f"{symbol.lower()}@bookTicker"
+
+    def watch_order_book(self, symbol, depth=None, interval="100ms"):
         method = "SUBSCRIBE"
+        if depth is None:
+            depth = self.order_book_depth
         channel = self._get_order_book_channel(
             symbol=symbol, depth=depth, interval=interval
         )
         self._send(method, [channel])
 
-    def watch_order_books(self, symbols, depth=5, interval="100ms"):
+    def watch_order_books(self, symbols, depth=None, interval="100ms"):
         method = "SUBSCRIBE"
+        if depth is None:
+            depth = self.order_book_depth
+        channels = [
+            self._get_order_book_channel(
+                symbol=symbol, depth=depth, interval=interval
+            )
+            for symbol in symbols
+        ]
+        if self.watch_book_ticker:
+            channels += [self._get_book_ticker_channel(symbol) for symbol in symbols]
+        self._send(method, channels)
+
+    def unwatch_order_books(self, symbols, depth=None, interval="100ms"):
+        method = "UNSUBSCRIBE"
+        if depth is None:
+            depth = self.order_book_depth
         channels = [
             self._get_order_book_channel(
                 symbol=symbol, depth=depth, interval=interval
             )
             for symbol in symbols
         ]
+        if self.watch_book_ticker:
+            channels += [self._get_book_ticker_channel(symbol) for symbol in symbols]
         self._send(method, channels)
 
+    def resubscribe_order_books(self, symbols):
+        self.unwatch_order_books(symbols)
+        self.watch_order_books(symbols)
+
     def watch_user_order(self, symbol=None):
         # channel = self._get_user_order_channel(symbol=symbol)
         # if channel:
@@ -254,6 +287,8 @@ class BinanceUsdsPublicWebSocketClient:
         # logging.info(f"WebSocket on_message: {message}")
         try:
             self.last_rev_timestamp = int(time.time())
+            if self.capture is not None:
+                self.capture(message)
             self.task_queue.put(message)
             self.message_count += 1
             if self.debug and self.message_count % 200 == 0:
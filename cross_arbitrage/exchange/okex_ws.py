@@ -46,10 +46,16 @@ class OkexPublicWebSocketClient:
             self.is_private = False
 
         self.task_queue = self.context_args.pop("task_queue")
+        # optional raw frame recorder, called with every message
+        self.capture = self.context_args.pop("capture", None)
         self.ping_interval = self.context_args.get("ping_interval") or 30
         self.ping_timeout = self.context_args.get("ping_timeout") or 10
         self.http_proxy = self.context_args.get("http_proxy")
         self.debug = self.context_args.get("debug")
+        # books5: 5 level snapshots, books: snapshot then incremental updates
+        self.order_book_channel = self.context_args.get("order_book_channel") or "books5"
+        # tick by tick best bid/ask channel subscribed with the books, e.g. bbo-tbt
+        self.bbo_channel = self.context_args.get("bbo_channel")
 
         if self.http_proxy:
             try:
@@ -106,6 +112,10 @@ class OkexPublicWebSocketClient:
         method = "subscribe"
         self.send_message(self._build_channel_message(method, params))
 
+    def _unsubscribe_channel(self, params={}):
+        method = "unsubscribe"
+        self.send_message(self._build_channel_message(method, params))
+
     def _send_method(self, method, params={}):
         self.send_message(self._build_method_message(method, params))
 
@@ -139,7 +149,15 @@ class OkexPublicWebSocketClient:
 
     def _get_order_book_channel(self, symbol, depth=5, interval="100ms"):
         return {
-            "channel": "books5",
+            "channel": self.order_book_channel,
+            "instId": symbol,
+        }
+
+    def _get_bbo_channel(self, symbol):
+        if not self.bbo_channel:
+            return None
+        return {
+            "channel": self.bbo_channel,
             "instId": symbol,
         }
 
@@ -169,10 +187,23 @@ class OkexPublicWebSocketClient:
                 symbol=symbol, depth=depth, interval=interval
             )
             for symbol in symbols
-        ]
+        ] + [self._get_bbo_channel(symbol) for symbol in symbols]
         channels = list(filter(lambda x: x != None, channels))
         self._subscribe_channel(channels)
 
+    def unwatch_order_books(self, symbols):
+        # the okex channels are named by `order_book_channel` and the symbol
+        channels = [
+            self._get_order_book_channel(symbol=symbol) for symbol in symbols
+        ] + [self._get_bbo_channel(symbol) for symbol in symbols]
+        channels = list(filter(lambda x: x != None, channels))
+        self._unsubscribe_channel(channels)
+
+    def resubscribe_order_books(self, symbols):
+        # a new subscription starts with a full snapshot
+        self.unwatch_order_books(symbols)
+        self.watch_order_books(symbols)
+
     def watch_user_order(self, symbol=None):
         channel = self._get_user_order_channel(symbol=symbol)
         if channel:
@@ -270,6 +301,8 @@ class OkexPublicWebSocketClient:
         # logging.info(f"WebSocket on_message: {message}")
         try:
             self.last_rev_timestamp = int(time.time())
+            if self.capture is not None:
+                self.capture(message)
             self.task_queue.put(message)
             self.message_count += 1
             if self.debug and self.message_count % 200 == 0:
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import ccxt
+
+
+class StubExchangeMixin:
+    """
+    ccxt exchange answering from local markets without any request, for
+    replays. every order is accepted and expires at once without a fill,
+    so the signal path runs end to end and no position is opened
+    """
+
+    def _init_stub(self, markets: dict, balance: float = 10000.0):
+        self.set_markets(markets)
+        self.stub_balance = balance
+        self.stub_lock = threading.Lock()
+        self.stub_orders = {}
+        # (create time, order) of every placed order
+        self.stub_order_log = []
+
+    def load_markets(self, reload=False, params={}):
+        return self.markets
+
+    def fetch_time(self, params={}):
+        return self.milliseconds()
+
+    def fetch_status(self, params={}):
+        return {"status": "ok", "updated": self.milliseconds()}
+
+    def fetch_balance(self, params={}):
+        return {
+            "used": {"USDT": 0.0},
+            "free": {"USDT": self.stub_balance},
+            "total": {"USDT": self.stub_balance},
+        }
+
+    def fetch_positions(self, symbols=None, params={}):
+        return []
+
+    def set_leverage(self, leverage, symbol=None, params={}):
+        return {}
+
+    def set_margin_mode(self, marginMode, symbol=None, params={}):
+        return {}
+
+    def set_position_mode(self, hedged, symbol=None, params={}):
+        return {}
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        now = time.time()
+        with self.stub_lock:
+            order_id = str(len(self.stub_order_log) + 1)
+            order = {
+                "id": order_id,
+                "clientOrderId": params.get("clientOrderId"),
+                "timestamp": int(now * 1000),
+                "datetime": self.iso8601(int(now * 1000)),
+                "symbol": self.market(symbol)["symbol"],
+                "type": type,
+                "side": side,
+                "price": price,
+                "amount": amount,
+                "filled": 0.0,
+                "remaining": amount,
+                "average": None,
+                "status": "expired",
+                "fee": None,
+                "trades": [],
+                "info": {},
+            }
+            self.stub_orders[order_id] = order
+            self.stub_order_log.append((now, order))
+        return order
+
+    def fetch_order(self, id, symbol=None, params={}):
+        if id not in self.stub_orders:
+            raise ccxt.OrderNotFound(f"{self.id} order {id} not found")
+        return self.stub_orders[id]
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        return []
+
+    def cancel_order(self, id, symbol=None, params={}):
+        return self.fetch_order(id, symbol)
+
+    def cancel_orders(self, ids, symbol=None, params={}):
+        return []
+
+    def cancel_all_orders(self, symbol=None, params={}):
+        return []
+
+
+class StubOkex(StubExchangeMixin, ccxt.okex):
+    def __init__(self, markets: dict, config={}):
+        ccxt.okex.__init__(self, config)
+        self._init_stub(markets)
+
+
+class StubBinanceUsdm(StubExchangeMixin, ccxt.binanceusdm):
+    def __init__(self, markets: dict, config={}):
+        ccxt.binanceusdm.__init__(self, config)
+        self._init_stub(markets)
+
+
+stub_exchanges = {
+    "okex": StubOkex,
+    "binance": StubBinanceUsdm,
+}
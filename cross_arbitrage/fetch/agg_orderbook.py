@@ -1,136 +1,648 @@
 # import json
 import logging
+import re
 import threading
 import time
-from typing import List
+from typing import Dict, List, Optional, Set
 
 import orjson as json
 import redis
 
+from cross_arbitrage.config.redis import RedisConfig
 from cross_arbitrage.fetch.config import FetchConfig
-from cross_arbitrage.fetch.utils.common import now_ms, ts_to_str
-from cross_arbitrage.fetch.utils.redis import get_ob_notify_key, get_ob_storage_key
-from cross_arbitrage.utils.context import CancelContext
-
-
-def agg_orderbooks_from_redis(
-    rc: redis.Redis,
-    notify_exchange: str,
-    symbol: str,
-    exchanges: List[str],
-    output_stream: str,
-    stream_size: int,
-    ctx: CancelContext,
-):
-    origin_ob_keys = {ex: get_ob_storage_key(ex, symbol) for ex in exchanges}
-    origin_ob_notify_key = get_ob_notify_key(notify_exchange, symbol)
+from cross_arbitrage.fetch.utils.common import now_ms
+from cross_arbitrage.fetch.utils.orderbook import is_stale_orderbook
+from cross_arbitrage.fetch.utils.orderbook_codec import encode_orderbook_entry
+from cross_arbitrage.fetch.utils.redis import (get_ob_notify_key,
+                                               get_ob_stale_key,
+                                               get_ob_storage_key,
+                                               get_ob_symbol_stream_key)
+from cross_arbitrage.utils.clock import exchange_to_local_ms, start_clock_sync
+from cross_arbitrage.utils.context import CancelContext, sleep_with_context
+from cross_arbitrage.utils.exchange import create_exchange
+from cross_arbitrage.utils.latency import (record_latency, stage_now,
+                                           start_latency_recorder)
 
-    while not ctx.is_canceled():
-        result = None
-        try:
-            # with rc.pipeline() as pipe:
-            #     pipe.multi()
-            #     pipe.brpop(origin_ob_notify_key, timeout=1)
-            #     pipe.delete(origin_ob_notify_key)
-            #     pipe.mget(origin_ob_keys.values())
-            #     result = pipe.execute()
-
-            res = rc.brpop(origin_ob_notify_key, timeout=1)
-            if res is None:
-                continue
-            result = rc.mget(origin_ob_keys.values())
-        except redis.exceptions.TimeoutError:
-            continue
-
-        if result == None:
-            continue
-        obs = result
-        if len(obs) != len(exchanges) or None in obs:
-            continue
-        ts = now_ms()
-        time_str = ts_to_str(ts / 1000)
-        order_book = {
-            "symbol": symbol,
-            "ts": ts,
-            "datetime": time_str,
-            "exchange": notify_exchange,
+
+def record_orderbook_latency(exchange: str, symbol: str, ob: dict, agg_ts: int):
+    """
+    fetch stage latencies of the orderbook leg that triggered an aggregation
+    """
+    record_latency(
+        exchange, symbol, "ws_recv",
+        exchange_to_local_ms(exchange, ob.get("ts")), ob.get("recv_ts"),
+    )
+    record_latency(exchange, symbol, "decode", ob.get("recv_ts"), ob.get("decode_ts"))
+    record_latency(exchange, symbol, "publish", ob.get("decode_ts"), ob.get("publish_ts"))
+    record_latency(exchange, symbol, "agg", ob.get("publish_ts"), agg_ts)
+
+
+# top level stage timestamps of a serialized orderbook, the levels hold
+# no quoted keys
+_RAW_STAMPS_RE = re.compile(rb'"(ts|recv_ts|decode_ts|publish_ts)":(-?[0-9][0-9.eE+-]*)')
+
+_RAW_STALE_FIELD = b',"stale":true}'
+
+
+def raw_orderbook_stamps(raw: bytes) -> dict:
+    """
+    the stage timestamps of a serialized orderbook without decoding it
+    """
+    return {
+        key.decode(): float(value) for key, value in _RAW_STAMPS_RE.findall(raw)
+    }
+
+
+def mark_raw_stale(raw: bytes) -> bytes:
+    """
+    add `"stale": true` to a serialized orderbook
+    """
+    return raw[:-1] + _RAW_STALE_FIELD
+
+
+class EntrySplicer:
+    """
+    build the serialized aggregated entry from the serialized snapshots of
+    the legs, with no decode and encode round. same fields as the decoded
+    entry, in the same order: symbol, ts, exchange, then the legs
+    """
+
+    def __init__(self, exchanges: List[str]):
+        self.exchanges = exchanges
+        self.leg_keys = {ex: b',"' + ex.encode() + b'":' for ex in exchanges}
+        self.exchange_fields = {
+            ex: b',"exchange":"' + ex.encode() + b'"' for ex in exchanges
         }
-        for exchange, ob in zip(origin_ob_keys.keys(), obs):
-            order_book[exchange] = json.loads(ob)
-        try:
-            rc.xadd(
-                output_stream,
-                {symbol: json.dumps(order_book)},
-                maxlen=stream_size,
-                approximate=True,
+        self.symbol_fields = {}
+
+    def splice(self, symbol: str, ts: int, notify_exchange: str, legs: List[bytes]) -> bytes:
+        """
+        legs: serialized snapshots, in the order of `exchanges`
+        """
+        symbol_field = self.symbol_fields.get(symbol)
+        if symbol_field is None:
+            symbol_field = self.symbol_fields[symbol] = b'{"symbol":' + json.dumps(symbol)
+        parts = [
+            symbol_field, b',"ts":', str(ts).encode(),
+            self.exchange_fields[notify_exchange],
+        ]
+        for ex, raw in zip(self.exchanges, legs):
+            parts.append(self.leg_keys[ex])
+            parts.append(raw)
+        parts.append(b"}")
+        return b"".join(parts)
+
+
+class EntryWriter:
+    """
+    add aggregated entries in the configured stream format: spliced json
+    entries to the orderbook stream, or binary entries to the symbol streams
+    """
+
+    def __init__(self, exchanges: List[str], redis_config: RedisConfig):
+        self.exchanges = exchanges
+        self.splicer = EntrySplicer(exchanges)
+        self.binary = redis_config.symbol_streams()
+        self.stream = redis_config.orderbook_stream
+        self.stream_size = redis_config.orderbook_stream_size
+        self.symbol_stream_size = redis_config.orderbook_symbol_stream_size
+        self.symbol_stream_keys = {}
+
+    def _xadd(self, pipe, symbol: str, entry: bytes):
+        if self.binary:
+            stream = self.symbol_stream_keys.get(symbol)
+            if stream is None:
+                stream = self.symbol_stream_keys[symbol] = get_ob_symbol_stream_key(self.stream, symbol)
+            pipe.xadd(stream, {symbol: entry}, maxlen=self.symbol_stream_size, approximate=True)
+        else:
+            pipe.xadd(self.stream, {symbol: entry}, maxlen=self.stream_size, approximate=True)
+
+    def add_raw(self, pipe, symbol: str, ts: int, notify_exchange: str, raws: List[bytes]):
+        """
+        raws: serialized legs, in the order of `exchanges`
+        """
+        if self.binary:
+            legs = {ex: json.loads(raw) for ex, raw in zip(self.exchanges, raws)}
+            entry = encode_orderbook_entry(self.exchanges, ts, notify_exchange, legs)
+        else:
+            entry = self.splicer.splice(symbol, ts, notify_exchange, raws)
+        self._xadd(pipe, symbol, entry)
+
+    def add_legs(self, pipe, symbol: str, ts: int, notify_exchange: str,
+                 legs: Dict[str, dict], encode):
+        """
+        encode: the serialized leg of an orderbook, for the json format
+        """
+        if self.binary:
+            entry = encode_orderbook_entry(self.exchanges, ts, notify_exchange, legs)
+        else:
+            entry = self.splicer.splice(
+                symbol, ts, notify_exchange, [encode(legs[ex]) for ex in self.exchanges]
             )
-        except Exception as e:
-            logging.error(f"get a redis error: {type(e)}: {e}")
-            logging.exception(e)
-
-
-def _loop(
-    redis_url: str,
-    symbol: str,
-    exchanges: List[str],
-    notify_exchange: str,
-    output_stream: str,
-    stream_size: int,
-    ctx: CancelContext,
-):
-    rc = redis.Redis.from_url(redis_url)
+        self._xadd(pipe, symbol, entry)
 
-    while not ctx.is_canceled():
-        try:
-            agg_orderbooks_from_redis(
-                rc, notify_exchange, symbol, exchanges, output_stream, stream_size, ctx
+
+def _is_stale_raw(exchange: str, raw: bytes, flagged: bool, now: int, freshness_ms: int) -> bool:
+    if flagged:
+        return True
+    if freshness_ms <= 0:
+        return False
+    return is_stale_orderbook(exchange, raw_orderbook_stamps(raw), now, freshness_ms)
+
+
+# pop the pending notify item of every key in one step
+# return: 1-based indexes of the keys which had one
+_DRAIN_NOTIFY_SCRIPT = """
+local ret = {}
+for i, key in ipairs(KEYS) do
+    if redis.call('RPOP', key) then
+        table.insert(ret, i)
+    end
+end
+return ret
+"""
+
+
+# aggregate one symbol atomically: read the snapshots and stale flags,
+# check the other legs, add one spliced json entry per notifying exchange
+# KEYS: snapshot keys of the n exchanges, their stale keys, output stream
+# ARGV: symbol, json encoded symbol, maxlen, freshness ms (0: flags only),
+#       local ms time, n, the n exchange names, the 1-based indexes of the
+#       notifying exchanges
+# return: per notifying exchange {index, added, agg ts, leg ts, recv_ts,
+#       decode_ts, publish_ts}. the entry ts and the freshness use the local
+#       time passed by the caller, like the python aggregation
+_AGG_SYMBOL_SCRIPT = """
+-- XADD * is not deterministic, needs effects replication (the default
+-- since redis 5, the call is gone from some servers)
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+local now = tonumber(ARGV[5])
+local n = tonumber(ARGV[6])
+local legs = {}
+local stale = {}
+for i = 1, n do
+    local raw = redis.call('GET', KEYS[i])
+    if not raw then
+        return {}
+    end
+    if redis.call('EXISTS', KEYS[n + i]) == 1 then
+        raw = string.sub(raw, 1, -2) .. ',"stale":true}'
+        stale[i] = true
+    end
+    legs[i] = raw
+end
+local freshness = tonumber(ARGV[4])
+local ret = {}
+for j = 7 + n, #ARGV do
+    local trigger = tonumber(ARGV[j])
+    local fresh = true
+    for i = 1, n do
+        if i ~= trigger then
+            if stale[i] then
+                fresh = false
+            elseif freshness > 0 then
+                local recv = tonumber(string.match(legs[i], '"recv_ts":(%-?[%d%.eE%+%-]+)'))
+                if recv and now - recv > freshness then
+                    fresh = false
+                end
+            end
+        end
+    end
+    local leg = legs[trigger]
+    local added = 0
+    if fresh then
+        local parts = {'{"symbol":', ARGV[2], ',"ts":', ARGV[5], ',"exchange":"', ARGV[6 + trigger], '"'}
+        for i = 1, n do
+            table.insert(parts, ',"' .. ARGV[6 + i] .. '":')
+            table.insert(parts, legs[i])
+        end
+        table.insert(parts, '}')
+        redis.call('XADD', KEYS[2 * n + 1], 'MAXLEN', '~', ARGV[3], '*', ARGV[1], table.concat(parts))
+        added = 1
+    end
+    table.insert(ret, {
+        trigger, added, ARGV[5],
+        string.match(leg, '"ts":(%-?[%d%.eE%+%-]+)') or false,
+        string.match(leg, '"recv_ts":(%-?[%d%.eE%+%-]+)') or false,
+        string.match(leg, '"decode_ts":(%-?[%d%.eE%+%-]+)') or false,
+        string.match(leg, '"publish_ts":(%-?[%d%.eE%+%-]+)') or false,
+    })
+end
+return ret
+"""
+
+_STAMP_NAMES = ("ts", "recv_ts", "decode_ts", "publish_ts")
+
+
+def _scripting_unavailable(e: redis.exceptions.ResponseError) -> bool:
+    """
+    scripting disabled or forbidden on the server, not a failing call
+    """
+    if isinstance(e, redis.exceptions.NoPermissionError):
+        return True
+    msg = str(e).lower()
+    return "unknown command" in msg and ("eval" in msg or "script" in msg)
+
+
+class AggStats:
+    def __init__(self, name: str, report_interval: float = 10.0):
+        self.name = name
+        self.report_interval = report_interval
+        self._reset(time.monotonic())
+
+    def _reset(self, now: float):
+        self.start_time = now
+        self.wakeups = 0
+        self.entries = 0
+        self.skipped = 0
+
+    def report(self):
+        now = time.monotonic()
+        duration = now - self.start_time
+        if duration < self.report_interval:
+            return
+        if self.wakeups > 0:
+            logging.info(
+                f"--------> {self.name}: {self.wakeups / duration:.1f} wakeup/s "
+                f"{self.entries / duration:.1f} entry/s "
+                f"{self.entries / self.wakeups:.2f} entry/wakeup "
+                f"skipped={self.skipped}"
             )
-        except Exception as e:
-            logging.error(f"get a redis error: {type(e)}: {e}")
-            logging.exception(e)
+        self._reset(now)
+
+
+class OrderbookAggregator:
+    """
+    aggregate the orderbook updates of a group of symbols on one connection:
+    wait on every notify key at once, pop all the pending ones, then
+    aggregate every changed symbol with one server side script call in one
+    pipeline. without scripting, or for the binary format, the changed
+    symbols are read in one MGET and their entries added in one pipeline.
+    there is still one entry per (symbol, notifying exchange)
+    """
+
+    def __init__(
+        self,
+        rc: redis.Redis,
+        name: str,
+        symbols: List[str],
+        exchanges: List[str],
+        redis_config: RedisConfig,
+        freshness_ms: int = 0,
+        use_script: bool = True,
+    ):
+        self.rc = rc
+        self.symbols = symbols
+        self.exchanges = exchanges
+        self.freshness_ms = freshness_ms
+        self.redis_config = redis_config
+        # scripting may be disabled on the server, then both scripts are off
+        self.scripting = True
+        self.use_agg_script = use_script and not redis_config.symbol_streams()
+        self.notify = [(symbol, ex) for symbol in symbols for ex in exchanges]
+        self.notify_keys = [get_ob_notify_key(ex, symbol) for symbol, ex in self.notify]
+        self.notify_index = {key: i for i, key in enumerate(self.notify_keys)}
+        self.drain_script = rc.register_script(_DRAIN_NOTIFY_SCRIPT)
+        self.agg_script = rc.register_script(_AGG_SYMBOL_SCRIPT)
+        self.exchange_args = [len(exchanges), *exchanges]
+        self.writer = EntryWriter(exchanges, redis_config)
+        self.stats = AggStats(name)
+
+    def wait(self, timeout: int = 1) -> Dict[str, List[str]]:
+        """
+        return: {symbol: notifying exchanges}, empty on timeout
+        """
+        res = self.rc.brpop(self.notify_keys, timeout=timeout)
+        if res is None:
+            return {}
+        key = res[0].decode() if isinstance(res[0], bytes) else res[0]
+        indexes = [self.notify_index[key]]
+        indexes.extend(self._drain())
+        ret = {}
+        for i in sorted(set(indexes)):
+            symbol, ex = self.notify[i]
+            ret.setdefault(symbol, []).append(ex)
+        return ret
+
+    def _drain(self) -> List[int]:
+        """
+        return: indexes of the notify keys which had a pending item
+        """
+        if self.scripting:
+            try:
+                return [i - 1 for i in self.drain_script(keys=self.notify_keys)]
+            except redis.exceptions.ResponseError as e:
+                # the script pops nothing when it fails, pop without it
+                if _scripting_unavailable(e):
+                    self._disable_scripting(e)
+                else:
+                    logging.warning(f"drain notify script failed: {type(e)}: {e}")
+        with self.rc.pipeline(transaction=False) as pipe:
+            for key in self.notify_keys:
+                pipe.rpop(key)
+            return [i for i, item in enumerate(pipe.execute()) if item is not None]
+
+    def _disable_scripting(self, e: Exception):
+        logging.warning(f"redis scripting unavailable, fallback to the python aggregation: {e}")
+        self.scripting = False
+
+    def aggregate(self, triggers: Dict[str, List[str]]) -> int:
+        """
+        return: number of entries added to the output stream
+        """
+        if self.scripting and self.use_agg_script:
+            try:
+                return self._aggregate_script(triggers)
+            except redis.exceptions.ResponseError as e:
+                # other errors are raised: some symbols of the pipeline may
+                # already have their entries
+                if not _scripting_unavailable(e):
+                    raise
+                self._disable_scripting(e)
+        return self._aggregate_python(triggers)
+
+    def _aggregate_script(self, triggers: Dict[str, List[str]]) -> int:
+        symbols = list(triggers.keys())
+        stream = self.redis_config.orderbook_stream
+        ts = now_ms()
+        with self.rc.pipeline(transaction=False) as pipe:
+            for symbol in symbols:
+                self.agg_script(
+                    keys=[
+                        *(get_ob_storage_key(ex, symbol) for ex in self.exchanges),
+                        *(get_ob_stale_key(ex, symbol) for ex in self.exchanges),
+                        stream,
+                    ],
+                    args=[
+                        symbol, json.dumps(symbol),
+                        self.redis_config.orderbook_stream_size, self.freshness_ms,
+                        ts, *self.exchange_args,
+                        *(self.exchanges.index(ex) + 1 for ex in triggers[symbol]),
+                    ],
+                    client=pipe,
+                )
+            results = pipe.execute()
+
+        count = 0
+        for symbol, result in zip(symbols, results):
+            for index, added, agg_ts, *stamps in result:
+                exchange = self.exchanges[index - 1]
+                if not added:
+                    self.stats.skipped += 1
+                    continue
+                count += 1
+                record_orderbook_latency(
+                    exchange, symbol,
+                    {k: float(v) for k, v in zip(_STAMP_NAMES, stamps) if v is not None},
+                    int(agg_ts),
+                )
+        self._add_stats(count)
+        return count
+
+    def _add_stats(self, count: int):
+        self.stats.wakeups += 1
+        self.stats.entries += count
+        self.stats.report()
+
+    def _aggregate_python(self, triggers: Dict[str, List[str]]) -> int:
+        symbols = list(triggers.keys())
+        keys = [get_ob_storage_key(ex, symbol) for symbol in symbols for ex in self.exchanges]
+        keys += [get_ob_stale_key(ex, symbol) for symbol in symbols for ex in self.exchanges]
+        values = self.rc.mget(keys)
+        half = len(values) // 2
+        obs, stale_flags = values[:half], values[half:]
+
+        ts = now_ms()
+        n = len(self.exchanges)
+        count = 0
+        with self.rc.pipeline(transaction=False) as pipe:
+            for i, symbol in enumerate(symbols):
+                legs = obs[i * n:(i + 1) * n]
+                if None in legs:
+                    continue
+                flags = [flag is not None for flag in stale_flags[i * n:(i + 1) * n]]
+                if any(flags):
+                    legs = [mark_raw_stale(raw) if flag else raw for raw, flag in zip(legs, flags)]
+                for notify_exchange in triggers[symbol]:
+                    if any(
+                        _is_stale_raw(exchange, raw, flag, ts, self.freshness_ms)
+                        for exchange, raw, flag in zip(self.exchanges, legs, flags)
+                        if exchange != notify_exchange
+                    ):
+                        logging.debug(f"skip {symbol} {notify_exchange} update, other leg is stale")
+                        self.stats.skipped += 1
+                        continue
+                    record_orderbook_latency(
+                        notify_exchange, symbol,
+                        raw_orderbook_stamps(legs[self.exchanges.index(notify_exchange)]),
+                        ts,
+                    )
+                    self.writer.add_raw(pipe, symbol, ts, notify_exchange, legs)
+                    count += 1
+            if count:
+                pipe.execute()
+        self._add_stats(count)
+        return count
+
+    def run(self, ctx: CancelContext):
+        while not ctx.is_canceled():
+            try:
+                triggers = self.wait()
+                if triggers:
+                    self.aggregate(triggers)
+            except redis.exceptions.TimeoutError:
+                continue
+            except Exception as e:
+                logging.error(f"get a redis error: {type(e)}: {e}")
+                logging.exception(e)
+                sleep_with_context(ctx, 1)
+
+
+class FusedAggregator:
+    """
+    aggregate in the fetch process without the redis hop: the fetch
+    workers hand their orderbooks over in memory, the `run` thread adds the
+    entries of every changed (symbol, exchange) and writes the snapshot keys
+    for the other readers in one pipeline. no notify items are pushed.
+    it is the publisher of the workers: `publish` for the worker threads,
+    `add` for the asyncio transport. the feed watchdogs flag silent legs in
+    `stale_legs`, they are marked stale in the entries
+    """
+
+    def __init__(
+        self,
+        rc: redis.Redis,
+        exchanges: List[str],
+        redis_config: RedisConfig,
+        freshness_ms: int = 0,
+    ):
+        self.rc = rc
+        self.exchanges = exchanges
+        self.freshness_ms = freshness_ms
+        self.cond = threading.Condition()
+        # (exchange, symbol) => latest orderbook
+        self.books: Dict[tuple, dict] = {}
+        # changed (symbol, exchange) in arrival order
+        self.pending: Dict[tuple, None] = {}
+        # (exchange, symbol) flagged by the feed watchdogs
+        self.stale_legs: Set[tuple] = set()
+        self.writer = EntryWriter(exchanges, redis_config)
+        self.stats = AggStats("fused agg")
+
+    def publish(self, orderbooks: List[dict]):
+        if not orderbooks:
+            return
+        publish_ts = stage_now()
+        with self.cond:
+            for ob in orderbooks:
+                ob["publish_ts"] = publish_ts
+                self.books[(ob["ex"], ob["symbol"])] = ob
+                self.pending[(ob["symbol"], ob["ex"])] = None
+            self.cond.notify()
+
+    def add(self, ob: dict):
+        self.publish([ob])
+
+    def _take(self, timeout: float) -> List[tuple]:
+        """
+        return: [(symbol, notify exchange, {exchange: orderbook})]
+        """
+        with self.cond:
+            if not self.pending:
+                self.cond.wait(timeout)
+            pending, self.pending = self.pending, {}
+            return [
+                (symbol, notify_exchange, {ex: self.books.get((ex, symbol)) for ex in self.exchanges})
+                for symbol, notify_exchange in pending
+            ]
+
+    def flush(self, timeout: float = 1) -> int:
+        """
+        return: number of entries added to the output stream
+        """
+        changes = self._take(timeout)
+        if not changes:
+            return 0
+        ts = now_ms()
+        count = 0
+        # every book is encoded once, for its snapshot key and the entries
+        encoded: Dict[int, bytes] = {}
+
+        def _encode(ob: Optional[dict]) -> Optional[bytes]:
+            if ob is None:
+                return None
+            raw = encoded.get(id(ob))
+            if raw is None:
+                raw = encoded[id(ob)] = json.dumps(ob)
+            return raw
+
+        # stale marked copies, kept for the flush so their ids stay unique
+        marked: Dict[tuple, dict] = {}
+
+        def _marked(exchange: str, symbol: str, ob: dict) -> dict:
+            key = (exchange, symbol, id(ob))
+            if key not in marked:
+                marked[key] = dict(ob, stale=True)
+            return marked[key]
+
+        with self.rc.pipeline(transaction=False) as pipe:
+            for symbol, notify_exchange, legs in changes:
+                ob = legs[notify_exchange]
+                pipe.set(get_ob_storage_key(notify_exchange, symbol), _encode(ob))
+                if None in legs.values():
+                    continue
+                if self.stale_legs:
+                    legs = {
+                        exchange: _marked(exchange, symbol, leg)
+                        if (exchange, symbol) in self.stale_legs else leg
+                        for exchange, leg in legs.items()
+                    }
+                    ob = legs[notify_exchange]
+                if any(
+                    is_stale_orderbook(exchange, legs[exchange], ts, self.freshness_ms)
+                    for exchange in self.exchanges
+                    if exchange != notify_exchange
+                ):
+                    self.stats.skipped += 1
+                    continue
+                record_orderbook_latency(notify_exchange, symbol, ob, ts)
+                self.writer.add_legs(pipe, symbol, ts, notify_exchange, legs, _encode)
+                count += 1
+            pipe.execute()
+        self.stats.wakeups += 1
+        self.stats.entries += count
+        self.stats.report()
+        return count
+
+    def run(self, ctx: CancelContext):
+        while not ctx.is_canceled():
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"get a redis error: {type(e)}: {e}")
+                logging.exception(e)
+                sleep_with_context(ctx, 1)
+
+
+def _start_aggregator(
+    redis_url: str, worker_id: int, symbols: List[str], conf: FetchConfig,
+    ctx: CancelContext,
+) -> threading.Thread:
+    aggregator = OrderbookAggregator(
+        redis.Redis.from_url(redis_url),
+        f"agg_{worker_id}",
+        symbols,
+        list(conf.exchanges.keys()),
+        conf.redis,
+        conf.orderbook_freshness_ms,
+        conf.agg_script,
+    )
+    t = threading.Thread(
+        target=aggregator.run, args=(ctx,),
+        name=f"agg_ob_worker_{worker_id}_thread", daemon=True,
+    )
+    t.start()
+    return t
+
+
+def start_agg_latency(conf: FetchConfig, ctx: CancelContext, name: str):
+    """
+    start the latency recorder and the exchange clock sync of the process
+    which aggregates, `record_orderbook_latency` needs both
+    """
+    start_latency_recorder(ctx, conf.redis.url, name)
+    start_clock_sync(
+        ctx,
+        {
+            ex_name: create_exchange(account, proxy=conf.network.proxies())
+            for ex_name, account in conf.exchanges.items()
+        },
+        name,
+    )
 
 
 def agg_orderbook_mainloop(conf: FetchConfig, ctx: CancelContext):
+    if conf.use_fused_agg():
+        logging.info("-- agg fused into the fetch workers")
+        return
     redis_url = conf.redis.url
-    exchanges = list(conf.exchanges.keys())
-    threads = {}
-    for symbol in conf.cross_arbitrage_symbol_datas:
-        for exchange in exchanges:
-            t = threading.Thread(
-                target=_loop,
-                args=(
-                    redis_url,
-                    symbol,
-                    exchanges,
-                    exchange,
-                    conf.redis.orderbook_stream,
-                    conf.redis.orderbook_stream_size,
-                    ctx,
-                ),
-                name=f"agg_ob_{symbol}_{exchange}_thread",
-                daemon=True,
-            )
-            t.start()
-            threads[(symbol, exchange)] = t
+    start_agg_latency(conf, ctx, "agg")
+    symbols = list(conf.cross_arbitrage_symbol_datas)
+    worker_number = max(1, min(conf.agg_workers, len(symbols)))
+    # round robin, like the ws shards
+    worker_symbols = [symbols[i::worker_number] for i in range(worker_number)]
+    logging.info(
+        f"-- agg workers: {[len(s) for s in worker_symbols]} symbols"
+    )
+    threads = {
+        i: _start_aggregator(redis_url, i, worker_symbols[i], conf, ctx)
+        for i in range(worker_number)
+    }
     while not ctx.is_canceled():
         time.sleep(10)
-        for (symbol, exchange), t in threads.items():
-            t: threading.Thread
+        for i, t in threads.items():
             if not t.is_alive() and not ctx.is_canceled():
-                logging.error(f"thread {symbol} {exchange} died, restarting")
-                t = threading.Thread(
-                    target=_loop,
-                    args=(
-                        redis_url,
-                        symbol,
-                        exchanges,
-                        exchange,
-                        conf.redis.orderbook_stream,
-                        conf.redis.orderbook_stream_size,
-                        ctx,
-                    ),
-                    name=f"agg_ob_{symbol}_{exchange}_thread",
-                    daemon=True,
-                )
-                t.start()
-                threads[(symbol, exchange)] = t
+                logging.error(f"agg worker {i} died, restarting")
+                threads[i] = _start_aggregator(redis_url, i, worker_symbols[i], conf, ctx)
@@ -0,0 +1,356 @@
+import logging
+import time
+import zlib
+from bisect import bisect_left
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import requests
+
+BINANCE_DEPTH_SNAPSHOT_URL = "https://fapi.binance.com/fapi/v1/depth"
+# weight 5, deep enough for the published top levels
+BINANCE_SNAPSHOT_LIMIT = 100
+# diff events buffered per symbol while a snapshot request is in flight
+_MAX_PENDING_EVENTS = 1000
+# minimal seconds between two resync requests of one symbol
+_RESYNC_INTERVAL = 5
+OKEX_CHECKSUM_DEPTH = 25
+
+
+class BookGapError(Exception):
+    pass
+
+
+class BookSide:
+    """
+    one side of a price level book, kept sorted best first in two parallel
+    arrays: float sort keys (negated for bids) and the levels as received
+    """
+
+    __slots__ = ("descending", "keys", "levels")
+
+    def __init__(self, descending: bool):
+        self.descending = descending
+        self.keys: List[float] = []
+        self.levels: List[Tuple[str, str]] = []
+
+    def clear(self):
+        self.keys.clear()
+        self.levels.clear()
+
+    def update(self, price: str, size: str):
+        key = -float(price) if self.descending else float(price)
+        index = bisect_left(self.keys, key)
+        found = index < len(self.keys) and self.keys[index] == key
+        if float(size) == 0:
+            if found:
+                del self.keys[index]
+                del self.levels[index]
+        elif found:
+            self.levels[index] = (price, size)
+        else:
+            self.keys.insert(index, key)
+            self.levels.insert(index, (price, size))
+
+    def top(self, n: int) -> List[Tuple[str, str]]:
+        return self.levels[:n]
+
+    def __len__(self):
+        return len(self.levels)
+
+
+class L2Book:
+    __slots__ = ("bids", "asks", "ts")
+
+    def __init__(self):
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.ts = 0
+
+    def reset(self, bids: list, asks: list, ts: int = 0):
+        self.bids.clear()
+        self.asks.clear()
+        self.apply(bids, asks, ts)
+
+    def apply(self, bids: list, asks: list, ts: int = 0):
+        for level in bids:
+            self.bids.update(level[0], level[1])
+        for level in asks:
+            self.asks.update(level[0], level[1])
+        if ts:
+            self.ts = ts
+
+    def top(self, n: int) -> Tuple[list, list]:
+        return self.bids.top(n), self.asks.top(n)
+
+
+def okex_checksum(book: L2Book) -> int:
+    """
+    crc32 of the top 25 levels as `bid_px:bid_sz:ask_px:ask_sz:...`,
+    as a signed 32 bit integer
+    """
+    bids = book.bids.top(OKEX_CHECKSUM_DEPTH)
+    asks = book.asks.top(OKEX_CHECKSUM_DEPTH)
+    fields = []
+    for i in range(max(len(bids), len(asks))):
+        if i < len(bids):
+            fields.extend(bids[i])
+        if i < len(asks):
+            fields.extend(asks[i])
+    checksum = zlib.crc32(":".join(fields).encode())
+    if checksum >= 0x80000000:
+        checksum -= 0x100000000
+    return checksum
+
+
+class OkexBookSync:
+    """
+    maintain one symbol book from the okex `books` channel, validated by
+    seqId/prevSeqId and checksum. okex rest books carry no seqId, so a
+    resync is a resubscribe, which pushes a fresh snapshot
+    """
+
+    def __init__(self, symbol: str, resubscribe: Callable[[str], None]):
+        self.symbol = symbol
+        self.resubscribe = resubscribe
+        self.book = L2Book()
+        self.seq_id = None
+        self.resync_time = 0.0
+        self.resync_count = 0
+
+    def on_message(self, action: str, data: dict) -> Optional[L2Book]:
+        """
+        return: the book when it is valid after this message, else None
+        """
+        try:
+            if action == "snapshot":
+                self.book.reset(data["bids"], data["asks"], int(data["ts"]))
+            elif self.seq_id is None:
+                # waiting for the snapshot of a resubscribe
+                self._request_resync("no snapshot")
+                return None
+            elif data["prevSeqId"] != self.seq_id:
+                raise BookGapError(
+                    f"prevSeqId {data['prevSeqId']} != seqId {self.seq_id}"
+                )
+            else:
+                self.book.apply(data["bids"], data["asks"], int(data["ts"]))
+            if "checksum" in data and okex_checksum(self.book) != data["checksum"]:
+                raise BookGapError(f"checksum mismatch at seqId {data['seqId']}")
+            self.seq_id = data["seqId"]
+            return self.book
+        except BookGapError as ex:
+            self.seq_id = None
+            self._request_resync(ex)
+            return None
+
+    def _request_resync(self, reason):
+        now = time.monotonic()
+        if now - self.resync_time < _RESYNC_INTERVAL:
+            return
+        self.resync_time = now
+        self.resync_count += 1
+        logging.warning(f"okex {self.symbol} book resync: {reason}")
+        self.resubscribe(self.symbol)
+
+
+def fetch_binance_depth_snapshot(
+    symbol: str, limit: int = BINANCE_SNAPSHOT_LIMIT, proxies=None
+) -> dict:
+    resp = requests.get(
+        BINANCE_DEPTH_SNAPSHOT_URL,
+        params={"symbol": symbol, "limit": limit},
+        proxies=proxies,
+        timeout=10,
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+class BinanceBookSync:
+    """
+    maintain one symbol book from the binance usdm diff depth stream:
+    buffer events, fetch a rest snapshot, drop events older than the
+    snapshot, bridge it with `U <= lastUpdateId <= u`, then require
+    `pu` == previous `u` on every event. any gap triggers a new snapshot
+    """
+
+    def __init__(
+        self,
+        symbol: str,
+        executor: Executor,
+        snapshot_fn: Callable[[str], dict] = fetch_binance_depth_snapshot,
+    ):
+        self.symbol = symbol
+        self.executor = executor
+        self.snapshot_fn = snapshot_fn
+        self.book = L2Book()
+        self.last_update_id = None
+        self.snapshot_id = None
+        self.pending = []
+        self.snapshot_future: Optional[Future] = None
+        self.resync_time = 0.0
+        self.resync_count = 0
+
+    def on_event(self, event: dict) -> Optional[L2Book]:
+        """
+        return: the book when it is valid after this event, else None
+        """
+        try:
+            if self.last_update_id is None and self.snapshot_id is None:
+                return self._buffer(event)
+            self._apply(event)
+            # None until the event bridging the snapshot arrives
+            return self.book if self.snapshot_id is None else None
+        except BookGapError as ex:
+            logging.warning(f"binance {self.symbol} book resync: {ex}")
+            self.resync_count += 1
+            self.last_update_id = None
+            self.snapshot_id = None
+            self.pending.clear()
+            return self._buffer(event)
+
+    def _apply(self, event: dict):
+        if self.snapshot_id is not None:
+            # first event after the snapshot
+            if event["u"] < self.snapshot_id:
+                return
+            if event["U"] > self.snapshot_id:
+                raise BookGapError(
+                    f"U {event['U']} > snapshot lastUpdateId {self.snapshot_id}"
+                )
+            self.snapshot_id = None
+        elif event["pu"] != self.last_update_id:
+            raise BookGapError(f"pu {event['pu']} != u {self.last_update_id}")
+        self.book.apply(event["b"], event["a"], event["T"])
+        self.last_update_id = event["u"]
+
+    def _buffer(self, event: dict) -> Optional[L2Book]:
+        self.pending.append(event)
+        if len(self.pending) > _MAX_PENDING_EVENTS:
+            self.pending.pop(0)
+        if self.snapshot_future is None:
+            now = time.monotonic()
+            if now - self.resync_time < 1:
+                return None
+            self.resync_time = now
+            self.snapshot_future = self.executor.submit(self.snapshot_fn, self.symbol)
+        if not self.snapshot_future.done():
+            return None
+
+        future, self.snapshot_future = self.snapshot_future, None
+        try:
+            snapshot = future.result()
+        except Exception as ex:
+            logging.error(f"binance {self.symbol} depth snapshot failed: {ex}")
+            return None
+        return self._apply_snapshot(snapshot)
+
+    def _apply_snapshot(self, snapshot: dict) -> Optional[L2Book]:
+        snapshot_id = snapshot["lastUpdateId"]
+        pending = [e for e in self.pending if e["u"] >= snapshot_id]
+        if pending and pending[0]["U"] > snapshot_id:
+            # snapshot is older than the buffered events, fetch a new one
+            logging.info(f"binance {self.symbol} depth snapshot is stale, retrying")
+            self.pending = pending
+            return None
+        self.pending = []
+        self.book.reset(snapshot["bids"], snapshot["asks"], snapshot.get("T", 0))
+        self.snapshot_id = snapshot_id
+        try:
+            for event in pending:
+                self._apply(event)
+        except BookGapError as ex:
+            logging.warning(f"binance {self.symbol} book resync: {ex}")
+            self.resync_count += 1
+            self.last_update_id = None
+            self.snapshot_id = None
+            return None
+        if self.snapshot_id is not None:
+            # bridging event not received yet
+            return None
+        return self.book
+
+
+class BboQuote(NamedTuple):
+    # (price, size) as received, None when the side is empty
+    bid: Optional[Tuple[str, str]]
+    ask: Optional[Tuple[str, str]]
+    ts: int
+    # exchange update id, comparable with the depth version of the symbol
+    version: int
+
+
+class MergedBook(NamedTuple):
+    bids: list
+    asks: list
+    depth_ts: int
+    bbo_ts: int
+
+
+def okex_bbo_quote(data: dict) -> BboQuote:
+    ts = int(data["ts"])
+    return BboQuote(
+        bid=tuple(data["bids"][0][:2]) if data["bids"] else None,
+        ask=tuple(data["asks"][0][:2]) if data["asks"] else None,
+        ts=ts,
+        version=ts,
+    )
+
+
+def binance_bbo_quote(event: dict) -> BboQuote:
+    return BboQuote(
+        bid=(event["b"], event["B"]),
+        ask=(event["a"], event["A"]),
+        ts=event["T"],
+        version=event["u"],
+    )
+
+
+def merge_bbo(bids: list, asks: list, quote: BboQuote) -> Tuple[list, list]:
+    """
+    overlay a best bid/ask quote on depth levels, dropping the depth levels
+    the quote has crossed, the level count is kept
+    """
+    if quote.bid:
+        price = float(quote.bid[0])
+        bids = ([quote.bid] + [i for i in bids if float(i[0]) < price])[:max(len(bids), 1)]
+    if quote.ask:
+        price = float(quote.ask[0])
+        asks = ([quote.ask] + [i for i in asks if float(i[0]) > price])[:max(len(asks), 1)]
+    return bids, asks
+
+
+class BboMerger:
+    """
+    keep the latest depth levels and bbo quote per symbol, and publish the
+    depth levels with the quote on top whenever the quote is not older
+    """
+
+    def __init__(self):
+        self.depths: Dict[str, tuple] = {}
+        self.quotes: Dict[str, BboQuote] = {}
+
+    def on_depth(
+        self, name: str, bids: list, asks: list, ts: int, version: int
+    ) -> MergedBook:
+        self.depths[name] = (bids, asks, ts, version)
+        return self._merge(name)
+
+    def on_bbo(self, name: str, quote: BboQuote) -> Optional[MergedBook]:
+        """
+        return: None until a depth update of the symbol is received
+        """
+        self.quotes[name] = quote
+        if name not in self.depths:
+            return None
+        return self._merge(name)
+
+    def _merge(self, name: str) -> MergedBook:
+        bids, asks, depth_ts, depth_version = self.depths[name]
+        quote = self.quotes.get(name)
+        if quote is None:
+            return MergedBook(bids, asks, depth_ts, 0)
+        if quote.version >= depth_version:
+            bids, asks = merge_bbo(bids, asks, quote)
+        return MergedBook(bids, asks, depth_ts, quote.ts)
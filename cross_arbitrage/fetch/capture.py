@@ -0,0 +1,178 @@
+import glob
+import logging
+import mmap
+import os
+import struct
+import time
+from collections import deque
+from typing import Iterator, List, Tuple
+
+from cross_arbitrage.utils.context import CancelContext, sleep_with_context
+
+# segment file: magic, then frames of (payload length, recv_ts, conn_id) + payload
+SEGMENT_MAGIC = b"XACAP001"
+FRAME_HEADER = struct.Struct("<IdH")
+SEGMENT_SUFFIX = ".cap"
+
+
+def segment_path(directory: str, name: str, start_ts: float, seq: int) -> str:
+    return os.path.join(
+        directory, f"{name}-{int(start_ts * 1000)}-{seq}{SEGMENT_SUFFIX}"
+    )
+
+
+def _segment_order(path: str) -> Tuple[int, int]:
+    start_ms, seq = os.path.basename(path)[: -len(SEGMENT_SUFFIX)].rsplit("-", 2)[1:]
+    return int(start_ms), int(seq)
+
+
+def list_segments(directory: str, name: str = "*") -> List[str]:
+    """
+    segments in recording order, the file name carries the start time in ms
+    and the segment number of the writer
+    """
+    paths = glob.glob(os.path.join(directory, f"{name}-*{SEGMENT_SUFFIX}"))
+    return sorted(paths, key=_segment_order)
+
+
+class CaptureWriter:
+    """
+    append raw websocket frames to rotating segment files. `write` only
+    appends to an in-memory deque on the websocket thread, `run` drains,
+    encodes and writes it on its own thread
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        max_segments: int = 0,
+        flush_interval: float = 0.2,
+    ):
+        self.directory = directory
+        self.name = name
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+        self.batch = deque()
+        self.file = None
+        self.file_size = 0
+        self.segment_count = 0
+        self.frame_count = 0
+        self.byte_count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, message, recv_ts: float = None, conn_id: int = 0):
+        # deque append and popleft are thread safe, no lock on the hot path
+        self.batch.append(
+            (recv_ts if recv_ts is not None else time.time(), conn_id, message)
+        )
+
+    def _open_segment(self):
+        if self.file is not None:
+            self.file.close()
+        path = segment_path(
+            self.directory, self.name, time.time(), self.segment_count
+        )
+        self.segment_count += 1
+        self.file = open(path, "wb")
+        self.file.write(SEGMENT_MAGIC)
+        self.file_size = len(SEGMENT_MAGIC)
+        logging.info(f"-- {self.name} capture segment: {path}")
+        if self.max_segments > 0:
+            for old in list_segments(self.directory, self.name)[: -self.max_segments]:
+                os.remove(old)
+
+    def flush(self):
+        # frames appended while draining are left for the next flush
+        batch = [self.batch.popleft() for _ in range(len(self.batch))]
+        if not batch:
+            return
+        chunks = []
+        size = 0
+        for recv_ts, conn_id, message in batch:
+            if isinstance(message, str):
+                message = message.encode("utf-8")
+            chunks.append(FRAME_HEADER.pack(len(message), recv_ts, conn_id))
+            chunks.append(message)
+            size += FRAME_HEADER.size + len(message)
+        if self.file is None or self.file_size + size > self.segment_bytes:
+            self._open_segment()
+        self.file.write(b"".join(chunks))
+        self.file.flush()
+        self.file_size += size
+        self.frame_count += len(batch)
+        self.byte_count += size
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def run(self, cancel_ctx: CancelContext):
+        while not cancel_ctx.is_canceled():
+            sleep_with_context(cancel_ctx, self.flush_interval)
+            try:
+                self.flush()
+            except Exception as ex:
+                logging.error(f"{self.name} capture failed: {ex}")
+                logging.exception(ex)
+        self.close()
+        logging.info(
+            f"-- {self.name} capture closed: frames={self.frame_count} bytes={self.byte_count}"
+        )
+
+
+class CaptureReader:
+    """
+    mmap one segment and iterate `(recv_ts, conn_id, payload)` frames, the
+    payload is a memoryview into the map and is valid until `close`
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[: len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+            self.close()
+            raise ValueError(f"not a capture segment: {path}")
+        self.view = memoryview(self.map)
+
+    def __iter__(self) -> Iterator[Tuple[float, int, memoryview]]:
+        view = self.view
+        offset = len(SEGMENT_MAGIC)
+        end = len(view)
+        header_size = FRAME_HEADER.size
+        while offset + header_size <= end:
+            length, recv_ts, conn_id = FRAME_HEADER.unpack_from(view, offset)
+            offset += header_size
+            if offset + length > end:
+                # the writer was stopped in the middle of a batch
+                break
+            yield recv_ts, conn_id, view[offset:offset + length]
+            offset += length
+
+    def close(self):
+        if getattr(self, "view", None) is not None:
+            self.view.release()
+            self.view = None
+        try:
+            self.map.close()
+        except BufferError:
+            # payload views still referenced, the map is closed on collection
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def iter_capture(directory: str, name: str = "*") -> Iterator[Tuple[float, int, memoryview]]:
+    for path in list_segments(directory, name):
+        with CaptureReader(path) as reader:
+            yield from reader
@@ -4,7 +4,10 @@ from typing import Dict, List, Union
 from pydantic import BaseModel, root_validator, validator
 
 from cross_arbitrage.config.account import AccountConfig
-from cross_arbitrage.config.constant import ENVS
+from cross_arbitrage.config.constant import (AGG_MODES, ENVS, INGEST_MODES,
+                                             ORDERBOOK_FEEDS,
+                                             ORDERBOOK_PRICE_FORMATS,
+                                             WS_TRANSPORTS)
 from cross_arbitrage.config.log import LogConfig
 from cross_arbitrage.config.network import NetworkConfig
 from cross_arbitrage.config.redis import RedisConfig
@@ -26,6 +29,53 @@ class FetchConfig(BaseModel):
     # fetch cli config
     name: str = "fetch_cli"
     worker_number: int = 2
+    # raise the worker number to ceil(len(symbols) / symbols_per_worker), 0 to disable
+    symbols_per_worker: int = 0
+    # thread: run all ingest in this process, process: one process per exchange
+    ingest_mode: str = "thread"
+    # keep only the latest pending message per symbol in the worker queues,
+    # snapshot feed only
+    ingest_conflate: bool = False
+    # str: decimal strings, tick: [price_ticks, qty] levels with a `tick`
+    # field. every reader of the snapshots and the stream must handle tick
+    # before it is enabled
+    orderbook_price_format: str = "str"
+    # snapshot: 5 level snapshot channels, incremental: local books from diff channels
+    orderbook_feed: str = "snapshot"
+    # levels published per side in the incremental feed
+    orderbook_depth: int = 20
+    # merge tick by tick best bid/ask (binance bookTicker, okex bbo-tbt) into the books
+    orderbook_bbo: bool = False
+    # thread: websocket-client threads and worker queues, asyncio: one event
+    # loop per process handling messages inline
+    ws_transport: str = "thread"
+    # run the asyncio transport on uvloop when it is installed
+    ws_uvloop: bool = True
+    # parallel connections per exchange subscribed to the same symbols,
+    # the first arrival of every update wins
+    ws_redundancy: int = 1
+    # split the symbols of each exchange across this many connections
+    ws_shards: int = 1
+    # record raw websocket frames to rotating segments in this directory, "" to disable
+    capture_dir: str = ""
+    capture_segment_mb: int = 64
+    # keep the latest segments per exchange, 0 to keep all
+    capture_max_segments: int = 0
+    # resubscribe a symbol and flag its snapshot stale after this many
+    # seconds without an update, 0 to disable
+    feed_stale_seconds: float = 0
+    # redis: aggregate from the redis snapshots, fused: the fetch workers
+    # aggregate from their in-memory books, thread ingest mode only
+    agg_mode: str = "redis"
+    # aggregator threads, each waiting on the notify keys of its share of
+    # the symbols
+    agg_workers: int = 1
+    # aggregate every symbol with one atomic redis script call, json stream
+    # format only. falls back to python when scripting is unavailable
+    agg_script: bool = True
+    # skip aggregations whose other leg is older than this, 0 to only skip
+    # the legs flagged stale
+    orderbook_freshness_ms: int = 0
 
     @validator("env")
     def env_must_in_list(cls, value):
@@ -33,6 +83,38 @@ class FetchConfig(BaseModel):
             raise ValueError(f"env must in {','.join(ENVS)}")
         return value
 
+    @validator("ingest_mode")
+    def ingest_mode_must_in_list(cls, value):
+        if value not in INGEST_MODES:
+            raise ValueError(f"ingest_mode must in {','.join(INGEST_MODES)}")
+        return value
+
+    @validator("orderbook_price_format")
+    def orderbook_price_format_must_in_list(cls, value):
+        if value not in ORDERBOOK_PRICE_FORMATS:
+            raise ValueError(
+                f"orderbook_price_format must in {','.join(ORDERBOOK_PRICE_FORMATS)}"
+            )
+        return value
+
+    @validator("orderbook_feed")
+    def orderbook_feed_must_in_list(cls, value):
+        if value not in ORDERBOOK_FEEDS:
+            raise ValueError(f"orderbook_feed must in {','.join(ORDERBOOK_FEEDS)}")
+        return value
+
+    @validator("ws_transport")
+    def ws_transport_must_in_list(cls, value):
+        if value not in WS_TRANSPORTS:
+            raise ValueError(f"ws_transport must in {','.join(WS_TRANSPORTS)}")
+        return value
+
+    @validator("agg_mode")
+    def agg_mode_must_in_list(cls, value):
+        if value not in AGG_MODES:
+            raise ValueError(f"agg_mode must in {','.join(AGG_MODES)}")
+        return value
+
     @root_validator
     def update_exchange_name(cls, values):
         exchanges = values.get('exchanges')
@@ -58,6 +140,9 @@ class FetchConfig(BaseModel):
         else:
             raise Exception(f"unsupport symbol info for {symbol}: {res}")
 
+    def use_fused_agg(self) -> bool:
+        return self.agg_mode == "fused" and self.ingest_mode == "thread"
+
     def print(self):
         logging.info(f"=> name:        {self.name}")
         logging.info(f"=> env:         {self.env}")
@@ -70,7 +155,20 @@ class FetchConfig(BaseModel):
         logging.info(f"=> len(symbols):{len(self.symbol_name_datas.keys())}")
         logging.info(f"=> len(enabled):{len(self.cross_arbitrage_symbol_datas)}")
         logging.info(f"=> redis:       {self.redis.url}")
-        logging.info(f"=> ob stream:   {self.redis.orderbook_stream}")
+        logging.info(f"=> ob stream:   {self.redis.orderbook_stream} ({self.redis.orderbook_stream_format})")
+        logging.info(f"=> ingest mode: {self.ingest_mode}")
+        logging.info(f"=> conflate:    {self.ingest_conflate}")
+        logging.info(f"=> ws transport:{self.ws_transport}")
+        logging.info(f"=> ws redundancy:{self.ws_redundancy}")
+        logging.info(f"=> ws shards:  {self.ws_shards}")
+        logging.info(f"=> capture dir: {self.capture_dir or '-'}")
+        logging.info(f"=> stale secs:  {self.feed_stale_seconds}")
+        logging.info(f"=> freshness:   {self.orderbook_freshness_ms}ms")
+        logging.info(f"=> agg mode:    {self.agg_mode}")
+        logging.info(f"=> agg workers: {self.agg_workers}")
+        logging.info(f"=> agg script:  {self.agg_script}")
+        logging.info(f"=> ob feed:     {self.orderbook_feed}")
+        logging.info(f"=> ob bbo:      {self.orderbook_bbo}")
 
 
     @classmethod
@@ -1,23 +1,55 @@
 # import json
-from decimal import Decimal
+import functools
 import logging
+import math
+import multiprocessing
+import os
 import queue
+import signal
 import sys
 import threading
 import time
-import numpy as np
+from typing import List, Optional, Tuple, Union
 
 import orjson as json
 import redis
 
+from cross_arbitrage.exchange.async_ws import (AsyncWsClientMixin,
+                                              AsyncWsTransport,
+                                              BinanceUsdsAsyncWebSocketClient,
+                                              OkexAsyncWebSocketClient)
 from cross_arbitrage.exchange.binance_usdm_ws import \
     BinanceUsdsPublicWebSocketClient
 from cross_arbitrage.exchange.okex_ws import OkexPublicWebSocketClient
+from cross_arbitrage.fetch.agg_orderbook import (FusedAggregator,
+                                                start_agg_latency)
+from cross_arbitrage.fetch.capture import CaptureWriter
 from cross_arbitrage.fetch.config import FetchConfig
+from cross_arbitrage.fetch.ingest_queue import (ConnectionQueue,
+                                                IngestPartition,
+                                                PartitionedQueue,
+                                                binance_conflate_key,
+                                                binance_route_key,
+                                                okex_conflate_key,
+                                                okex_route_key)
+from cross_arbitrage.fetch.orderbook_handler import (BinanceOrderbookHandler,
+                                                     OkexOrderbookHandler,
+                                                     OrderbookHandler,
+                                                     orderbook_handlers,
+                                                     stamp_orderbook)
+from cross_arbitrage.fetch.publish import (AsyncOrderbookPublisher,
+                                           OrderbookPublisher, PublishStats)
+from cross_arbitrage.fetch.redundancy import RedundancyStats
+from cross_arbitrage.fetch.staleness import FeedWatchdog
 from cross_arbitrage.fetch.utils.common import now_ms
+from cross_arbitrage.fetch.utils.orderbook import (build_tick_table,
+                                                   get_exchange_symbol_info)
 from cross_arbitrage.fetch.utils.redis import (get_ob_notify_key,
+                                               get_ob_stale_key,
                                                get_ob_storage_key)
-from cross_arbitrage.utils.context import CancelContext
+from cross_arbitrage.utils.context import CancelContext, sleep_with_context
+from cross_arbitrage.utils.exchange import create_exchange
+from cross_arbitrage.utils.logger import init_logger
 
 
 def start_exchange_wsclient(ws, ex_name, config_symbols):
@@ -43,16 +75,61 @@ def start_exchange_wsclient(ws, ex_name, config_symbols):
     )
 
 
+def wait_resubscribe_requests(resubscribe_queue, timeout: float) -> List[str]:
+    """
+    wait up to `timeout` seconds, return: exchange symbol names to resubscribe
+    """
+    if resubscribe_queue is None:
+        time.sleep(timeout)
+        return []
+    try:
+        symbols = {resubscribe_queue.get(timeout=timeout)}
+    except queue.Empty:
+        return []
+    while True:
+        try:
+            symbols.add(resubscribe_queue.get_nowait())
+        except queue.Empty:
+            break
+    return list(symbols)
+
+
+def ws_client_args(ex_name: str, conf: FetchConfig) -> dict:
+    match ex_name:
+        case "okex":
+            return {
+                "ping_interval": 15,
+                "ping_timeout": 8,
+                "http_proxy": conf.network.http_proxy,
+                "order_book_channel": (
+                    "books" if conf.orderbook_feed == "incremental" else "books5"
+                ),
+                "bbo_channel": "bbo-tbt" if conf.orderbook_bbo else None,
+            }
+        case "binance":
+            return {
+                "ping_interval": 30,
+                "ping_timeout": 10,
+                "http_proxy": conf.network.http_proxy,
+                "order_book_depth": (
+                    "" if conf.orderbook_feed == "incremental" else 5
+                ),
+                "watch_book_ticker": conf.orderbook_bbo,
+            }
+        case _:
+            raise ValueError(f"unsupported exchange: {ex_name}")
+
+
 def start_okex_ws_task(
-    cancel_ctx, config_symbols, task_queue, conf: FetchConfig
+    cancel_ctx, config_symbols, task_queue, conf: FetchConfig,
+    resubscribe_queue=None, capture=None,
 ):
     try:
         ws = OkexPublicWebSocketClient(
             context_args={
                 "task_queue": task_queue,
-                "ping_interval": 15,
-                "ping_timeout": 8,
-                "http_proxy": conf.network.http_proxy,
+                "capture": capture,
+                **ws_client_args("okex", conf),
             },
         )
         start_exchange_wsclient(ws, "okex", config_symbols)
@@ -72,19 +149,22 @@ def start_okex_ws_task(
             ws.stop_client()
             time.sleep(2)
             start_exchange_wsclient(ws, "okex", config_symbols)
-        time.sleep(5)
+
+        symbols = wait_resubscribe_requests(resubscribe_queue, 5)
+        if symbols and ws.get_status() == "CONNECTED":
+            ws.resubscribe_order_books(symbols)
 
 
 def start_binance_ws_task(
-    cancel_ctx, config_symbols, task_queue, conf: FetchConfig
+    cancel_ctx, config_symbols, task_queue, conf: FetchConfig,
+    resubscribe_queue=None, capture=None,
 ):
     try:
         ws = BinanceUsdsPublicWebSocketClient(
             context_args={
                 "task_queue": task_queue,
-                "ping_interval": 30,
-                "ping_timeout": 10,
-                "http_proxy": conf.network.http_proxy,
+                "capture": capture,
+                **ws_client_args("binance", conf),
             },
         )
         start_exchange_wsclient(ws, "binance", config_symbols)
@@ -103,20 +183,15 @@ def start_binance_ws_task(
             time.sleep(2)
             start_exchange_wsclient(ws, "binance", config_symbols)
 
-        time.sleep(5)
+        symbols = wait_resubscribe_requests(resubscribe_queue, 5)
+        if symbols and ws.get_status() == "CONNECTED":
+            ws.resubscribe_order_books(symbols)
 
 
-def process_okex_ws_task(cancel_ctx, config_symbols, task_queue, conf):
-    ex_name = "okex"
-    symbol_cache = {
-        (v[ex_name]["name"] if isinstance(v[ex_name], dict) else v[ex_name]): k
-        for k, v in config_symbols.items()
-    }
-    symbol_info_cache = {}
-    redis_client = redis.Redis.from_url(
-        conf.redis.url, encoding="utf-8", decode_responses=True
-    )
-
+def process_ws_task(
+    cancel_ctx: CancelContext, task_queue: IngestPartition,
+    handler: OrderbookHandler, publisher: OrderbookPublisher,
+):
     count = 0
     while True:
         if cancel_ctx.is_canceled():
@@ -137,45 +212,17 @@ def process_okex_ws_task(cancel_ctx, config_symbols, task_queue, conf):
                     res.append(data)
                 except queue.Empty:
                     pass
-            for item_raw in res:
-                item = json.loads(item_raw)
-                # print(f"-- {ex_name} {item}")
-                if item.get("arg") and item.get("data"):
-                    d = item["data"][0]
-                    symbol = symbol_cache[d["instId"]]
-                    if symbol:
-                        # if conf.debug:
-                        #     now = now_ms()
-                        #     logging.info(
-                        #         f"-- {ex_name} {symbol_cache[d['instId']]} {now - int(d['ts'])}ms"
-                        #     )
-                        try:
-                            key = get_ob_storage_key(ex_name, symbol)
-                            notify_key = get_ob_notify_key(ex_name, symbol)
-                            result = {
-                                "ex": ex_name,
-                                "symbol": symbol,
-                                "ts": int(d["ts"]),
-                                "bids": [i[:2] for i in d["bids"]],
-                                "asks": [i[:2] for i in d["asks"]],
-                            }
-                            # print(f">> {ex_name} {result}")
-                            if (
-                                symbol_info_cache.get(symbol)
-                                and symbol_info_cache[symbol] == result
-                            ):
-                                continue
-                            symbol_info_cache[symbol] = result
-                            redis_client.set(key, json.dumps(result))
-                            if redis_client.llen(notify_key) == 0:
-                                redis_client.lpush(
-                                    notify_key, json.dumps({"updated": True})
-                                )
-                        except Exception as ex:
-                            logging.error(ex)
-                    # logging.info(
-                    #     f"{d['instId']} ts={d['ts']} duration={round(time.time() - float(int(d['ts'])/1000),3)}s {d['bids']}"
-                    # )
+            pending = []
+            for recv_ts, item_raw, conn_id in res:
+                task_queue.record_lag(recv_ts)
+                try:
+                    result = handler.handle(item_raw, conn_id, recv_ts)
+                except Exception as ex:
+                    logging.exception(ex)
+                    continue
+                if result:
+                    pending.append(stamp_orderbook(result, recv_ts))
+            publisher.publish(pending)
         except Exception as ex:
             logging.exception(ex)
         finally:
@@ -183,115 +230,64 @@ def process_okex_ws_task(cancel_ctx, config_symbols, task_queue, conf):
             if count == sys.maxsize:
                 count = 0
             if count % 1000 == 0:
-                logging.info(
-                    f"--------> okex task queue size: {task_queue.qsize()}"
-                )
-
-
-def normalize_orderbook_5(ob, multiplier):
-    # res = np.array(ob).astype(Decimal)
-    # multiplier = np.array([1/multiplier,1])
-    # return (res * multiplier).astype(str).tolist()
-    for row in ob:
-        row[0] = str(Decimal(str(row[0]))/Decimal(str(multiplier)))
-    return ob
+                task_queue.report()
 
+    handler.close()
 
-def process_binance_ws_task(cancel_ctx, config_symbols, task_queue, conf):
-    ex_name = "binance"
-    symbol_cache = {
-        (v[ex_name]["name"] if isinstance(v[ex_name], dict) else v[ex_name]): k
-        for k, v in config_symbols.items()
-    }
-    symbol_multiplier_cache = {
-        (v[ex_name]["name"] if isinstance(v[ex_name], dict) else v[ex_name]): (
-            v[ex_name]["multiplier"] if isinstance(v[ex_name], dict) else 1.0
-        )
-        for _, v in config_symbols.items()
-    }
-    # print('symbol_multiplier_cache', symbol_multiplier_cache)
-    symbol_info_cache = {}
 
+def get_orderbook_publisher(conf: FetchConfig, ex_name: str, stats: PublishStats,
+                            fused_agg: Optional[FusedAggregator] = None):
+    """
+    the fused aggregator when there is one, no redis publisher is needed then
+    """
+    if fused_agg is not None:
+        return fused_agg
     redis_client = redis.Redis.from_url(
         conf.redis.url, encoding="utf-8", decode_responses=True
     )
+    return OrderbookPublisher(redis_client, ex_name, stats)
 
-    count = 0
-    while True:
-        if cancel_ctx.is_canceled():
-            break
-        try:
-            res = []
-            data = None
-            if task_queue.qsize() > 0:
-                try:
-                    for _ in range(task_queue.qsize()):
-                        data = task_queue.get_nowait()
-                        res.append(data)
-                except queue.Empty:
-                    pass
-            else:
-                try:
-                    data = task_queue.get(block=True, timeout=5)
-                    res.append(data)
-                except queue.Empty:
-                    pass
-            for item_raw in res:
-                item = json.loads(item_raw)
-                # print(f"-- {ex_name} {item}")
-                if item.get("E"):
-                    symbol = symbol_cache[item["s"]]
-                    if symbol:
-                        # if conf.debug:
-                        #     now = now_ms()
-                        #     logging.info(
-                        #         f"-- {ex_name} {symbol} {now - int(item['T'])}ms"
-                        #     )
-                        try:
-                            key = get_ob_storage_key(ex_name, symbol)
-                            notify_key = get_ob_notify_key(ex_name, symbol)
-                            result = {
-                                "ex": ex_name,
-                                "symbol": symbol,
-                                "ts": item["T"],
-                                "bids": normalize_orderbook_5(item["b"], symbol_multiplier_cache[item['s']]),
-                                "asks": normalize_orderbook_5(item["a"], symbol_multiplier_cache[item['s']]),
-                            }
-                            # print(f">> {ex_name} {result}")
-                            if (
-                                symbol_info_cache.get(symbol)
-                                and symbol_info_cache[symbol] == result
-                            ):
-                                continue
-                            symbol_info_cache[symbol] = result
-                            redis_client.set(key, json.dumps(result))
-                            if redis_client.llen(notify_key) == 0:
-                                redis_client.lpush(
-                                    notify_key, json.dumps({"updated": True})
-                                )
-                        except Exception as ex:
-                            logging.error(ex)
-                            logging.exception(ex)
-                # if item.get("E"):
-                #     logging.info(
-                #         f"{item['s']} ts={item['E']} duration={round(time.time() - float(item['E']/1000),3)}s {item['b']}"
-                #     )
-        except Exception as ex:
-            logging.exception(ex)
-        finally:
-            count += 1
-            if count == sys.maxsize:
-                count = 0
-            if count % 1000 == 0:
-                logging.info(
-                    f"--------> binance task queue size: {task_queue.qsize()}"
-                )
 
+def process_okex_ws_task(cancel_ctx, config_symbols, task_queue, conf, stats,
+                         tick_table=None, resubscribe=None,
+                         redundancy_stats=None, touch=None, fused_agg=None):
+    handler = OkexOrderbookHandler(
+        conf, config_symbols, tick_table, resubscribe, redundancy_stats, touch
+    )
+    publisher = get_orderbook_publisher(conf, handler.ex_name, stats, fused_agg)
+    process_ws_task(cancel_ctx, task_queue, handler, publisher)
 
-def fetch_orderbook_mainloop(conf: FetchConfig, cancel_ctx: CancelContext):
-    redis_client = redis.Redis.from_url(
-        conf.redis.url, encoding="utf-8", decode_responses=True
+
+def process_binance_ws_task(cancel_ctx, config_symbols, task_queue, conf, stats,
+                            tick_table=None, resubscribe=None,
+                            redundancy_stats=None, touch=None, fused_agg=None):
+    handler = BinanceOrderbookHandler(
+        conf, config_symbols, tick_table, resubscribe, redundancy_stats, touch
     )
+    publisher = get_orderbook_publisher(conf, handler.ex_name, stats, fused_agg)
+    process_ws_task(cancel_ctx, task_queue, handler, publisher)
+
+
+def shard_symbols(config_symbols: dict, shard_number: int) -> List[dict]:
+    """
+    split `config_symbols` round robin into at most `shard_number` non-empty
+    parts, one per connection
+    """
+    items = list(config_symbols.items())
+    shard_number = max(1, min(shard_number, len(items)))
+    return [dict(items[i::shard_number]) for i in range(shard_number)]
+
+
+def get_partition_number(conf: FetchConfig, symbol_number: int) -> int:
+    partition_number = conf.worker_number
+    if conf.symbols_per_worker > 0:
+        partition_number = max(
+            partition_number, math.ceil(symbol_number / conf.symbols_per_worker)
+        )
+    return max(partition_number, 1)
+
+
+def get_config_symbols(conf: FetchConfig) -> dict:
     enabled_symbols = conf.cross_arbitrage_symbol_datas
     if not enabled_symbols:
         logging.warning(
@@ -299,10 +295,12 @@ def fetch_orderbook_mainloop(conf: FetchConfig, cancel_ctx: CancelContext):
         )
         enabled_symbols = list(conf.symbol_name_datas.keys())
 
-    config_symbols = {
+    return {
         k: v for k, v in conf.symbol_name_datas.items() if k in enabled_symbols
     }
-    logging.info(config_symbols)
+
+
+def reset_orderbook_data(redis_client: redis.Redis, config_symbols: dict):
     # clear notify list
     for ex_name in ["okex", "binance"]:
         for symbol in config_symbols.keys():
@@ -311,54 +309,450 @@ def fetch_orderbook_mainloop(conf: FetchConfig, cancel_ctx: CancelContext):
             )
             redis_client.delete(get_ob_notify_key(ex_name, symbol))
             redis_client.delete(get_ob_storage_key(ex_name, symbol))
+            redis_client.delete(get_ob_stale_key(ex_name, symbol))
 
-    binance_task_queue = queue.Queue(maxsize=0)
-    okex_task_queue = queue.Queue(maxsize=0)
-    thread_task_objects = []
 
-    thread_task_objects.append(
-        threading.Thread(
-            target=start_okex_ws_task,
-            args=(cancel_ctx, config_symbols, okex_task_queue, conf),
-            name=f"okex_ws_task",
-            daemon=True,
-        )
+def fetch_orderbook_mainloop(conf: FetchConfig, cancel_ctx: CancelContext):
+    redis_client = redis.Redis.from_url(
+        conf.redis.url, encoding="utf-8", decode_responses=True
     )
+    config_symbols = get_config_symbols(conf)
+    logging.info(config_symbols)
+    reset_orderbook_data(redis_client, config_symbols)
+
+    match conf.ingest_mode:
+        case "process":
+            if conf.agg_mode == "fused":
+                logging.warning("-- agg_mode fused ignored in the process ingest mode")
+            fetch_orderbook_supervisor(conf, cancel_ctx, config_symbols)
+        case _:
+            transport = start_ws_transport(conf, "fetch")
+            thread_task_objects = []
+            task_queues = []
+            fused_agg = None
+            if conf.use_fused_agg():
+                start_agg_latency(conf, cancel_ctx, "fetch")
+                fused_agg = FusedAggregator(
+                    redis_client,
+                    list(conf.exchanges.keys()),
+                    conf.redis,
+                    conf.orderbook_freshness_ms,
+                )
+                fused_thread = threading.Thread(
+                    target=fused_agg.run, args=(cancel_ctx,),
+                    name="fused_agg_thread", daemon=True,
+                )
+                fused_thread.start()
+                thread_task_objects.append(fused_thread)
+            for ex_name in ["okex", "binance"]:
+                threads, sources = start_exchange_ingest(
+                    ex_name, conf, config_symbols, cancel_ctx, transport,
+                    fused_agg,
+                )
+                thread_task_objects.extend(threads)
+                task_queues.extend(sources)
 
-    thread_task_objects.append(
-        threading.Thread(
-            target=start_binance_ws_task,
-            args=(cancel_ctx, config_symbols, binance_task_queue, conf),
-            name=f"binance_ws_task",
-            daemon=True,
+            stats_thread = threading.Thread(
+                target=ingest_stats_loop,
+                args=(cancel_ctx, "fetch", task_queues),
+                name="fetch_ingest_stats_thread",
+                daemon=True,
+            )
+            stats_thread.start()
+            thread_task_objects.append(stats_thread)
+
+            while True:
+                if cancel_ctx.is_canceled():
+                    for thread_object in thread_task_objects:
+                        thread_object.join()
+                    if transport:
+                        transport.stop()
+                    break
+
+                time.sleep(5)
+
+
+_ws_tasks = {
+    "okex": start_okex_ws_task,
+    "binance": start_binance_ws_task,
+}
+
+_process_tasks = {
+    "okex": process_okex_ws_task,
+    "binance": process_binance_ws_task,
+}
+
+_route_key_fns = {
+    "okex": okex_route_key,
+    "binance": binance_route_key,
+}
+
+_conflate_key_fns = {
+    "okex": okex_conflate_key,
+    "binance": binance_conflate_key,
+}
+
+_async_ws_clients = {
+    "okex": OkexAsyncWebSocketClient,
+    "binance": BinanceUsdsAsyncWebSocketClient,
+}
+
+
+def get_process_task(ex_name: str):
+    """
+    return: the worker target of `ex_name`, handle and publish its messages
+    """
+    return _process_tasks[ex_name]
+
+
+def get_route_key_fn(ex_name: str):
+    """
+    return: the partition key of a raw `ex_name` message
+    """
+    return _route_key_fns[ex_name]
+
+
+def load_tick_table(ex_name: str, conf: FetchConfig, config_symbols):
+    try:
+        exchange = create_exchange(
+            conf.exchanges[ex_name], proxy=conf.network.proxies()
+        )
+        exchange.load_markets()
+        return build_tick_table(exchange, ex_name, config_symbols)
+    except Exception as ex:
+        logging.error(
+            f"load {ex_name} tick table failed, fallback to string price format: {ex}"
         )
+        logging.exception(ex)
+        return None
+
+
+def start_ws_transport(conf: FetchConfig, name: str) -> Optional[AsyncWsTransport]:
+    if conf.ws_transport != "asyncio":
+        return None
+    transport = AsyncWsTransport(f"{name}_ws", use_uvloop=conf.ws_uvloop)
+    transport.start()
+    return transport
+
+
+def get_redundancy_stats(ex_name: str, conf: FetchConfig) -> Optional[RedundancyStats]:
+    if conf.ws_redundancy <= 1:
+        return None
+    return RedundancyStats(f"{ex_name} ws", conf.ws_redundancy)
+
+
+def get_feed_watchdog(
+    ex_name: str, conf: FetchConfig, config_symbols, resubscribe,
+    fused_agg: FusedAggregator = None,
+) -> Optional[FeedWatchdog]:
+    if conf.feed_stale_seconds <= 0:
+        return None
+    redis_client = redis.Redis.from_url(
+        conf.redis.url, encoding="utf-8", decode_responses=True
+    )
+    return FeedWatchdog(
+        ex_name,
+        {get_exchange_symbol_info(v[ex_name])[0]: k for k, v in config_symbols.items()},
+        resubscribe,
+        conf.feed_stale_seconds,
+        redis_client,
+        fused_agg.stale_legs if fused_agg is not None else None,
     )
 
-    for i in range(conf.worker_number):
-        thread_task_objects.append(
-            threading.Thread(
-                target=process_okex_ws_task,
-                args=(cancel_ctx, config_symbols, okex_task_queue, conf),
-                name=f"process_okex_ws_task_{i}",
-                daemon=True,
+
+def _watchdog_touch(watchdog: Optional[FeedWatchdog]):
+    return watchdog.touch if watchdog is not None else None
+
+
+def start_exchange_async_ingest(
+    ex_name: str, conf: FetchConfig, config_symbols, transport: AsyncWsTransport,
+    capture: CaptureWriter = None, fused_agg: FusedAggregator = None,
+) -> Tuple[List[AsyncWsClientMixin], Optional[FeedWatchdog]]:
+    """
+    decode, normalize and publish inline on the event loop, no worker threads
+    """
+    tick_table = None
+    if conf.orderbook_price_format == "tick":
+        tick_table = load_tick_table(ex_name, conf, config_symbols)
+    publisher = fused_agg
+    if publisher is None:
+        publisher = AsyncOrderbookPublisher(conf.redis.url, ex_name)
+    shards = shard_symbols(config_symbols, conf.ws_shards)
+    shard_index = _get_shard_index(ex_name, shards)
+    shard_clients = [[] for _ in shards]
+
+    def _resubscribe(name):
+        # every redundant connection of the shard rebuilds its book
+        for ws in shard_clients[shard_index[name]]:
+            ws.resubscribe_order_books([name])
+
+    watchdog = get_feed_watchdog(ex_name, conf, config_symbols, _resubscribe, fused_agg)
+    handler = orderbook_handlers[ex_name](
+        conf, config_symbols, tick_table, _resubscribe,
+        get_redundancy_stats(ex_name, conf), _watchdog_touch(watchdog),
+    )
+
+    def _message_handler(conn_id):
+        def _on_message(message):
+            recv_ts = time.time()
+            result = handler.handle(message, conn_id, recv_ts)
+            if result:
+                publisher.add(stamp_orderbook(result, recv_ts))
+        return _on_message
+
+    for shard_id, shard in enumerate(shards):
+        for conn_id in range(max(conf.ws_redundancy, 1)):
+            ws = _async_ws_clients[ex_name](
+                transport,
+                context_args={
+                    "name": f"{ex_name}/{shard_id}/{conn_id}",
+                    "capture": _capture_fn(capture, conn_id),
+                    **ws_client_args(ex_name, conf),
+                },
+                message_handler=_message_handler(conn_id),
             )
+            start_exchange_wsclient(ws, ex_name, shard)
+            shard_clients[shard_id].append(ws)
+    return [ws for clients in shard_clients for ws in clients], watchdog
+
+
+def _capture_fn(capture: Optional[CaptureWriter], conn_id: int):
+    if capture is None:
+        return None
+    return functools.partial(capture.write, conn_id=conn_id)
+
+
+def _get_shard_index(ex_name: str, shards: List[dict]) -> dict:
+    """
+    return: {exchange symbol name: shard id}
+    """
+    return {
+        get_exchange_symbol_info(v[ex_name])[0]: shard_id
+        for shard_id, shard in enumerate(shards)
+        for v in shard.values()
+    }
+
+
+def start_exchange_ingest(
+    ex_name: str, conf: FetchConfig, config_symbols, cancel_ctx: CancelContext,
+    transport: AsyncWsTransport = None, fused_agg: FusedAggregator = None,
+) -> Tuple[List[threading.Thread], list]:
+    """
+    fused_agg: publish to it instead of the redis snapshot keys
+    return: (threads, per connection ingest sources with `name` and `message_count`)
+    """
+    thread_objects = []
+    capture = None
+    if conf.capture_dir:
+        capture = CaptureWriter(
+            conf.capture_dir, ex_name,
+            segment_bytes=conf.capture_segment_mb * 1024 * 1024,
+            max_segments=conf.capture_max_segments,
+        )
+        capture_thread = threading.Thread(
+            target=capture.run, args=(cancel_ctx,),
+            name=f"{ex_name}_capture_thread", daemon=True,
         )
-        thread_task_objects.append(
+        capture_thread.start()
+        thread_objects.append(capture_thread)
+
+    if transport is not None:
+        sources, watchdog = start_exchange_async_ingest(
+            ex_name, conf, config_symbols, transport, capture, fused_agg
+        )
+        return thread_objects + _start_watchdog(ex_name, watchdog, cancel_ctx), sources
+
+    partition_number = get_partition_number(conf, len(config_symbols))
+    logging.info(f"-- {ex_name} ingest partitions: {partition_number}")
+    conflate_key_fn = None
+    if conf.ingest_conflate:
+        if conf.orderbook_feed == "snapshot":
+            conflate_key_fn = _conflate_key_fns[ex_name]
+        else:
+            logging.warning(
+                f"-- {ex_name} ingest_conflate ignored for the {conf.orderbook_feed} feed"
+            )
+    task_queue = PartitionedQueue(
+        ex_name, partition_number, _route_key_fns[ex_name], conflate_key_fn
+    )
+    publish_stats = PublishStats(ex_name)
+    redundancy_stats = get_redundancy_stats(ex_name, conf)
+    tick_table = None
+    if conf.orderbook_price_format == "tick":
+        tick_table = load_tick_table(ex_name, conf, config_symbols)
+
+    shards = shard_symbols(config_symbols, conf.ws_shards)
+    shard_index = _get_shard_index(ex_name, shards)
+    logging.info(
+        f"-- {ex_name} ws shards: {[len(shard) for shard in shards]} symbols"
+    )
+    # exchange symbol names whose book must be rebuilt from a new
+    # subscription, one queue per connection so every redundant connection
+    # of the shard resubscribes
+    conn_number = max(conf.ws_redundancy, 1)
+    resubscribe_queues = [
+        [queue.Queue() for _ in range(conn_number)] for _ in shards
+    ]
+
+    def _resubscribe(name):
+        for resubscribe_queue in resubscribe_queues[shard_index[name]]:
+            resubscribe_queue.put(name)
+
+    watchdog = get_feed_watchdog(ex_name, conf, config_symbols, _resubscribe, fused_agg)
+    sources = []
+    new_threads = []
+    for shard_id, shard in enumerate(shards):
+        for conn_id in range(conn_number):
+            connection_queue = task_queue.connection(
+                conn_id, f"{ex_name}/{shard_id}/{conn_id}"
+            )
+            sources.append(connection_queue)
+            new_threads.append(
+                threading.Thread(
+                    target=_ws_tasks[ex_name],
+                    args=(cancel_ctx, shard, connection_queue, conf,
+                          resubscribe_queues[shard_id][conn_id],
+                          _capture_fn(capture, conn_id)),
+                    name=f"{ex_name}_ws_task_{shard_id}_{conn_id}",
+                    daemon=True,
+                )
+            )
+    for i in range(partition_number):
+        new_threads.append(
             threading.Thread(
-                target=process_binance_ws_task,
-                args=(cancel_ctx, config_symbols, binance_task_queue, conf),
-                name=f"process_binance_ws_task_{i}",
+                target=_process_tasks[ex_name],
+                args=(cancel_ctx, config_symbols, task_queue[i], conf,
+                      publish_stats, tick_table, _resubscribe,
+                      redundancy_stats, _watchdog_touch(watchdog), fused_agg),
+                name=f"process_{ex_name}_ws_task_{i}",
                 daemon=True,
             )
         )
 
-    for thread_object in thread_task_objects:
+    for thread_object in new_threads:
         thread_object.start()
+    return thread_objects + new_threads + _start_watchdog(ex_name, watchdog, cancel_ctx), sources
+
+
+def _start_watchdog(
+    ex_name: str, watchdog: Optional[FeedWatchdog], cancel_ctx: CancelContext
+) -> List[threading.Thread]:
+    if watchdog is None:
+        return []
+    logging.info(f"-- {ex_name} feed watchdog: {watchdog.stale_seconds}s")
+    t = threading.Thread(
+        target=watchdog.run, args=(cancel_ctx,),
+        name=f"{ex_name}_feed_watchdog_thread", daemon=True,
+    )
+    t.start()
+    return [t]
 
-    while True:
-        if cancel_ctx.is_canceled():
-            for thread_object in thread_task_objects:
-                thread_object.join()
+
+def ingest_stats_loop(
+    cancel_ctx: CancelContext,
+    name: str,
+    task_queues: List[Union[ConnectionQueue, AsyncWsClientMixin]],
+    interval: float = 10,
+):
+    """
+    log the total message rate, and the rate of every shard connection
+    named `<exchange>/<shard>/<conn>` when there are more than one
+    """
+    last_time = time.monotonic()
+    last_cpu = time.process_time()
+    last_counts = [q.message_count for q in task_queues]
+    while not cancel_ctx.is_canceled():
+        sleep_with_context(cancel_ctx, interval)
+        now = time.monotonic()
+        cpu = time.process_time()
+        counts = [q.message_count for q in task_queues]
+        duration = now - last_time
+        if duration > 0:
+            logging.info(
+                f"--------> {name} ingest: pid={os.getpid()} "
+                f"{(sum(counts) - sum(last_counts)) / duration:.1f} msg/s "
+                f"cpu={(cpu - last_cpu) / duration * 100:.1f}%"
+            )
+            if len(task_queues) > 1:
+                rates = " ".join(
+                    f"{q.name}={(count - last) / duration:.1f}"
+                    for q, count, last in zip(task_queues, counts, last_counts)
+                )
+                logging.info(f"--------> {name} shards msg/s: {rates}")
+        last_time, last_cpu, last_counts = now, cpu, counts
+
+
+def exchange_ingest_process(
+    ex_name: str, conf: FetchConfig, config_symbols, stop_event
+):
+    logger = init_logger(f"fetch_{ex_name}")
+    logger.setLevel(getattr(logging, conf.log.level.upper()))
+    # the supervisor handles signals and stops children by `stop_event`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    parent_pid = os.getppid()
+    cancel_ctx = CancelContext()
+    transport = start_ws_transport(conf, f"fetch_{ex_name}")
+    thread_objects, sources = start_exchange_ingest(
+        ex_name, conf, config_symbols, cancel_ctx, transport
+    )
+    stats_thread = threading.Thread(
+        target=ingest_stats_loop,
+        args=(cancel_ctx, ex_name, sources),
+        name=f"{ex_name}_ingest_stats_thread",
+        daemon=True,
+    )
+    stats_thread.start()
+    thread_objects.append(stats_thread)
+
+    while not stop_event.wait(1):
+        if os.getppid() != parent_pid:
+            logging.warning(f"{ex_name} ingest process: supervisor exited")
             break
 
-        time.sleep(5)
+    cancel_ctx.cancel()
+    for thread_object in thread_objects:
+        thread_object.join()
+    if transport:
+        transport.stop()
+
+
+def fetch_orderbook_supervisor(
+    conf: FetchConfig, cancel_ctx: CancelContext, config_symbols
+):
+    mp_ctx = multiprocessing.get_context("spawn")
+    stop_event = mp_ctx.Event()
+    processes = {}
+
+    def _spawn(ex_name):
+        p = mp_ctx.Process(
+            target=exchange_ingest_process,
+            args=(ex_name, conf, config_symbols, stop_event),
+            name=f"fetch_{ex_name}_process",
+            daemon=True,
+        )
+        p.start()
+        logging.info(f"-- {ex_name} ingest process started: pid={p.pid}")
+        return p
+
+    for ex_name in ["okex", "binance"]:
+        processes[ex_name] = _spawn(ex_name)
+
+    while not cancel_ctx.is_canceled():
+        sleep_with_context(cancel_ctx, 5)
+        if cancel_ctx.is_canceled():
+            break
+        for ex_name, p in processes.items():
+            if not p.is_alive():
+                logging.error(
+                    f"{ex_name} ingest process {p.pid} died with exitcode {p.exitcode}, restarting"
+                )
+                processes[ex_name] = _spawn(ex_name)
+
+    stop_event.set()
+    for ex_name, p in processes.items():
+        p.join(timeout=15)
+        if p.is_alive():
+            logging.warning(f"{ex_name} ingest process {p.pid} not stopped, terminating")
+            p.terminate()
@@ -0,0 +1,216 @@
+import itertools
+import logging
+import queue
+import time
+import zlib
+from typing import Callable, List, Optional
+
+
+def _extract_field(message, marker: str) -> Optional[str]:
+    if isinstance(message, (bytes, bytearray)):
+        message = message.decode("utf-8", errors="ignore")
+    start = message.find(marker)
+    if start < 0:
+        return None
+    start += len(marker)
+    end = message.find('"', start)
+    if end < 0:
+        return None
+    return message[start:end]
+
+
+def okex_route_key(message) -> Optional[str]:
+    return _extract_field(message, '"instId":"')
+
+
+def binance_route_key(message) -> Optional[str]:
+    return _extract_field(message, '"s":"')
+
+
+def okex_conflate_key(message) -> Optional[tuple]:
+    # subscribe acks and errors carry the channel and instId too, only the
+    # data frames are conflated
+    marker = b'"data":' if isinstance(message, (bytes, bytearray)) else '"data":'
+    if message.find(marker) < 0:
+        return None
+    inst_id = okex_route_key(message)
+    if inst_id is None:
+        return None
+    return _extract_field(message, '"channel":"'), inst_id
+
+
+def binance_conflate_key(message) -> Optional[tuple]:
+    symbol = binance_route_key(message)
+    if symbol is None:
+        return None
+    return _extract_field(message, '"e":"'), symbol
+
+
+class IngestPartition(queue.Queue):
+    """
+    FIFO queue of `(recv_ts, message, conn_id)` owned by exactly one worker.
+    the lag counters are only written by that worker (`record_lag` and
+    `report`), so they take no lock
+    """
+
+    def __init__(self, name: str, maxsize: int = 0):
+        super().__init__(maxsize=maxsize)
+        self.name = name
+        self._reset_lag()
+        # never reset, for run summaries
+        self.total_lag_count = 0
+        self.total_lag_sum = 0.0
+        self.total_lag_max = 0.0
+
+    def _reset_lag(self):
+        self.lag_count = 0
+        self.lag_sum = 0.0
+        self.lag_max = 0.0
+
+    def record_lag(self, recv_ts: float):
+        lag = time.time() - recv_ts
+        self.lag_count += 1
+        self.lag_sum += lag
+        if lag > self.lag_max:
+            self.lag_max = lag
+        self.total_lag_count += 1
+        self.total_lag_sum += lag
+        if lag > self.total_lag_max:
+            self.total_lag_max = lag
+
+    def report(self):
+        avg = self.lag_sum / self.lag_count if self.lag_count else 0.0
+        logging.info(
+            f"--------> {self.name} depth: {self.qsize()} "
+            f"lag avg={avg * 1000:.2f}ms max={self.lag_max * 1000:.2f}ms "
+            f"count={self.lag_count}"
+        )
+        self._reset_lag()
+
+
+class ConflatingPartition(IngestPartition):
+    """
+    keep only the latest message of every (channel, symbol, conn_id) in
+    arrival order of the first pending one, so a burst is bounded by the
+    symbol number and workers always decode the newest book. only for full
+    snapshot feeds, incremental updates must not be skipped
+    """
+
+    def __init__(self, name: str, conflate_key_fn: Callable[[str], Optional[tuple]]):
+        self.conflate_key_fn = conflate_key_fn
+        self._control_ids = itertools.count()
+        super().__init__(name)
+
+    def _init(self, maxsize):
+        # key -> item, dict order is the ready order
+        self.queue = {}
+        self.put_count = 0
+        self.conflated_count = 0
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        key = self.conflate_key_fn(item[1])
+        if key is None:
+            # control messages are never conflated
+            key = ("control", next(self._control_ids))
+        else:
+            key = (key, item[2])
+        self.put_count += 1
+        if key in self.queue:
+            self.conflated_count += 1
+        self.queue[key] = item
+
+    def _get(self):
+        key = next(iter(self.queue))
+        return self.queue.pop(key)
+
+    def report(self):
+        with self.mutex:
+            put_count, conflated_count = self.put_count, self.conflated_count
+            self.put_count = self.conflated_count = 0
+        logging.info(
+            f"--------> {self.name} conflated: {conflated_count}/{put_count} "
+            f"({conflated_count / put_count * 100 if put_count else 0.0:.1f}%)"
+        )
+        super().report()
+
+
+class PartitionedQueue:
+    """
+    route raw websocket messages to per-worker partitions by symbol hash, so
+    every message of one symbol is handled in order by the same worker
+    """
+
+    def __init__(
+        self,
+        name: str,
+        partition_number: int,
+        route_key_fn: Callable[[str], Optional[str]],
+        conflate_key_fn: Callable[[str], Optional[tuple]] = None,
+    ):
+        if partition_number < 1:
+            raise ValueError(
+                f"partition_number must be positive: {partition_number}"
+            )
+        self.name = name
+        self.route_key_fn = route_key_fn
+        self.partitions: List[IngestPartition] = [
+            ConflatingPartition(
+                f"{name} partition {i}/{partition_number}", conflate_key_fn
+            )
+            if conflate_key_fn
+            else IngestPartition(f"{name} partition {i}/{partition_number}")
+            for i in range(partition_number)
+        ]
+        self._route_cache = {}
+        self.message_count = 0
+
+    def partition_index(self, key: Optional[str]) -> int:
+        if key is None:
+            # control messages (subscribe responses, events) go to the first
+            return 0
+        index = self._route_cache.get(key)
+        if index is None:
+            index = zlib.crc32(key.encode()) % len(self.partitions)
+            self._route_cache[key] = index
+        return index
+
+    def put(self, message, recv_ts: float = None, conn_id: int = 0):
+        self.message_count += 1
+        index = self.partition_index(self.route_key_fn(message))
+        self.partitions[index].put(
+            (recv_ts if recv_ts is not None else time.time(), message, conn_id)
+        )
+
+    def connection(self, conn_id: int, name: str = None) -> "ConnectionQueue":
+        return ConnectionQueue(self, conn_id, name or f"{self.name}/{conn_id}")
+
+    def qsize(self):
+        return sum(p.qsize() for p in self.partitions)
+
+    def __len__(self):
+        return len(self.partitions)
+
+    def __getitem__(self, index) -> IngestPartition:
+        return self.partitions[index]
+
+
+class ConnectionQueue:
+    """
+    `put` side of a `PartitionedQueue` for one connection, tags every
+    message with the redundant connection id and counts the messages
+    """
+
+    __slots__ = ("queue", "conn_id", "name", "message_count")
+
+    def __init__(self, task_queue: PartitionedQueue, conn_id: int, name: str):
+        self.queue = task_queue
+        self.conn_id = conn_id
+        self.name = name
+        self.message_count = 0
+
+    def put(self, message, recv_ts: float = None):
+        self.message_count += 1
+        self.queue.put(message, recv_ts, self.conn_id)
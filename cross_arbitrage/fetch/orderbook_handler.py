@@ -0,0 +1,289 @@
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import orjson as json
+
+from cross_arbitrage.fetch.book_engine import (BboMerger, BinanceBookSync,
+                                               MergedBook, OkexBookSync,
+                                               binance_bbo_quote,
+                                               fetch_binance_depth_snapshot,
+                                               okex_bbo_quote)
+from cross_arbitrage.fetch.config import FetchConfig
+from cross_arbitrage.fetch.redundancy import (FirstArrivalFilter,
+                                              RedundancyStats)
+from cross_arbitrage.fetch.utils.orderbook import (SymbolTick,
+                                                   normalize_levels_to_ticks,
+                                                   normalize_orderbook_5)
+from cross_arbitrage.utils.latency import stage_now
+
+
+def make_orderbook_result(
+    ex_name: str, symbol: str, book: MergedBook, with_bbo: bool = False,
+    tick: SymbolTick = None, multiplier=None,
+) -> dict:
+    result = {
+        "ex": ex_name,
+        "symbol": symbol,
+        "ts": max(book.depth_ts, book.bbo_ts),
+    }
+    if with_bbo:
+        result["depth_ts"] = book.depth_ts
+        result["bbo_ts"] = book.bbo_ts
+    if tick:
+        result["tick"] = tick.tick
+        result["bids"] = normalize_levels_to_ticks(book.bids, tick.exchange_tick)
+        result["asks"] = normalize_levels_to_ticks(book.asks, tick.exchange_tick)
+        return result
+    bids = [[i[0], i[1]] for i in book.bids]
+    asks = [[i[0], i[1]] for i in book.asks]
+    if multiplier is not None:
+        bids = normalize_orderbook_5(bids, multiplier)
+        asks = normalize_orderbook_5(asks, multiplier)
+    result["bids"] = bids
+    result["asks"] = asks
+    return result
+
+
+def stamp_orderbook(result: dict, recv_ts: float) -> dict:
+    """
+    copy of `result` with the receive and decode times in ms, the handler
+    keeps comparing the unstamped books
+    """
+    return dict(
+        result, recv_ts=round(recv_ts * 1000, 3), decode_ts=stage_now()
+    )
+
+
+class OrderbookHandler:
+    """
+    turn raw websocket messages of one exchange into normalized orderbook
+    snapshots, shared by the thread workers and the asyncio transport
+    """
+
+    ex_name = None
+
+    def __init__(
+        self,
+        conf: FetchConfig,
+        config_symbols: dict,
+        tick_table: Dict[str, SymbolTick] = None,
+        resubscribe: Callable[[str], None] = None,
+        redundancy_stats: RedundancyStats = None,
+        touch: Callable[[str], None] = None,
+    ):
+        ex_name = self.ex_name
+        self.conf = conf
+        self.symbol_cache = {
+            (v[ex_name]["name"] if isinstance(v[ex_name], dict) else v[ex_name]): k
+            for k, v in config_symbols.items()
+        }
+        self.symbol_info_cache = {}
+        self.tick_table = tick_table or {}
+        self.resubscribe = resubscribe or (lambda name: None)
+        # called with the exchange symbol name of every message
+        self.touch = touch or (lambda name: None)
+        self.bbo_merger = BboMerger() if conf.orderbook_bbo else None
+        # only with redundant connections
+        self.arrival_filter = None
+        if redundancy_stats is not None:
+            self.arrival_filter = FirstArrivalFilter(redundancy_stats)
+
+    def handle(self, message, conn_id: int = 0, recv_ts: float = None) -> Optional[dict]:
+        """
+        return: the normalized orderbook, None when nothing changed
+        """
+        raise NotImplementedError
+
+    def _first_arrival(
+        self, key, version, conn_id, recv_ts, exchange_ts_ms,
+        strict=True, force=False,
+    ) -> bool:
+        if self.arrival_filter is None:
+            return True
+        return self.arrival_filter.accept(
+            key, version, conn_id,
+            recv_ts if recv_ts is not None else time.time(),
+            exchange_ts_ms / 1000, strict, force,
+        )
+
+    def close(self):
+        pass
+
+    def _changed(self, symbol: str, result: dict) -> bool:
+        if (
+            self.symbol_info_cache.get(symbol)
+            and self.symbol_info_cache[symbol] == result
+        ):
+            return False
+        self.symbol_info_cache[symbol] = result
+        return True
+
+
+class OkexOrderbookHandler(OrderbookHandler):
+    ex_name = "okex"
+
+    def __init__(self, conf, config_symbols, tick_table=None, resubscribe=None,
+                 redundancy_stats=None, touch=None):
+        super().__init__(
+            conf, config_symbols, tick_table, resubscribe, redundancy_stats,
+            touch,
+        )
+        self.book_syncs = None
+        if conf.orderbook_feed == "incremental":
+            self.book_syncs = {
+                name: OkexBookSync(name, self.resubscribe)
+                for name in self.symbol_cache.keys()
+            }
+
+    def handle(self, message, conn_id=0, recv_ts=None) -> Optional[dict]:
+        item = json.loads(message)
+        # print(f"-- {ex_name} {item}")
+        if not (item.get("arg") and item.get("data")):
+            return None
+        d = item["data"][0]
+        # `books` pushes carry instId only in `arg`
+        inst_id = item["arg"]["instId"]
+        symbol = self.symbol_cache[inst_id]
+        if not symbol:
+            return None
+        self.touch(inst_id)
+        try:
+            ts = int(d["ts"])
+            seq_id = d.get("seqId")
+            if not self._first_arrival(
+                (item["arg"]["channel"], inst_id),
+                seq_id if seq_id is not None else ts,
+                conn_id, recv_ts, ts,
+                strict=seq_id is not None,
+                # a book waiting for a snapshot takes the first one arrived
+                force=(
+                    item.get("action") == "snapshot"
+                    and self.book_syncs is not None
+                    and self.book_syncs[inst_id].seq_id is None
+                ),
+            ):
+                return None
+            if item["arg"]["channel"] == "bbo-tbt":
+                if self.bbo_merger is None:
+                    return None
+                merged = self.bbo_merger.on_bbo(inst_id, okex_bbo_quote(d))
+                if merged is None:
+                    return None
+            else:
+                bids, asks = d["bids"], d["asks"]
+                if self.book_syncs is not None:
+                    book = self.book_syncs[inst_id].on_message(item.get("action"), d)
+                    if book is None:
+                        return None
+                    bids, asks = book.top(self.conf.orderbook_depth)
+                if self.bbo_merger is not None:
+                    merged = self.bbo_merger.on_depth(inst_id, bids, asks, ts, ts)
+                else:
+                    merged = MergedBook(bids, asks, ts, 0)
+            result = make_orderbook_result(
+                self.ex_name, symbol, merged, self.bbo_merger is not None,
+                self.tick_table.get(inst_id),
+            )
+            # print(f">> {ex_name} {result}")
+            if self._changed(symbol, result):
+                return result
+        except Exception as ex:
+            logging.error(ex)
+        return None
+
+
+class BinanceOrderbookHandler(OrderbookHandler):
+    ex_name = "binance"
+
+    def __init__(self, conf, config_symbols, tick_table=None, resubscribe=None,
+                 redundancy_stats=None, touch=None):
+        super().__init__(
+            conf, config_symbols, tick_table, resubscribe, redundancy_stats,
+            touch,
+        )
+        ex_name = self.ex_name
+        self.symbol_multiplier_cache = {
+            (v[ex_name]["name"] if isinstance(v[ex_name], dict) else v[ex_name]): (
+                v[ex_name]["multiplier"] if isinstance(v[ex_name], dict) else 1.0
+            )
+            for _, v in config_symbols.items()
+        }
+        self.book_syncs = None
+        self.snapshot_executor = None
+        if conf.orderbook_feed == "incremental":
+            # rest snapshots are fetched off the message handling thread
+            self.snapshot_executor = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix=f"{ex_name}_depth_snapshot"
+            )
+            snapshot_fn = functools.partial(
+                fetch_binance_depth_snapshot, proxies=conf.network.proxies()
+            )
+            self.book_syncs = {
+                name: BinanceBookSync(name, self.snapshot_executor, snapshot_fn)
+                for name in self.symbol_cache.keys()
+            }
+
+    def close(self):
+        if self.snapshot_executor:
+            self.snapshot_executor.shutdown(wait=False)
+
+    def handle(self, message, conn_id=0, recv_ts=None) -> Optional[dict]:
+        item = json.loads(message)
+        # print(f"-- {ex_name} {item}")
+        if not item.get("E"):
+            return None
+        symbol = self.symbol_cache[item["s"]]
+        if not symbol:
+            return None
+        self.touch(item["s"])
+        try:
+            # depth and bookTicker updates carry the order book update id `u`
+            update_id = item.get("u")
+            if not self._first_arrival(
+                (item.get("e"), item["s"]),
+                update_id if update_id is not None else item["E"],
+                conn_id, recv_ts, item["E"],
+                strict=update_id is not None,
+            ):
+                return None
+            if item.get("e") == "bookTicker":
+                if self.bbo_merger is None:
+                    return None
+                merged = self.bbo_merger.on_bbo(item["s"], binance_bbo_quote(item))
+                if merged is None:
+                    return None
+            else:
+                bids, asks = item["b"], item["a"]
+                if self.book_syncs is not None:
+                    book = self.book_syncs[item["s"]].on_event(item)
+                    if book is None:
+                        return None
+                    bids, asks = book.top(self.conf.orderbook_depth)
+                if self.bbo_merger is not None:
+                    # depth and bookTicker share the update id `u`
+                    merged = self.bbo_merger.on_depth(
+                        item["s"], bids, asks, item["T"], item["u"]
+                    )
+                else:
+                    merged = MergedBook(bids, asks, item["T"], 0)
+            result = make_orderbook_result(
+                self.ex_name, symbol, merged, self.bbo_merger is not None,
+                self.tick_table.get(item["s"]),
+                self.symbol_multiplier_cache[item["s"]],
+            )
+            # print(f">> {ex_name} {result}")
+            if self._changed(symbol, result):
+                return result
+        except Exception as ex:
+            logging.error(ex)
+            logging.exception(ex)
+        return None
+
+
+orderbook_handlers = {
+    "okex": OkexOrderbookHandler,
+    "binance": BinanceOrderbookHandler,
+}
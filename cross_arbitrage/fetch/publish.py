@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import List
+
+import orjson as json
+import redis
+import redis.asyncio
+
+from cross_arbitrage.fetch.utils.redis import (get_ob_notify_key,
+                                               get_ob_storage_key)
+from cross_arbitrage.utils.latency import stage_now
+
+# write the orderbook snapshot and push a notify item only when no notify
+# item is pending, in one atomic server-side step
+# KEYS[1]: storage key, KEYS[2]: notify key
+# ARGV[1]: orderbook snapshot, ARGV[2]: notify payload
+_PUBLISH_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1])
+if redis.call('LLEN', KEYS[2]) == 0 then
+    redis.call('LPUSH', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+_NOTIFY_PAYLOAD = json.dumps({"updated": True})
+
+
+class PublishStats:
+    def __init__(self, name: str, report_interval: float = 10.0):
+        self.name = name
+        self.report_interval = report_interval
+        self.lock = threading.Lock()
+        self._reset(time.monotonic())
+        # never reset, for run summaries
+        self.total_round_trips = 0
+        self.total_orderbooks = 0
+        self.total_latency_sum = 0.0
+
+    def _reset(self, now: float):
+        self.start_time = now
+        self.round_trips = 0
+        self.orderbooks = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+    def add(self, orderbook_count: int, latency: float):
+        with self.lock:
+            self.round_trips += 1
+            self.orderbooks += orderbook_count
+            self.latency_sum += latency
+            if latency > self.latency_max:
+                self.latency_max = latency
+            self.total_round_trips += 1
+            self.total_orderbooks += orderbook_count
+            self.total_latency_sum += latency
+
+    def report(self):
+        now = time.monotonic()
+        with self.lock:
+            duration = now - self.start_time
+            if duration < self.report_interval:
+                return
+            if self.round_trips > 0:
+                logging.info(
+                    f"--------> {self.name} publish: "
+                    f"{self.round_trips / duration:.1f} rt/s "
+                    f"{self.orderbooks / duration:.1f} ob/s "
+                    f"avg={self.latency_sum / self.round_trips * 1000:.2f}ms "
+                    f"max={self.latency_max * 1000:.2f}ms"
+                )
+            self._reset(now)
+
+
+class OrderbookPublisher:
+    """
+    publish a batch of normalized orderbooks in one pipelined round trip
+    """
+
+    def __init__(self, rc: redis.Redis, ex_name: str, stats: PublishStats = None):
+        self.rc = rc
+        self.ex_name = ex_name
+        self.stats = stats or PublishStats(ex_name)
+        self.sha = self.rc.script_load(_PUBLISH_SCRIPT)
+
+    def publish(self, orderbooks: List[dict]):
+        if not orderbooks:
+            return
+        start = time.perf_counter()
+        try:
+            self._execute(orderbooks)
+        except redis.exceptions.NoScriptError:
+            # script cache was flushed on the server side, reload and retry
+            self.sha = self.rc.script_load(_PUBLISH_SCRIPT)
+            self._execute(orderbooks)
+        self.stats.add(len(orderbooks), time.perf_counter() - start)
+        self.stats.report()
+
+    def _execute(self, orderbooks: List[dict]):
+        with self.rc.pipeline(transaction=False) as pipe:
+            for ob in orderbooks:
+                pipe.evalsha(self.sha, 2, *_publish_args(self.ex_name, ob))
+            pipe.execute()
+
+
+def _publish_args(ex_name: str, ob: dict):
+    ob["publish_ts"] = stage_now()
+    return (
+        get_ob_storage_key(ex_name, ob["symbol"]),
+        get_ob_notify_key(ex_name, ob["symbol"]),
+        json.dumps(ob),
+        _NOTIFY_PAYLOAD,
+    )
+
+
+class AsyncOrderbookPublisher:
+    """
+    publish orderbooks from an event loop: the orderbooks added while a
+    round trip is in flight are sent together in the next pipeline
+    """
+
+    def __init__(self, redis_url: str, ex_name: str, stats: PublishStats = None):
+        self.rc = redis.asyncio.Redis.from_url(
+            redis_url, encoding="utf-8", decode_responses=True
+        )
+        self.ex_name = ex_name
+        self.stats = stats or PublishStats(ex_name)
+        self.sha = None
+        self.pending = []
+        self.flushing = False
+
+    def add(self, ob: dict):
+        """
+        must be called on the event loop thread
+        """
+        self.pending.append(ob)
+        if not self.flushing:
+            self.flushing = True
+            asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self):
+        try:
+            while self.pending:
+                orderbooks, self.pending = self.pending, []
+                start = time.perf_counter()
+                try:
+                    try:
+                        await self._execute(orderbooks)
+                    except redis.exceptions.NoScriptError:
+                        # script cache flushed, load it again
+                        self.sha = None
+                        await self._execute(orderbooks)
+                except Exception as ex:
+                    logging.error(f"{self.ex_name} publish failed: {ex}")
+                    continue
+                self.stats.add(len(orderbooks), time.perf_counter() - start)
+                self.stats.report()
+        finally:
+            self.flushing = False
+
+    async def _execute(self, orderbooks: List[dict]):
+        if self.sha is None:
+            self.sha = await self.rc.script_load(_PUBLISH_SCRIPT)
+        async with self.rc.pipeline(transaction=False) as pipe:
+            for ob in orderbooks:
+                pipe.evalsha(self.sha, 2, *_publish_args(self.ex_name, ob))
+            await pipe.execute()
@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from typing import Dict, Hashable, List
+
+
+class ConnectionStats:
+    __slots__ = (
+        "messages", "wins", "duplicates", "behind_sum", "behind_count",
+        "latency_sum", "latency_max",
+    )
+
+    def __init__(self):
+        self.messages = 0
+        self.wins = 0
+        self.duplicates = 0
+        self.behind_sum = 0.0
+        self.behind_count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+
+class RedundancyStats:
+    """
+    per connection first arrival and latency stats of one exchange, shared
+    by every worker of the exchange
+    """
+
+    def __init__(self, name: str, connection_number: int, report_interval: float = 10.0):
+        self.name = name
+        self.connection_number = connection_number
+        self.report_interval = report_interval
+        self.lock = threading.Lock()
+        self._reset(time.monotonic())
+
+    def _reset(self, now: float):
+        self.start_time = now
+        self.connections: List[ConnectionStats] = [
+            ConnectionStats() for _ in range(self.connection_number)
+        ]
+
+    def add(self, conn_id: int, win: bool, latency: float, behind: float = None):
+        """
+        latency: receive time - exchange time, behind: receive time after the
+        first arrival of the same update
+        """
+        with self.lock:
+            stats = self.connections[conn_id]
+            stats.messages += 1
+            stats.latency_sum += latency
+            if latency > stats.latency_max:
+                stats.latency_max = latency
+            if win:
+                stats.wins += 1
+            else:
+                stats.duplicates += 1
+            if behind is not None:
+                stats.behind_sum += behind
+                stats.behind_count += 1
+
+    def report(self):
+        now = time.monotonic()
+        with self.lock:
+            if now - self.start_time < self.report_interval:
+                return
+            for conn_id, stats in enumerate(self.connections):
+                if stats.messages == 0:
+                    logging.info(f"--------> {self.name} conn {conn_id}: no message")
+                    continue
+                behind = stats.behind_sum / stats.behind_count if stats.behind_count else 0.0
+                logging.info(
+                    f"--------> {self.name} conn {conn_id}: "
+                    f"wins={stats.wins} dup={stats.duplicates} "
+                    f"latency avg={stats.latency_sum / stats.messages * 1000:.2f}ms "
+                    f"max={stats.latency_max * 1000:.2f}ms "
+                    f"behind avg={behind * 1000:.2f}ms"
+                )
+            self._reset(now)
+
+
+class FirstArrivalFilter:
+    """
+    drop updates already delivered by another redundant connection, by an
+    exchange sequence id or timestamp per (channel, symbol) key
+    """
+
+    def __init__(self, stats: RedundancyStats):
+        self.stats = stats
+        # key -> (version, first receive time)
+        self.last: Dict[Hashable, tuple] = {}
+
+    def accept(
+        self,
+        key: Hashable,
+        version: int,
+        conn_id: int,
+        recv_ts: float,
+        exchange_ts: float,
+        strict: bool = True,
+        force: bool = False,
+    ) -> bool:
+        """
+        strict: an equal version is a duplicate (sequence ids), timestamps
+        are not strict since two updates may share one millisecond.
+        force: accept and restart the key from this version
+        """
+        latency = recv_ts - exchange_ts
+        last = self.last.get(key)
+        if (
+            not force
+            and last is not None
+            and (version < last[0] or (strict and version == last[0]))
+        ):
+            behind = recv_ts - last[1] if version == last[0] else None
+            self.stats.add(conn_id, False, latency, behind)
+            return False
+        self.last[key] = (version, recv_ts)
+        self.stats.add(conn_id, True, latency)
+        self.stats.report()
+        return True
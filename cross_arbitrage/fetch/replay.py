@@ -0,0 +1,183 @@
+import heapq
+import logging
+import threading
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import redis
+
+from cross_arbitrage.fetch.capture import iter_capture
+from cross_arbitrage.fetch.ingest_queue import PartitionedQueue
+from cross_arbitrage.fetch.publish import PublishStats
+from cross_arbitrage.utils.context import CancelContext, sleep_with_context
+
+
+class LagStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, lag: float):
+        with self.lock:
+            self.count += 1
+            self.sum += lag
+            if lag > self.max:
+                self.max = lag
+
+    def merge(self, count: int, lag_sum: float, lag_max: float):
+        with self.lock:
+            self.count += count
+            self.sum += lag_sum
+            self.max = max(self.max, lag_max)
+
+    def summary(self) -> str:
+        avg = self.sum / self.count if self.count else 0.0
+        return (
+            f"{self.name}: count={self.count} "
+            f"avg={avg * 1000:.2f}ms max={self.max * 1000:.2f}ms"
+        )
+
+
+def iter_replay_frames(
+    capture_dir: str, ex_names: List[str]
+) -> Iterator[Tuple[float, str, int, bytes]]:
+    """
+    frames of every exchange merged by receive time:
+    (recv_ts, ex_name, conn_id, payload)
+    """
+
+    def _frames(ex_name):
+        for recv_ts, conn_id, payload in iter_capture(capture_dir, ex_name):
+            # the segment map is closed when the reader moves on
+            yield recv_ts, ex_name, conn_id, bytes(payload)
+
+    return heapq.merge(*(_frames(ex_name) for ex_name in ex_names))
+
+
+def feed_capture(
+    cancel_ctx: CancelContext,
+    capture_dir: str,
+    task_queues: Dict[str, PartitionedQueue],
+    speed: float = 1.0,
+) -> int:
+    """
+    put recorded frames into the ingest queues, keeping the recorded pace
+    divided by `speed`, as fast as possible when `speed` <= 0.
+    return: the number of frames
+    """
+    count = 0
+    first_ts = None
+    start = time.time()
+    for recv_ts, ex_name, conn_id, payload in iter_replay_frames(
+        capture_dir, list(task_queues.keys())
+    ):
+        if cancel_ctx.is_canceled():
+            break
+        if speed > 0:
+            if first_ts is None:
+                first_ts = recv_ts
+            delay = start + (recv_ts - first_ts) / speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        # lag is measured from the replayed arrival
+        task_queues[ex_name].put(payload, time.time(), conn_id)
+        count += 1
+        if count % 100000 == 0:
+            logging.info(f"--------> replay frames: {count}")
+    return count
+
+
+class StreamProbe:
+    """
+    tail the aggregated orderbook stream, the lag is the read time minus
+    the stream entry time set by `XADD`
+    """
+
+    def __init__(self, redis_url: str, stream: str):
+        self.rc = redis.Redis.from_url(redis_url)
+        self.stream = stream
+        self.lag = LagStats("agg stream -> reader")
+
+    def run(self, cancel_ctx: CancelContext):
+        last_id = "$"
+        while not cancel_ctx.is_canceled():
+            try:
+                data = self.rc.xread({self.stream: last_id}, count=1000, block=500)
+            except redis.RedisError as ex:
+                logging.warning(f"replay stream probe: {ex}")
+                sleep_with_context(cancel_ctx, 1)
+                continue
+            if not data:
+                continue
+            now_ms = time.time() * 1000
+            for entry_id, _ in data[0][1]:
+                last_id = entry_id
+                self.lag.add((now_ms - int(entry_id.split(b"-")[0])) / 1000)
+
+
+def wait_drained(
+    cancel_ctx: CancelContext,
+    task_queues: Dict[str, PartitionedQueue],
+    probe: StreamProbe,
+    idle: float = 2.0,
+    timeout: float = 60.0,
+) -> float:
+    """
+    wait until the ingest queues are empty and the stream got nothing new
+    for `idle` seconds.
+    return: the last time the pipeline was busy
+    """
+    deadline = time.monotonic() + timeout
+    last_busy = time.time()
+    last_count = probe.lag.count
+    while not cancel_ctx.is_canceled() and time.monotonic() < deadline:
+        sleep_with_context(cancel_ctx, 0.1)
+        now = time.time()
+        count = probe.lag.count
+        if count != last_count or any(q.qsize() > 0 for q in task_queues.values()):
+            last_busy = now
+            last_count = count
+        elif now - last_busy >= idle:
+            break
+    return last_busy
+
+
+def replay_report(
+    frame_count: int,
+    duration: float,
+    task_queues: Dict[str, PartitionedQueue],
+    publish_stats: Dict[str, PublishStats],
+    probe: StreamProbe,
+    stub_exchanges: dict = None,
+):
+    logging.info(
+        f"--------> replay: {frame_count} frames in {duration:.2f}s, "
+        f"{frame_count / duration if duration > 0 else 0.0:.1f} msg/s"
+    )
+    for ex_name, task_queue in task_queues.items():
+        lag = LagStats(f"{ex_name} ingest queue")
+        for partition in task_queue.partitions:
+            lag.merge(
+                partition.total_lag_count, partition.total_lag_sum,
+                partition.total_lag_max,
+            )
+        logging.info(f"--------> {lag.summary()}")
+        stats = publish_stats[ex_name]
+        avg = (
+            stats.total_latency_sum / stats.total_round_trips
+            if stats.total_round_trips else 0.0
+        )
+        logging.info(
+            f"--------> {ex_name} publish: orderbooks={stats.total_orderbooks} "
+            f"{stats.total_orderbooks / duration if duration > 0 else 0.0:.1f} ob/s "
+            f"rt avg={avg * 1000:.2f}ms"
+        )
+    logging.info(
+        f"--------> {probe.lag.summary()} "
+        f"{probe.lag.count / duration if duration > 0 else 0.0:.1f} entries/s"
+    )
+    for ex_name, exchange in (stub_exchanges or {}).items():
+        logging.info(f"--------> {ex_name} stub orders: {len(exchange.stub_order_log)}")
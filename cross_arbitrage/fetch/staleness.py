@@ -0,0 +1,99 @@
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+import redis
+
+from cross_arbitrage.fetch.utils.redis import get_ob_stale_key
+from cross_arbitrage.utils.context import CancelContext, sleep_with_context
+
+
+class FeedWatchdog:
+    """
+    last update time of every symbol of one exchange. a symbol silent for
+    `stale_seconds` while its connection is alive is flagged stale in redis
+    and resubscribed alone, again every `stale_seconds` until it updates.
+    the flags are also kept in `stale_legs` for an in-process aggregator
+    """
+
+    def __init__(
+        self,
+        ex_name: str,
+        symbol_names: Dict[str, str],
+        resubscribe: Callable[[str], None],
+        stale_seconds: float,
+        rc: redis.Redis = None,
+        stale_legs: Optional[Set[tuple]] = None,
+    ):
+        """
+        symbol_names: {exchange symbol name: symbol}
+        stale_legs: shared set of the flagged (exchange, symbol)
+        """
+        self.ex_name = ex_name
+        self.symbol_names = symbol_names
+        self.resubscribe = resubscribe
+        self.stale_seconds = stale_seconds
+        self.rc = rc
+        self.stale_legs = stale_legs
+        now = time.monotonic()
+        # the subscriptions get `stale_seconds` to deliver a first update
+        self.last_update: Dict[str, float] = {name: now for name in symbol_names}
+        # exchange symbol name => last resubscribe time
+        self.stale: Dict[str, float] = {}
+
+    def touch(self, name: str):
+        self.last_update[name] = time.monotonic()
+
+    def check(self, now: float = None) -> List[str]:
+        """
+        return: exchange symbol names resubscribed in this check
+        """
+        now = now if now is not None else time.monotonic()
+        ret = []
+        for name, last in list(self.last_update.items()):
+            if now - last < self.stale_seconds:
+                if self.stale.pop(name, None) is not None:
+                    logging.info(f"{self.ex_name} {name} orderbook updates again")
+                    self._set_flag(name, None)
+                continue
+            resubscribed_at = self.stale.get(name)
+            if resubscribed_at is not None and now - resubscribed_at < self.stale_seconds:
+                continue
+            if resubscribed_at is None:
+                self._set_flag(name, time.time() * 1000 - (now - last) * 1000)
+            logging.warning(
+                f"{self.ex_name} {name} orderbook silent for {now - last:.1f}s, resubscribe"
+            )
+            self.stale[name] = now
+            ret.append(name)
+            try:
+                self.resubscribe(name)
+            except Exception as ex:
+                logging.error(f"{self.ex_name} resubscribe {name} failed: {type(ex)}: {ex}")
+        return ret
+
+    def _set_flag(self, name: str, last_update_ms):
+        """
+        the flag holds the local ms time of the last update, None to clear it
+        """
+        if self.stale_legs is not None:
+            leg = (self.ex_name, self.symbol_names[name])
+            if last_update_ms is None:
+                self.stale_legs.discard(leg)
+            else:
+                self.stale_legs.add(leg)
+        if self.rc is None:
+            return
+        key = get_ob_stale_key(self.ex_name, self.symbol_names[name])
+        try:
+            if last_update_ms is None:
+                self.rc.delete(key)
+            else:
+                self.rc.set(key, int(last_update_ms))
+        except redis.RedisError as e:
+            logging.warning(f"set stale flag {key} failed: {type(e)}: {e}")
+
+    def run(self, ctx: CancelContext, interval: float = 1.0):
+        while not ctx.is_canceled():
+            sleep_with_context(ctx, interval)
+            self.check()
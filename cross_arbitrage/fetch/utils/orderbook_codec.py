@@ -0,0 +1,102 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# binary aggregated orderbook entry, little endian on every host:
+#   int64[HEADER_FIELDS + LEG_FIELDS * n]: version, n, levels per side,
+#       aggregation ts (ms), trigger exchange index, then for every leg:
+#       ts (exchange ms), recv_ts, decode_ts, publish_ts (µs), bid count,
+#       ask count, flags
+#   float64[(1 + 4 * levels) * n]: for every leg the tick (0 for decimal
+#       prices), then `levels` [price, qty] bids and asks, NaN padded
+# the legs are in the sorted order of the configured exchanges, so the
+# writer and the readers agree whatever order their configs list them in.
+# a missing stamp is -1
+ORDERBOOK_ENTRY_VERSION = 2
+HEADER_FIELDS = 5
+LEG_FIELDS = 7
+_INT = np.dtype('<i8')
+_FLOAT = np.dtype('<f8')
+# leg flags
+LEG_STALE = 1
+
+_STAMPS = ("recv_ts", "decode_ts", "publish_ts")
+
+
+def _us(ms) -> int:
+    return -1 if ms is None else int(round(ms * 1000))
+
+
+def _ms(us: int) -> Optional[float]:
+    return None if us < 0 else us / 1000
+
+
+def encode_orderbook_entry(exchanges: List[str], ts: int, trigger_exchange: str,
+                           legs: Dict[str, dict]) -> bytes:
+    """
+    exchanges: the configured exchanges
+    legs: {exchange: orderbook}, every exchange of `exchanges`
+    """
+    exchanges = sorted(exchanges)
+    books = [legs[ex] for ex in exchanges]
+    levels = max(max(len(ob["bids"]), len(ob["asks"])) for ob in books)
+    header = np.empty(HEADER_FIELDS + LEG_FIELDS * len(books), dtype=_INT)
+    header[:HEADER_FIELDS] = (
+        ORDERBOOK_ENTRY_VERSION, len(books), levels, ts,
+        exchanges.index(trigger_exchange),
+    )
+    data = np.full((len(books), 1 + 4 * levels), np.nan, dtype=_FLOAT)
+    for i, ob in enumerate(books):
+        bids, asks = ob["bids"], ob["asks"]
+        base = HEADER_FIELDS + LEG_FIELDS * i
+        header[base:base + LEG_FIELDS] = (
+            int(ob["ts"]), *(_us(ob.get(k)) for k in _STAMPS),
+            len(bids), len(asks), LEG_STALE if ob.get("stale") else 0,
+        )
+        data[i, 0] = ob.get("tick") or 0.0
+        if bids:
+            data[i, 1:1 + 2 * len(bids)] = np.asarray(bids, dtype=_FLOAT).ravel()
+        if asks:
+            start = 1 + 2 * levels
+            data[i, start:start + 2 * len(asks)] = np.asarray(asks, dtype=_FLOAT).ravel()
+    return header.tobytes() + data.tobytes()
+
+
+def decode_orderbook_entry(exchanges: List[str], symbol: str, raw: bytes) -> dict:
+    """
+    exchanges: the configured exchanges, the ones of the writer
+    return: the entry in the json layout, levels as (n, 2) float64 arrays
+    """
+    exchanges = sorted(exchanges)
+    head = np.frombuffer(raw, dtype=_INT, count=HEADER_FIELDS)
+    version, n, levels, ts, trigger = (int(x) for x in head)
+    if version != ORDERBOOK_ENTRY_VERSION:
+        raise ValueError(f"unsupported orderbook entry version: {version}")
+    if n != len(exchanges):
+        raise ValueError(f"orderbook entry of {n} exchanges, expect {len(exchanges)}")
+    header_size = HEADER_FIELDS + LEG_FIELDS * n
+    header = np.frombuffer(raw, dtype=_INT, count=header_size).tolist()
+    data = np.frombuffer(raw, dtype=_FLOAT, offset=header_size * 8).reshape(n, -1)
+    entry = {"symbol": symbol, "ts": ts, "exchange": exchanges[trigger]}
+    for i in range(n):
+        base = HEADER_FIELDS + LEG_FIELDS * i
+        leg_ts, recv_us, decode_us, publish_us, n_bids, n_asks, flags = header[base:base + LEG_FIELDS]
+        row = data[i]
+        ob = {
+            "ex": exchanges[i],
+            "symbol": symbol,
+            "ts": leg_ts,
+            "recv_ts": _ms(recv_us),
+            "decode_ts": _ms(decode_us),
+            "publish_ts": _ms(publish_us),
+            "bids": row[1:1 + 2 * n_bids].reshape(-1, 2),
+            "asks": row[1 + 2 * levels:1 + 2 * levels + 2 * n_asks].reshape(-1, 2),
+        }
+        tick = float(row[0])
+        if tick:
+            ob["tick"] = tick
+        if flags & LEG_STALE:
+            ob["stale"] = True
+        entry[exchanges[i]] = ob
+    return entry
+
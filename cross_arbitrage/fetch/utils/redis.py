@@ -4,3 +4,11 @@ def get_ob_storage_key(ex_name, symbol):
 
 def get_ob_notify_key(ex_name, symbol):
     return f"origin_orderbook:{ex_name}:{symbol}:notify"
+
+
+def get_ob_stale_key(ex_name, symbol):
+    return f"origin_orderbook:{ex_name}:{symbol}:stale"
+
+
+def get_ob_symbol_stream_key(stream, symbol):
+    return f"{stream}:{symbol}"
@@ -1,8 +1,8 @@
 import logging
 from decimal import Decimal
-from typing import Dict, List, Union, Any
+from typing import Any, Dict, FrozenSet, List, Tuple, Union
 
-from pydantic import BaseModel, root_validator, validator
+from pydantic import BaseModel, PrivateAttr, root_validator, validator
 
 from cross_arbitrage.config.account import AccountConfig
 from cross_arbitrage.config.constant import ENVS, ORDER_MODES
@@ -50,10 +50,23 @@ class OrderConfig(BaseModel):
 
     dry_run: bool = False
 
+    # no signal from orderbooks with a leg older than this or flagged stale
+    # by the fetch watchdog, 0 to only skip the flagged legs
+    orderbook_freshness_ms: int = 0
+
     output_data: OutputData
 
     symbol_name_datas: Dict[str, Any] = {}
 
+    # indexes of cross_arbitrage_symbol_datas, built after validation
+    _symbol_names: FrozenSet[str] = PrivateAttr(frozenset())
+    _symbol_datas_index: Dict[str, Tuple[SymbolConfig, ...]] = PrivateAttr(default_factory=dict)
+    _makeonly_index: Dict[Tuple[str, str], SymbolConfig] = PrivateAttr(default_factory=dict)
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.build_symbol_index()
+
     @validator("env")
     def env_must_in_list(cls, value):
         if (value not in ENVS) and (not value.startswith('aa')):
@@ -143,17 +156,35 @@ class OrderConfig(BaseModel):
         values["cross_arbitrage_symbol_datas"].extend(symbol_datas_for_both_config)
         return values
 
-    def get_symbol_datas(self, symbol_name:str):
-        symbols = list(filter(lambda d: d.symbol_name == symbol_name, self.cross_arbitrage_symbol_datas))
-        if len(symbols) > 0:
+    def build_symbol_index(self):
+        """
+        index the symbol datas by symbol and by (symbol, makeonly exchange),
+        call again after changing cross_arbitrage_symbol_datas
+        """
+        symbol_datas_index = {}
+        makeonly_index = {}
+        for d in self.cross_arbitrage_symbol_datas:
+            symbol_datas_index[d.symbol_name] = symbol_datas_index.get(d.symbol_name, ()) + (d,)
+            # the first one wins, like the former linear search
+            makeonly_index.setdefault((d.symbol_name, d.makeonly_exchange_name), d)
+        self._symbol_names = frozenset(symbol_datas_index)
+        self._symbol_datas_index = symbol_datas_index
+        self._makeonly_index = makeonly_index
+
+    def symbol_names(self) -> FrozenSet[str]:
+        return self._symbol_names
+
+    def get_symbol_datas(self, symbol_name:str) -> Tuple[SymbolConfig, ...]:
+        symbols = self._symbol_datas_index.get(symbol_name)
+        if symbols:
             return symbols
         else:
             raise Exception(f"config.get_symbol_datas(): cannot find symbol data for {symbol_name}")
 
-    def get_symbol_data_by_makeonly(self, symbol_name:str, makeonly_exchange_name:str):
-        symbols = list(filter(lambda d: d.symbol_name == symbol_name and d.makeonly_exchange_name == makeonly_exchange_name, self.cross_arbitrage_symbol_datas))
-        if len(symbols) > 0:
-            return symbols[0]
+    def get_symbol_data_by_makeonly(self, symbol_name:str, makeonly_exchange_name:str) -> SymbolConfig:
+        symbol = self._makeonly_index.get((symbol_name, makeonly_exchange_name))
+        if symbol is not None:
+            return symbol
         else:
             raise Exception(f"config.get_symbol_data_by_makeonly(): cannot find symbol data for {symbol_name} and {makeonly_exchange_name}")
 
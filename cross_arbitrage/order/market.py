@@ -4,7 +4,7 @@ from typing import Any, Literal, Tuple
 
 import ccxt
 from pydantic import BaseModel
-from cross_arbitrage.utils.exchange import get_bag_size
+from cross_arbitrage.utils.exchange import get_exchange_market_meta
 
 from cross_arbitrage.utils.symbol_mapping import get_ccxt_symbol, get_exchange_symbol_from_exchange
 
@@ -80,8 +80,8 @@ def place_order(exchange: ccxt.Exchange,
                 client_id=None,
                 align_qty=True,
                 reduce_only=False):
-    exchange_symbol = get_exchange_symbol_from_exchange(exchange, symbol)
-    exchange_symbol_name = exchange_symbol.name
+    meta = get_exchange_market_meta(exchange, symbol)
+    exchange_symbol_name = meta.exchange_symbol
 
     params = {}
     if client_id:
@@ -91,14 +91,13 @@ def place_order(exchange: ccxt.Exchange,
         params['reduceOnly'] = True
 
     if price is not None:
-        price *= exchange_symbol.multiplier
+        price *= meta.multiplier
 
     # qty to market amount
-    bag_size = get_bag_size(exchange, symbol)
-    amount = qty / bag_size
+    amount = qty / meta.bag_size
 
     if align_qty:
-        amount = exchange.amount_to_precision(exchange_symbol_name, amount)
+        amount = format(meta.amount_to_precision(amount), 'f')
 
     match method:
         case 'market':
@@ -137,11 +136,10 @@ def cancel_order(exchange: ccxt.Exchange, order_id: str, symbol: str = None):
 
 
 def align_qty(exchange: ccxt.Exchange, symbol: str, qty: Decimal) -> Tuple[Decimal, Decimal]:
-    exchange_symbol = get_exchange_symbol_from_exchange(exchange, symbol)
-    exchange_symbol_name = exchange_symbol.name
+    meta = get_exchange_market_meta(exchange, symbol)
     match exchange:
         case ccxt.okex():
-            bag_size = get_bag_size(exchange, symbol)
+            bag_size = meta.bag_size
             # r1 = qty.quantize(bag_size)
             r2 = qty % bag_size
             r1 = qty - r2
@@ -149,7 +147,7 @@ def align_qty(exchange: ccxt.Exchange, symbol: str, qty: Decimal) -> Tuple[Decim
         case ccxt.binanceusdm():
             # market_precesion = exchange.market(
             #     ccxt_symbol)['precision']['amount']
-            r1 = Decimal(str(exchange.amount_to_precision(exchange_symbol_name, qty / exchange_symbol.multiplier))) * exchange_symbol.multiplier
+            r1 = meta.amount_to_precision(qty / meta.multiplier) * meta.multiplier
             r2 = qty - r1
             return r1, r2
         case _:
@@ -158,8 +156,7 @@ def align_qty(exchange: ccxt.Exchange, symbol: str, qty: Decimal) -> Tuple[Decim
 
 
 def get_contract_size(exchange: ccxt.Exchange, symbol: str) -> Decimal:
-    exchange_symbol = get_exchange_symbol_from_exchange(exchange, symbol)
-    return Decimal(str(exchange.market(exchange_symbol.name)['contractSize']))
+    return get_exchange_market_meta(exchange, symbol).contract_size
 
 
 class ExchangeStatus(BaseModel):
@@ -9,16 +9,22 @@ from typing import Dict, List
 import ccxt
 from cross_arbitrage.order.globals import get_order_status_stream_is_ready
 from cross_arbitrage.order.order_status import start_order_status_stream_mainloop
-from cross_arbitrage.order.position_status import PositionDirection, align_position_loop, refresh_position_loop
+from cross_arbitrage.order.position_status import PositionDirection, align_position_loop, refresh_position_loop, start_position_mirror
 import redis
 from cross_arbitrage.order.process_threshold import process_threshold_mainloop, is_threshold_ready
 
 from cross_arbitrage.utils.context import CancelContext
 from cross_arbitrage.utils.exchange import create_exchange
+from cross_arbitrage.utils.clock import start_clock_sync
+from cross_arbitrage.utils.latency import start_latency_recorder
+from cross_arbitrage.utils.market_meta import start_market_meta
 from cross_arbitrage.utils.order import get_order_qty, order_mode_is_maintain, order_mode_is_pending, order_mode_is_reduce_only
 from cross_arbitrage.utils.symbol_mapping import get_ccxt_symbol, get_exchange_symbol_from_exchange
 from .config import OrderConfig
-from .order_book import fetch_orderbooks_from_redis, get_signal_from_orderbooks
+from .order_book import (fetch_orderbooks_from_redis,
+                         fetch_symbol_orderbooks_from_redis,
+                         get_signal_from_orderbooks,
+                         get_symbol_stream_last_ids)
 from .signal_dealer import deal_loop
 from .check_exchange_status import check_exchange_status_loop
 from .threshold import Threshold
@@ -39,6 +45,10 @@ def start_loop(ctx: CancelContext, config: OrderConfig):
         exchange.load_markets()
 
     rc = redis.Redis.from_url(config.redis.url)
+    start_latency_recorder(ctx, config.redis.url, "order")
+    start_clock_sync(ctx, exchanges, "order")
+    start_market_meta(ctx, exchanges, "order")
+    start_position_mirror(ctx, config.redis.url, "order")
     symbols = [s.symbol_name for s in config.cross_arbitrage_symbol_datas]
     clear_orders(ctx, symbols, exchanges)
     set_leverage(ctx, exchanges, symbols, config.symbol_leverage)
@@ -118,11 +128,21 @@ def start_loop(ctx: CancelContext, config: OrderConfig):
 def order_loop(ctx: CancelContext, config: OrderConfig, thresholds: dict[str, Threshold],
                exchanges: Dict[str, ccxt.Exchange], rc: redis.Redis):
     last_id = '$'
+    # binary format: only the streams of the traded symbols
+    symbol_last_ids = None
+    if config.redis.symbol_streams():
+        symbol_last_ids = get_symbol_stream_last_ids(
+            rc, config.redis.orderbook_stream,
+            config.symbol_names())
     ob_count = 0
     st = 0
     while not ctx.is_canceled():
-        orderbooks = fetch_orderbooks_from_redis(
-            ctx, rc, config.redis.orderbook_stream, last_id, 1000, 100)
+        if symbol_last_ids is not None:
+            orderbooks = fetch_symbol_orderbooks_from_redis(
+                ctx, rc, symbol_last_ids, config.exchange_pair_names, 1000, 100)
+        else:
+            orderbooks = fetch_orderbooks_from_redis(
+                ctx, rc, config.redis.orderbook_stream, last_id, 1000, 100)
         if not orderbooks:
             continue
 
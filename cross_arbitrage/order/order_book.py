@@ -1,18 +1,26 @@
 
 from decimal import Decimal
 import logging
-from typing import Dict, NamedTuple, Optional
+import time
+from typing import Dict, List, NamedTuple, Optional
 import ccxt
 import numpy as np
 
 import orjson
 import redis
 
+from cross_arbitrage.fetch.utils.orderbook import (best_price, book_array,
+                                                   is_stale_orderbook,
+                                                   level_price_decimal)
+from cross_arbitrage.fetch.utils.orderbook_codec import decode_orderbook_entry
+from cross_arbitrage.fetch.utils.redis import get_ob_symbol_stream_key
 from cross_arbitrage.order.config import OrderConfig
 from cross_arbitrage.utils.context import CancelContext
-from cross_arbitrage.order.position_status import PositionDirection, get_position_status, PositionStatus
+from cross_arbitrage.order.position_status import PositionDirection, get_mirrored_position_status, get_position_status, PositionStatus
 from cross_arbitrage.utils.cache import expire_cache, ExpireCache
+from cross_arbitrage.utils.clock import exchange_to_local_ms
 from cross_arbitrage.utils.exchange import get_bag_size_by_ex_name, get_symbol_min_amount
+from cross_arbitrage.utils.latency import StageTimestamps, record_latency, stage_now
 from .threshold import Threshold
 
 
@@ -30,12 +38,16 @@ class OrderSignal(NamedTuple):
     cancel_order_threshold: float
     maker_position: Optional[PositionStatus]
     is_reduce_position: bool = False
+    stage_ts: Optional[StageTimestamps] = None
 
 
 _cache = ExpireCache(1)
 
 
 def get_position(rc: redis.Redis, exchange_name: str, symbol: str):
+    found, ret = get_mirrored_position_status(exchange_name, symbol)
+    if found:
+        return ret
     key = (exchange_name, symbol)
     ret = _cache.get(key)
     if ret is None:
@@ -63,105 +75,273 @@ def fetch_orderbooks_from_redis(ctx: CancelContext,
 
     data = data[0][1]
     ret = []
+    read_ts = stage_now()
     for rid, values in data:
         for symbol, ob in values.items():
             symbol: bytes
-            ret.append((rid, (symbol.decode(), orjson.loads(ob))))
+            symbol = symbol.decode()
+            ob = orjson.loads(ob)
+            ob['read_ts'] = read_ts
+            record_latency(ob.get('exchange'), symbol, 'order_read', ob.get('ts'), read_ts)
+            ret.append((rid, (symbol, ob)))
     return ret
 
 
-def get_signal_from_orderbooks(rc: redis.Redis, exchanges: dict[str, ccxt.Exchange],
-                               config: OrderConfig, thresholds: dict[str, Threshold], orderbooks: list) -> Dict[str, OrderSignal]:
+def get_symbol_stream_last_ids(rc: redis.Redis, stream: str, symbols) -> Dict[str, str]:
     """
-    return: {symbol: `OrderSignal`}
+    return: {symbol stream: id of the redis server time}, to read the
+    entries added from now on without the `$` gaps between reads
     """
+    sec, usec = rc.time()
+    last_id = f"{sec * 1000 + usec // 1000}-0"
+    return {get_ob_symbol_stream_key(stream, symbol): last_id for symbol in symbols}
 
-    ret = {}
+
+def fetch_symbol_orderbooks_from_redis(ctx: CancelContext,
+                                       rc: redis.Redis,
+                                       last_ids: Dict[str, str],
+                                       exchanges: List[str],
+                                       limit: int,
+                                       block: Optional[int] = None) -> Optional[list]:
+    """
+    read the binary symbol streams, `last_ids` is updated in place
+    exchanges: the exchanges of the entries
+    return: [(stream_id (symbol order_books:{exchange => orderbook}))]
+    """
+    try:
+        data = rc.xread(last_ids, count=limit, block=block)
+    except redis.RedisError as e:
+        logging.warning(f'get a redis error: {type(e)}: {e}')
+        return None
+    if not data:
+        return None
+
+    ret = []
+    read_ts = stage_now()
+    for stream, entries in data:
+        if isinstance(stream, bytes):
+            stream = stream.decode()
+        last_ids[stream] = entries[-1][0]
+        for rid, values in entries:
+            for symbol, raw in values.items():
+                symbol = symbol.decode()
+                ob = decode_orderbook_entry(exchanges, symbol, raw)
+                ob['read_ts'] = read_ts
+                record_latency(ob['exchange'], symbol, 'order_read', ob['ts'], read_ts)
+                ret.append((rid, (symbol, ob)))
+    return ret
+
+
+def get_signal_stage_ts(ob: dict) -> StageTimestamps:
+    """
+    stage timestamps of the orderbook leg which triggered the aggregation,
+    its exchange event time converted with the clock offset of that leg
+    """
+    trigger_exchange = ob.get('exchange')
+    trigger_ob = ob.get(trigger_exchange, {})
+    return StageTimestamps(
+        exchange=exchange_to_local_ms(trigger_exchange, trigger_ob.get('ts')),
+        ws_recv=trigger_ob.get('recv_ts'),
+        decode=trigger_ob.get('decode_ts'),
+        publish=trigger_ob.get('publish_ts'),
+        agg=ob.get('ts'),
+        order_read=ob.get('read_ts'),
+        signal=stage_now(),
+    )
+
+
+class SignalEvalStats:
+    """
+    time spent evaluating the order_loop batches, to see how close it comes
+    to the stream rate as symbols are added
+    """
+
+    def __init__(self, report_interval: float = 10.0):
+        self.report_interval = report_interval
+        self._reset(time.monotonic())
+
+    def _reset(self, now: float):
+        self.start_time = now
+        self.batches = 0
+        self.rows = 0
+        self.signals = 0
+        self.eval_sum = 0.0
+        self.eval_max = 0.0
+
+    def add(self, rows: int, signals: int, seconds: float):
+        self.batches += 1
+        self.rows += rows
+        self.signals += signals
+        self.eval_sum += seconds
+        if seconds > self.eval_max:
+            self.eval_max = seconds
+        now = time.monotonic()
+        duration = now - self.start_time
+        if duration >= self.report_interval:
+            logging.info(
+                f"--------> signal eval: {self.batches / duration:.1f} batch/s "
+                f"{self.rows / self.batches:.1f} rows/batch "
+                f"avg={self.eval_sum / self.batches * 1e6:.0f}us "
+                f"max={self.eval_max * 1e6:.0f}us "
+                f"busy={self.eval_sum / duration * 100:.1f}% "
+                f"signals={self.signals}"
+            )
+            self._reset(now)
+
+
+_signal_eval_stats = SignalEvalStats()
+
+
+class SignalRow(NamedTuple):
+    """
+    one (symbol, maker exchange) of a batch, with its thresholds resolved
+    """
+
+    symbol: str
+    ob: dict
+    maker_exchange: str
+    taker_exchange: str
+    maker_position: Optional[PositionStatus]
+    position_qty: Optional[Decimal]
+    high_cancel_threshold: float
+    low_cancel_threshold: float
+
+
+def _best_or_nan(ob: dict, side: str) -> float:
+    return best_price(ob, side) if len(ob[side]) else np.nan
+
+
+def pack_signal_rows(rc: redis.Redis, exchanges: dict[str, ccxt.Exchange],
+                     config: OrderConfig, thresholds: dict[str, Threshold], orderbooks: list):
+    """
+    the latest orderbook of every symbol, one row per maker exchange
+    return: (rows, prices, factors), prices: (n, 4) maker ask, taker ask,
+        maker bid, taker bid, NaN for an empty side, factors: (n, 2) the
+        sell and buy price factors
+    """
+    rows = []
+    prices = []
+    factors = []
     processed_symbols = set()
-    symbols = [s.symbol_name for s in config.cross_arbitrage_symbol_datas]
+    symbols = config.symbol_names()
+    # one snapshot per maker exchange for the whole batch
+    snapshots = {ex_name: t.snapshot.thresholds for ex_name, t in thresholds.items()}
+    now = stage_now()
     for symbol, ob in reversed(orderbooks):
-        if symbol in processed_symbols:
-            continue
-
-        if symbol not in symbols:
+        if symbol in processed_symbols or symbol not in symbols:
             continue
-
         processed_symbols.add(symbol)
 
         for symbol_config in config.get_symbol_datas(symbol):
             maker_exchange = symbol_config.makeonly_exchange_name
             taker_exchange = (
                 set(config.exchange_pair_names) - {maker_exchange}).pop()
-
-            threshold = thresholds[maker_exchange].get_symbol_thresholds(
-                symbol)
-
             maker_ob = ob[maker_exchange]
             taker_ob = ob[taker_exchange]
+            if (is_stale_orderbook(maker_exchange, maker_ob, now, config.orderbook_freshness_ms)
+                    or is_stale_orderbook(taker_exchange, taker_ob, now, config.orderbook_freshness_ms)):
+                logging.debug(f'skip {symbol} {maker_exchange} signal, stale orderbook')
+                continue
 
-            # TODO: check position
+            threshold = snapshots[maker_exchange].get(symbol)
+            if threshold is None:
+                threshold = thresholds[maker_exchange].get_symbol_thresholds(symbol).float_thresholds()
             maker_symbol_position = get_position(rc, maker_exchange, symbol)
             symbol_minimum_qty = get_symbol_min_amount(exchanges, symbol)
-            high_delta = threshold.short_threshold.increase_position_threshold
-            high_cancel_threshold = threshold.short_threshold.cancel_increase_position_threshold
-
-            low_delta = threshold.long_threshold.increase_position_threshold
-            low_cancel_threshold = threshold.long_threshold.cancel_increase_position_threshold
+            high_delta = threshold.short_increase
+            high_cancel_threshold = threshold.short_cancel_increase
+            low_delta = threshold.long_increase
+            low_cancel_threshold = threshold.long_cancel_increase
 
             position_qty = None
-            is_reduce_position = False
             # reduce position
             if maker_symbol_position and maker_symbol_position.qty > symbol_minimum_qty:
                 position_qty = maker_symbol_position.qty
                 if maker_symbol_position.direction == PositionDirection.long:
-                    high_delta = threshold.long_threshold.decrease_position_threshold
-                    high_cancel_threshold = threshold.long_threshold.cancel_decrease_position_threshold
+                    high_delta = threshold.long_decrease
+                    high_cancel_threshold = threshold.long_cancel_decrease
                 elif maker_symbol_position.direction == PositionDirection.short:
-                    low_delta = threshold.short_threshold.decrease_position_threshold
-                    low_cancel_threshold = threshold.short_threshold.cancel_decrease_position_threshold
-
-            # if maker exchange price if higher
-            if len(maker_ob['asks']) and len(taker_ob['asks']) and float(maker_ob['asks'][0][0]) > float(taker_ob['asks'][0][0]) * float(1 + high_delta):
-                bag_size = get_bag_size_by_ex_name(taker_exchange, symbol)
-                qty = Decimal(
-                    str(np.average(np.array(taker_ob['asks'], dtype=np.float64)[:5, 1]))) * bag_size
-                if position_qty is not None and maker_symbol_position.direction == PositionDirection.long:
-                    qty = min(qty, position_qty)
-                    is_reduce_position = True
-                ret[(symbol, maker_exchange)] = OrderSignal(
-                    symbol=symbol,
-                    maker_side='sell',
-                    maker_exchange=maker_exchange,
-                    maker_price=Decimal(maker_ob['asks'][0][0]),
-                    maker_qty=qty,
-                    taker_side='buy',
-                    taker_exchange=taker_exchange,
-                    taker_price=Decimal(taker_ob['asks'][0][0]),
-                    orderbook_ts=maker_ob['ts'],
-                    cancel_order_threshold=float(high_cancel_threshold),
-                    maker_position=maker_symbol_position,
-                    is_reduce_position=is_reduce_position,
-                )
-            # else if maker exchange price if lower
-            elif len(maker_ob['bids']) and len(taker_ob['bids']) and float(maker_ob['bids'][0][0]) < float(taker_ob['bids'][0][0]) * float(1 + low_delta):
-                bag_size = get_bag_size_by_ex_name(taker_exchange, symbol)
-                qty = Decimal(
-                    str(np.average(np.array(taker_ob['bids'], dtype=np.float64)[:5, 1]))) * bag_size
-                if position_qty is not None and maker_symbol_position.direction == PositionDirection.short:
-                    qty = min(qty, position_qty)
-                    is_reduce_position = True
-                ret[(symbol, maker_exchange)] = OrderSignal(
-                    symbol=symbol,
-                    maker_side='buy',
-                    maker_exchange=maker_exchange,
-                    maker_price=Decimal(maker_ob['bids'][0][0]),
-                    maker_qty=qty,
-                    taker_side='sell',
-                    taker_exchange=taker_exchange,
-                    taker_price=Decimal(taker_ob['bids'][0][0]),
-                    orderbook_ts=maker_ob['ts'],
-                    cancel_order_threshold=float(low_cancel_threshold),
-                    maker_position=maker_symbol_position,
-                    is_reduce_position=is_reduce_position,
-                )
+                    low_delta = threshold.short_decrease
+                    low_cancel_threshold = threshold.short_cancel_decrease
+
+            rows.append(SignalRow(
+                symbol, ob, maker_exchange, taker_exchange, maker_symbol_position,
+                position_qty, high_cancel_threshold, low_cancel_threshold,
+            ))
+            prices.append((
+                _best_or_nan(maker_ob, 'asks'), _best_or_nan(taker_ob, 'asks'),
+                _best_or_nan(maker_ob, 'bids'), _best_or_nan(taker_ob, 'bids'),
+            ))
+            factors.append((1.0 + high_delta, 1.0 + low_delta))
+    return (
+        rows,
+        np.array(prices, dtype=np.float64).reshape(-1, 4),
+        np.array(factors, dtype=np.float64).reshape(-1, 2),
+    )
+
+
+def evaluate_signal_rows(prices: np.ndarray, factors: np.ndarray):
+    """
+    return: (sell, buy) boolean arrays, sell when the maker ask is above the
+    taker ask by the sell factor, else buy when the maker bid is below the
+    taker bid by the buy factor. NaN prices never fire
+    """
+    sell = prices[:, 0] > prices[:, 1] * factors[:, 0]
+    buy = ~sell & (prices[:, 2] < prices[:, 3] * factors[:, 1])
+    return sell, buy
+
+
+def _make_signal(row: SignalRow, maker_side: str) -> OrderSignal:
+    maker_ob = row.ob[row.maker_exchange]
+    taker_ob = row.ob[row.taker_exchange]
+    side = 'asks' if maker_side == 'sell' else 'bids'
+    bag_size = get_bag_size_by_ex_name(row.taker_exchange, row.symbol)
+    qty = Decimal(
+        str(np.average(book_array(taker_ob, side)[:5, 1]))) * bag_size
+    is_reduce_position = False
+    # a sell reduces a long position, a buy a short one
+    reduce_direction = PositionDirection.long if maker_side == 'sell' else PositionDirection.short
+    if row.position_qty is not None and row.maker_position.direction == reduce_direction:
+        qty = min(qty, row.position_qty)
+        is_reduce_position = True
+    return OrderSignal(
+        symbol=row.symbol,
+        maker_side=maker_side,
+        maker_exchange=row.maker_exchange,
+        maker_price=level_price_decimal(maker_ob, side),
+        maker_qty=qty,
+        taker_side='buy' if maker_side == 'sell' else 'sell',
+        taker_exchange=row.taker_exchange,
+        taker_price=level_price_decimal(taker_ob, side),
+        orderbook_ts=maker_ob['ts'],
+        cancel_order_threshold=(
+            row.high_cancel_threshold if maker_side == 'sell' else row.low_cancel_threshold),
+        maker_position=row.maker_position,
+        is_reduce_position=is_reduce_position,
+        stage_ts=get_signal_stage_ts(row.ob),
+    )
+
+
+def get_signal_from_orderbooks(rc: redis.Redis, exchanges: dict[str, ccxt.Exchange],
+                               config: OrderConfig, thresholds: dict[str, Threshold], orderbooks: list) -> Dict[str, OrderSignal]:
+    """
+    evaluate the latest orderbook of every symbol in one vectorized pass,
+    the signals are built for the rows which fire only
+    return: {(symbol, maker exchange): `OrderSignal`}
+    """
+    start = time.perf_counter()
+    rows, prices, factors = pack_signal_rows(
+        rc, exchanges, config, thresholds, orderbooks)
+    sell, buy = evaluate_signal_rows(prices, factors)
+
+    ret = {}
+    for i in np.flatnonzero(sell | buy):
+        row = rows[i]
+        ret[(row.symbol, row.maker_exchange)] = _make_signal(
+            row, 'sell' if sell[i] else 'buy')
+    _signal_eval_stats.add(len(rows), len(ret), time.perf_counter() - start)
+
+    for (symbol, maker_exchange), signal in ret.items():
+        record_latency(maker_exchange, symbol, 'signal',
+                       signal.stage_ts.order_read, signal.stage_ts.signal)
     return ret
@@ -212,7 +212,7 @@ def start_order_status_stream_mainloop(
     cancel_ctx: CancelContext,
     config: OrderConfig,
 ):
-    symbols = [s.symbol_name for s in config.cross_arbitrage_symbol_datas]
+    symbols = config.symbol_names()
     config_symbols = {k: v for k, v in symbol_mapping.items() if k in symbols}
 
     thread_objects = []
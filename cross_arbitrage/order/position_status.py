@@ -2,8 +2,9 @@ from decimal import Decimal
 from enum import Enum
 from functools import lru_cache
 import logging
+import threading
 import time
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import ccxt
 from cross_arbitrage.config.symbol import SymbolConfig
 from cross_arbitrage.order.config import OrderConfig
@@ -42,9 +43,26 @@ def position_status_key():
     return "order:position_status"
 
 
+def position_status_channel():
+    return "order:position_status:updates"
+
+
+# last position published by this process, {field: data}
+_published_positions: Dict[str, bytes] = {}
+
+
 def update_position_status(rc: redis.Redis, exchange_name, symbol, position_status: PositionStatus):
-    rc.hset(position_status_key(),
-            f'{exchange_name}:{symbol}', orjson.dumps(position_status.dict(), default=_json_default))
+    field = f'{exchange_name}:{symbol}'
+    data = orjson.dumps(position_status.dict(), default=_json_default)
+    with rc.pipeline(transaction=False) as pipe:
+        pipe.hset(position_status_key(), field, data)
+        # the mirrors only need the changes
+        if _published_positions.get(field) != data:
+            pipe.publish(position_status_channel(),
+                         orjson.dumps({'field': field, 'data': position_status.dict()},
+                                      default=_json_default))
+        pipe.execute()
+    _published_positions[field] = data
 
 
 def get_position_status(rc: redis.Redis, exchange_name, symbol):
@@ -54,6 +72,96 @@ def get_position_status(rc: redis.Redis, exchange_name, symbol):
     return PositionStatus.parse_obj(orjson.loads(data))
 
 
+class PositionMirror:
+    """
+    in memory copy of the position status hash: loaded once, then updated
+    from the channel `update_position_status` publishes to, and reloaded
+    every `resync_interval` seconds in case a message was lost. `version`
+    is bumped on every change, so readers can tell the positions moved
+    """
+
+    def __init__(self, redis_url: str, resync_interval: float = 60.0):
+        self.rc = redis.Redis.from_url(redis_url)
+        self.resync_interval = resync_interval
+        self.positions: Dict[Tuple[str, str], PositionStatus] = {}
+        self.version = 0
+        self.ready = False
+
+    def get(self, exchange_name: str, symbol: str) -> Optional[PositionStatus]:
+        return self.positions.get((exchange_name, symbol))
+
+    def apply(self, field, data) -> bool:
+        """
+        return: True if the position changed
+        """
+        if isinstance(field, bytes):
+            field = field.decode()
+        exchange_name, symbol = field.split(':', 1)
+        position = PositionStatus.parse_obj(
+            orjson.loads(data) if isinstance(data, (bytes, str)) else data)
+        if self.positions.get((exchange_name, symbol)) == position:
+            return False
+        self.positions[(exchange_name, symbol)] = position
+        self.version += 1
+        return True
+
+    def apply_message(self, message: bytes):
+        data = orjson.loads(message)
+        self.apply(data['field'], data['data'])
+
+    def load(self):
+        for field, data in self.rc.hgetall(position_status_key()).items():
+            self.apply(field, data)
+        self.ready = True
+
+    def run(self, ctx: CancelContext):
+        while not ctx.is_canceled():
+            try:
+                with self.rc.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    # subscribe first, the updates published during the load
+                    # are applied after it
+                    pubsub.subscribe(position_status_channel())
+                    self.load()
+                    last_load = time.monotonic()
+                    while not ctx.is_canceled():
+                        message = pubsub.get_message(timeout=1.0)
+                        if message is not None:
+                            self.apply_message(message['data'])
+                        if time.monotonic() - last_load > self.resync_interval:
+                            self.load()
+                            last_load = time.monotonic()
+            except redis.RedisError as e:
+                self.ready = False
+                logging.warning(f"position mirror failed: {type(e)}: {e}")
+                sleep_with_context(ctx, 1)
+
+
+_position_mirror: Optional[PositionMirror] = None
+
+
+def start_position_mirror(ctx: CancelContext, redis_url: str, name: str) -> PositionMirror:
+    """
+    start the process wide mirror used by `get_mirrored_position_status`
+    """
+    global _position_mirror
+    if _position_mirror is None:
+        _position_mirror = PositionMirror(redis_url)
+        threading.Thread(
+            target=_position_mirror.run, args=(ctx,),
+            name=f"{name}_position_mirror_thread", daemon=True,
+        ).start()
+    return _position_mirror
+
+
+def get_mirrored_position_status(exchange_name, symbol) -> Tuple[bool, Optional[PositionStatus]]:
+    """
+    return: (found, position), found is False until the mirror is loaded
+    """
+    if _position_mirror is None or not _position_mirror.ready:
+        return False, None
+    return True, _position_mirror.get(exchange_name, symbol)
+
+
 def refresh_position_status(rc: redis.Redis, exchanges: dict[str, ccxt.Exchange], symbols: list):
     for exchange_name, exchange in exchanges.items():
         try:
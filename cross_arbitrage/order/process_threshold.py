@@ -10,6 +10,9 @@ import redis
 
 from cross_arbitrage.fetch.fetch_funding_rate import get_funding_rate_key
 from cross_arbitrage.fetch.utils.common import now_s
+from cross_arbitrage.fetch.utils.orderbook import best_price
+from cross_arbitrage.fetch.utils.orderbook_codec import decode_orderbook_entry
+from cross_arbitrage.fetch.utils.redis import get_ob_symbol_stream_key
 from cross_arbitrage.order.config import OrderConfig
 from cross_arbitrage.order.position_status import PositionDirection, PositionStatus, get_position_status
 from cross_arbitrage.order.threshold import SymbolConfig, ThresholdConfig
@@ -342,6 +345,31 @@ def get_orderbook(ctx: CancelContext, config: OrderConfig, rc: redis.Redis, symb
     return orderbooks
 
 
+@retry(max_retry_count=3, raise_exception=True, default_return_value=[])
+def get_symbol_orderbooks(ctx: CancelContext, config: OrderConfig, rc: redis.Redis, symbols: List[str] | set[str]) -> list:
+    """
+    read the binary symbol streams of `symbols` only, `rc` must not decode
+    responses
+    """
+    orderbooks = []
+    start_id = (now_s() - config.dyn_threshold.time_window_seconds) * 1000
+    for symbol in symbols:
+        stream = get_ob_symbol_stream_key(config.redis.orderbook_stream, symbol)
+        last_id = start_id
+        while not ctx.is_canceled():
+            res = rc.xread({stream: last_id}, count=1000)
+            if not res:
+                break
+            obs = res[0][1]
+            if not obs:
+                break
+            last_id = obs[-1][0]
+            for _id, ob in obs:
+                for _, raw in ob.items():
+                    orderbooks.append(decode_orderbook_entry(config.exchange_pair_names, symbol, raw))
+    return orderbooks
+
+
 def get_dataframe_from_orderbook(obs: list, exchanges: list[str]):
     if len(exchanges) != 2:
         raise ValueError("exchanges length must be 2")
@@ -356,9 +384,9 @@ def get_dataframe_from_orderbook(obs: list, exchanges: list[str]):
             continue
         arr.append(
             (ob['symbol'], np.int64(ob['ts']), ob['exchange'],
-             np.float64(ob[ex1]['bids'][0][0]), np.float64(
-                 ob[ex1]['asks'][0][0]),
-             np.float64(ob[ex2]['bids'][0][0]), np.float64(ob[ex2]['asks'][0][0]),)
+             np.float64(best_price(ob[ex1], 'bids')), np.float64(
+                 best_price(ob[ex1], 'asks')),
+             np.float64(best_price(ob[ex2], 'bids')), np.float64(best_price(ob[ex2], 'asks')),)
         )
     df = pd.DataFrame(arr, columns=['symbol', 'ts', 'trigger_exchange',
                                     'ex1_bid', 'ex1_ask', 'ex2_bid', 'ex2_ask'])
@@ -372,18 +400,22 @@ def process_threshold_mainloop(ctx: CancelContext, config: OrderConfig):
     rc = redis.Redis.from_url(
         config.redis.url, encoding="utf-8", decode_responses=True
     )
+    # the binary entries are read as bytes
+    raw_rc = redis.Redis.from_url(config.redis.url)
 
     @lru_cache(2)
     def get_taker_exchange_name(maker_exchange_name):
         return (set(config.exchanges) - {maker_exchange_name}).pop()
 
-    symbols_set = set(
-        symbol_info.symbol_name for symbol_info in config.cross_arbitrage_symbol_datas)
+    symbols_set = config.symbol_names()
     symbols = list(symbols_set)
     exchanges = list(config.exchange_pair_names)
 
     while not ctx.is_canceled():
-        orderbook = get_orderbook(ctx, config, rc, symbols_set)
+        if config.redis.symbol_streams():
+            orderbook = get_symbol_orderbooks(ctx, config, raw_rc, symbols_set)
+        else:
+            orderbook = get_orderbook(ctx, config, rc, symbols_set)
 
         ob_df = get_dataframe_from_orderbook(orderbook, exchanges)
         del orderbook
@@ -6,10 +6,12 @@ from typing import Dict
 import ccxt
 from pydantic import BaseModel
 import pydantic
+from cross_arbitrage.fetch.utils.orderbook import book_array
 from cross_arbitrage.fetch.utils.redis import get_ob_storage_key
 from cross_arbitrage.utils.csv import CSVModel
 from cross_arbitrage.utils.decorator import retry
-from cross_arbitrage.utils.exchange import get_exchange_name
+from cross_arbitrage.utils.exchange import get_exchange_market_meta, get_exchange_name
+from cross_arbitrage.utils.latency import StageTimestamps, record_latency, stage_now
 from cross_arbitrage.utils.order import get_order_qty, get_order_status_key
 import orjson
 import redis
@@ -86,12 +88,20 @@ def _deal_loop_impl(ctx: CancelContext, config: OrderConfig, signal: OrderSignal
     #     rc.srem('order:signal:processing', lock_key)
     #     return
 
+    stage_ts = signal.stage_ts or StageTimestamps()
     retry = 2
     while retry:
         try:
+            maker_sent = stage_now()
             maker_order = maker_only_order(maker_exchange, symbol,
                                            signal.maker_side, order_qty, order_price,
                                            client_id=maker_client_id)
+            stage_ts = stage_ts._replace(maker_sent=maker_sent, maker_ack=stage_now())
+            signal = signal._replace(stage_ts=stage_ts)
+            record_latency(signal.maker_exchange, symbol, 'maker_sent', stage_ts.signal, stage_ts.maker_sent)
+            record_latency(signal.maker_exchange, symbol, 'maker_ack', stage_ts.maker_sent, stage_ts.maker_ack)
+            record_latency(signal.maker_exchange, symbol, 'tick_to_order',
+                           stage_ts.exchange, stage_ts.maker_sent)
             break
         except Exception as e:
             if isinstance(e, ccxt.ExchangeError) and 'notional must be no smaller' in str(e):
@@ -124,11 +134,9 @@ def _deal_loop_impl(ctx: CancelContext, config: OrderConfig, signal: OrderSignal
     maker_filled_qty = Decimal('0')
     followed_qty = Decimal('0')
 
-    taker_exchange_symbol = get_exchange_symbol_from_exchange(taker_exchange, symbol)
-    taker_exchange_bag_size = Decimal(
-        str(taker_exchange.market(taker_exchange_symbol.name)['contractSize'])) * taker_exchange_symbol.multiplier
-    taker_exchange_minimum_qty = Decimal(
-        str(taker_exchange.market(taker_exchange_symbol.name)['limits']['amount']['min'])) * taker_exchange_bag_size
+    taker_meta = get_exchange_market_meta(taker_exchange, symbol, signal.taker_exchange)
+    taker_exchange_bag_size = taker_meta.bag_size
+    taker_exchange_minimum_qty = taker_meta.min_amount * taker_exchange_bag_size
 
     # set to start exiting tasks
     _clear = False
@@ -197,9 +205,15 @@ def _deal_loop_impl(ctx: CancelContext, config: OrderConfig, signal: OrderSignal
                 logging.info(
                     f'[{signal.taker_exchange}] [{symbol}] place taker order: {need_order_qty}')
                 try:
+                    taker_sent = stage_now()
                     order = market_order(taker_exchange, symbol,
                                          signal.taker_side, need_order_qty,
                                          client_id=taker_client_id)
+                    if stage_ts.taker_sent is None:
+                        # the first hedge order of the signal
+                        stage_ts = stage_ts._replace(taker_sent=taker_sent, taker_ack=stage_now())
+                        signal = signal._replace(stage_ts=stage_ts)
+                        record_latency(signal.maker_exchange, symbol, 'taker_ack', stage_ts.taker_sent, stage_ts.taker_ack)
                     if order['amount'] is not None:
                         followed_qty += Decimal(str(order['amount'])) * \
                             taker_exchange_bag_size
@@ -390,7 +404,7 @@ def should_cancel_makeonly_order(ctx: CancelContext, config: OrderConfig, signal
 
     match signal.taker_side:
         case 'buy':
-            ob = np.array(taker_ob['asks'], dtype=np.float64)
+            ob = book_array(taker_ob, 'asks')
             if len(ob) == 0:
                 logging.warning('no asks on taker side: {}: {}'.format(
                     signal.taker_exchange, taker_ob))
@@ -408,7 +422,7 @@ def should_cancel_makeonly_order(ctx: CancelContext, config: OrderConfig, signal
                 return True
             return False
         case 'sell':
-            ob = np.array(taker_ob['bids'], dtype=np.float64)
+            ob = book_array(taker_ob, 'bids')
             if len(ob) == 0:
                 logging.warning('no bids on taker side: {}: {}'.format(
                     signal.taker_exchange, taker_ob))
@@ -2,6 +2,8 @@ from decimal import Decimal
 import logging
 import pprint
 import time
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
 import orjson
 import pydantic
 import redis
@@ -33,6 +35,70 @@ class SymbolConfig(pydantic.BaseModel):
     def json_bytes(self):
         return orjson.dumps(self.dict(), default=_json_default)
 
+    def float_thresholds(self) -> 'FloatThresholds':
+        long, short = self.long_threshold, self.short_threshold
+        return FloatThresholds(
+            long_increase=float(long.increase_position_threshold),
+            long_decrease=float(long.decrease_position_threshold),
+            long_cancel_increase=float(long.cancel_increase_position_threshold),
+            long_cancel_decrease=float(long.cancel_decrease_position_threshold),
+            short_increase=float(short.increase_position_threshold),
+            short_decrease=float(short.decrease_position_threshold),
+            short_cancel_increase=float(short.cancel_increase_position_threshold),
+            short_cancel_decrease=float(short.cancel_decrease_position_threshold),
+        )
+
+
+class FloatThresholds(NamedTuple):
+    """
+    the thresholds of one symbol as floats, for the signal path
+    """
+
+    long_increase: float
+    long_decrease: float
+    long_cancel_increase: float
+    long_cancel_decrease: float
+    short_increase: float
+    short_decrease: float
+    short_cancel_increase: float
+    short_cancel_decrease: float
+
+
+class ThresholdSnapshot(NamedTuple):
+    """
+    thresholds published by `Threshold.refresh_loop`, never mutated: a
+    refresh replaces the whole snapshot, so a reader keeping a reference
+    sees one consistent version without a lock
+    """
+
+    version: int
+    thresholds: Mapping[str, FloatThresholds]
+
+
+def _config_symbol_thresholds(c) -> SymbolConfig:
+    return SymbolConfig(
+        long_threshold=ThresholdConfig(
+            increase_position_threshold=Decimal(
+                str(c.long_threshold_data.increase_position_threshold)),
+            decrease_position_threshold=Decimal(
+                str(c.long_threshold_data.decrease_position_threshold)),
+            cancel_increase_position_threshold=Decimal(
+                str(c.long_threshold_data.cancel_increase_position_threshold)),
+            cancel_decrease_position_threshold=Decimal(
+                str(c.long_threshold_data.cancel_decrease_position_threshold)),
+        ),
+        short_threshold=ThresholdConfig(
+            increase_position_threshold=Decimal(
+                str(c.short_threshold_data.increase_position_threshold)),
+            decrease_position_threshold=Decimal(
+                str(c.short_threshold_data.decrease_position_threshold)),
+            cancel_increase_position_threshold=Decimal(
+                str(c.short_threshold_data.cancel_increase_position_threshold)),
+            cancel_decrease_position_threshold=Decimal(
+                str(c.short_threshold_data.cancel_decrease_position_threshold)),
+        ),
+    )
+
 
 class Threshold:
     rc: redis.Redis
@@ -50,6 +116,26 @@ class Threshold:
         self.redis_key = key
         self.makeonly_exchange = makeonly_exchange
         self.symbol_thresholds: dict[str, SymbolConfig] = {}
+        # the config thresholds until the first refresh
+        self.snapshot = ThresholdSnapshot(0, MappingProxyType({}))
+        self._publish({
+            c.symbol_name: _config_symbol_thresholds(c)
+            for c in self._symbol_datas()
+        })
+
+    def _symbol_datas(self):
+        return filter(lambda d: d.makeonly_exchange_name == self.makeonly_exchange,
+                      self.config.cross_arbitrage_symbol_datas)
+
+    def _publish(self, symbol_thresholds: dict[str, SymbolConfig]):
+        thresholds = {
+            symbol_name: symbol_threshold.float_thresholds()
+            for symbol_name, symbol_threshold in symbol_thresholds.items()
+        }
+        if thresholds != self.snapshot.thresholds:
+            # one reference assignment, readers see the old or the new snapshot
+            self.snapshot = ThresholdSnapshot(
+                self.snapshot.version + 1, MappingProxyType(thresholds))
 
     def refresh_thresholds(self):
         redis_thresholds = self.rc.hgetall(self.redis_key)
@@ -62,33 +148,12 @@ class Threshold:
             symbol_name = symbol_name.decode()
             dyn_thresholds[symbol_name] = symbol_threshold
 
-        for c in filter(lambda d: d.makeonly_exchange_name == self.makeonly_exchange,
-                        self.config.cross_arbitrage_symbol_datas):
+        for c in self._symbol_datas():
             if c.symbol_name not in dyn_thresholds:
-                self.symbol_thresholds[c.symbol_name] = SymbolConfig(
-                    long_threshold=ThresholdConfig(
-                        increase_position_threshold=Decimal(
-                            str(c.long_threshold_data.increase_position_threshold)),
-                        decrease_position_threshold=Decimal(
-                            str(c.long_threshold_data.decrease_position_threshold)),
-                        cancel_increase_position_threshold=Decimal(
-                            str(c.long_threshold_data.cancel_increase_position_threshold)),
-                        cancel_decrease_position_threshold=Decimal(
-                            str(c.long_threshold_data.cancel_decrease_position_threshold)),
-                    ),
-                    short_threshold=ThresholdConfig(
-                        increase_position_threshold=Decimal(
-                            str(c.short_threshold_data.increase_position_threshold)),
-                        decrease_position_threshold=Decimal(
-                            str(c.short_threshold_data.decrease_position_threshold)),
-                        cancel_increase_position_threshold=Decimal(
-                            str(c.short_threshold_data.cancel_increase_position_threshold)),
-                        cancel_decrease_position_threshold=Decimal(
-                            str(c.short_threshold_data.cancel_decrease_position_threshold)),
-                    ),
-                )
+                self.symbol_thresholds[c.symbol_name] = _config_symbol_thresholds(c)
             else:
                 self.symbol_thresholds[c.symbol_name] = dyn_thresholds[c.symbol_name]
+        self._publish(self.symbol_thresholds)
 
     def refresh_loop(self, ctx: CancelContext, interval=1):
         count = 0
@@ -112,26 +177,5 @@ class Threshold:
         if ret is None:
             c = self.config.get_symbol_data_by_makeonly(
                 symbol_name, self.makeonly_exchange)
-            ret = SymbolConfig(
-                long_threshold=ThresholdConfig(
-                    increase_position_threshold=Decimal(
-                        str(c.long_threshold_data.increase_position_threshold)),
-                    decrease_position_threshold=Decimal(
-                        str(c.long_threshold_data.decrease_position_threshold)),
-                    cancel_increase_position_threshold=Decimal(
-                        str(c.long_threshold_data.cancel_increase_position_threshold)),
-                    cancel_decrease_position_threshold=Decimal(
-                        str(c.long_threshold_data.cancel_decrease_position_threshold)),
-                ),
-                short_threshold=ThresholdConfig(
-                    increase_position_threshold=Decimal(
-                        str(c.short_threshold_data.increase_position_threshold)),
-                    decrease_position_threshold=Decimal(
-                        str(c.short_threshold_data.decrease_position_threshold)),
-                    cancel_increase_position_threshold=Decimal(
-                        str(c.short_threshold_data.cancel_increase_position_threshold)),
-                    cancel_decrease_position_threshold=Decimal(
-                        str(c.short_threshold_data.cancel_decrease_position_threshold)),
-                ),
-            )
+            ret = _config_symbol_thresholds(c)
         return ret
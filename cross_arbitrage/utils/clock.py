@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, NamedTuple, Optional
+
+import ccxt
+
+from cross_arbitrage.utils.context import CancelContext, sleep_with_context
+
+
+class ClockSample(NamedTuple):
+    # exchange clock - local clock, in ms
+    offset: float
+    rtt: float
+    # local time of the sample, in s
+    ts: float
+
+
+class ExchangeClock:
+    """
+    NTP style offset of one exchange clock: every round takes a few server
+    time samples and keeps the one with the smallest round trip, whose
+    midpoint is the least disturbed by network delay. the estimate is the
+    minimum rtt sample of the last `window` rounds, so it follows drift
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fetch_time_ms: Callable[[], int],
+        samples_per_round: int = 5,
+        window: int = 10,
+    ):
+        self.name = name
+        self.fetch_time_ms = fetch_time_ms
+        self.samples_per_round = samples_per_round
+        self.rounds = deque(maxlen=window)
+        self.estimate: Optional[ClockSample] = None
+
+    def sample(self) -> ClockSample:
+        t0 = time.time()
+        server_ms = self.fetch_time_ms()
+        t1 = time.time()
+        return ClockSample(
+            offset=server_ms - (t0 + t1) / 2 * 1000,
+            rtt=(t1 - t0) * 1000,
+            ts=t1,
+        )
+
+    def update(self) -> Optional[ClockSample]:
+        samples = []
+        for _ in range(self.samples_per_round):
+            try:
+                samples.append(self.sample())
+            except Exception as ex:
+                logging.warning(f"{self.name} server time failed: {type(ex)}: {ex}")
+        if samples:
+            self.rounds.append(min(samples, key=lambda s: s.rtt))
+            self.estimate = min(self.rounds, key=lambda s: s.rtt)
+        return self.estimate
+
+    @property
+    def offset(self) -> float:
+        return self.estimate.offset if self.estimate else 0.0
+
+
+_clocks: Dict[str, ExchangeClock] = {}
+
+
+def _exchange_fetch_time(exchange: ccxt.Exchange) -> Callable[[], int]:
+    return lambda: int(exchange.fetch_time())
+
+
+def clock_sync_loop(ctx: CancelContext, clocks: Dict[str, ExchangeClock], interval: float):
+    while not ctx.is_canceled():
+        for ex_name, clock in clocks.items():
+            estimate = clock.update()
+            if estimate:
+                logging.info(
+                    f"--------> {ex_name} clock: offset={estimate.offset:.2f}ms "
+                    f"rtt={estimate.rtt:.2f}ms"
+                )
+        sleep_with_context(ctx, interval)
+
+
+def start_clock_sync(
+    ctx: CancelContext, exchanges: Dict[str, ccxt.Exchange], name: str,
+    interval: float = 60,
+) -> Dict[str, ExchangeClock]:
+    """
+    estimate the clock offsets of `exchanges` in the background, used by the
+    process wide helpers below. the offsets are 0 until the first round
+    """
+    new_clocks = {
+        ex_name: ExchangeClock(ex_name, _exchange_fetch_time(exchange))
+        for ex_name, exchange in exchanges.items()
+        if ex_name not in _clocks
+    }
+    _clocks.update(new_clocks)
+    if new_clocks:
+        threading.Thread(
+            target=clock_sync_loop, args=(ctx, new_clocks, interval),
+            name=f"{name}_clock_sync_thread", daemon=True,
+        ).start()
+    return _clocks
+
+
+def get_clock_offset(ex_name: str) -> float:
+    """
+    return: exchange clock - local clock in ms, 0 before any estimate
+    """
+    clock = _clocks.get(ex_name)
+    return clock.offset if clock else 0.0
+
+
+def exchange_now_ms(ex_name: str) -> float:
+    return time.time() * 1000 + get_clock_offset(ex_name)
+
+
+def exchange_to_local_ms(ex_name: str, exchange_ts_ms) -> Optional[float]:
+    """
+    an exchange timestamp on the local clock
+    """
+    if exchange_ts_ms is None:
+        return None
+    return float(exchange_ts_ms) - get_clock_offset(ex_name)
+
+
+def exchange_age_ms(ex_name: str, exchange_ts_ms) -> float:
+    """
+    age of an exchange timestamp without the clock offset, network delay
+    included
+    """
+    return exchange_now_ms(ex_name) - float(exchange_ts_ms)
@@ -6,11 +6,20 @@ from functools import lru_cache
 
 import ccxt
 from cross_arbitrage.config.account import AccountConfig
+from cross_arbitrage.utils.market_meta import MarketMeta, build_market_meta, get_market_meta
 from cross_arbitrage.utils.symbol_mapping import get_ccxt_symbol, get_exchange_symbol_from_exchange
 
 _exchanges = {}
 
 
+def set_exchanges(exchanges: Dict[str, ccxt.Exchange]):
+    """
+    use the loaded `exchanges` in the helpers which load their own markets
+    """
+    _exchanges.update(exchanges)
+    _get_bag_size_by_ex_name.cache_clear()
+
+
 def create_exchange(params: AccountConfig, proxy: dict = None) -> ccxt.Exchange:
     c = {}
     if params.api_key and params.secret:
@@ -31,32 +40,25 @@ def create_exchange(params: AccountConfig, proxy: dict = None) -> ccxt.Exchange:
         case _ as x:
             raise Exception(f'unknown exchange: {x}')
 
+def get_exchange_market_meta(exchange: ccxt.Exchange, symbol: str, ex_name: str = None) -> MarketMeta:
+    """
+    the `MarketMeta` of the loaded table, built from the ccxt market when the
+    table does not have it
+    """
+    ex_name = ex_name or get_exchange_name(exchange)
+    meta = get_market_meta(ex_name, symbol)
+    if meta is None:
+        exchange.load_markets()
+        meta = build_market_meta(ex_name, exchange, symbol,
+                                 get_exchange_symbol_from_exchange(exchange, symbol))
+    return meta
+
 def get_symbol_min_amount_by_exchange(exchange: ccxt.Exchange, symbol:str) -> Decimal:
-    exchange.load_markets()
-    exchange_symbol = get_exchange_symbol_from_exchange(exchange, symbol)
-    symbol_info = exchange.market(exchange_symbol.name)
-    match exchange:
-        case ccxt.okex():
-            return Decimal(str(symbol_info['contractSize'])) * exchange_symbol.multiplier
-        case ccxt.binanceusdm():
-            return Decimal(str(10**(-symbol_info['precision']['amount']))) * exchange_symbol.multiplier
-        case _:
-            raise Exception(f"unsupport exchange: {exchange.name}")
+    return get_exchange_market_meta(exchange, symbol).min_qty
 
 def get_symbol_min_amount(exchanges: Dict[str, ccxt.Exchange], symbol:str):
-    ret = {}
-    for ex_name, ex in exchanges.items():
-        ex.load_markets()
-        exchange_symbol = get_exchange_symbol_from_exchange(ex, symbol)
-        symbol_info = ex.market(exchange_symbol.name)
-        match ex:
-            case ccxt.okex():
-                ret[ex_name] = Decimal(str(symbol_info['contractSize'])) * exchange_symbol.multiplier
-            case ccxt.binanceusdm():
-                ret[ex_name] = Decimal(str(10**(-symbol_info['precision']['amount']))) * exchange_symbol.multiplier
-            case _:
-                raise Exception(f"unsupport exchange: {ex_name}")
-    return max(list(ret.values()))
+    return max(get_exchange_market_meta(ex, symbol, ex_name).min_qty
+               for ex_name, ex in exchanges.items())
 
 def get_exchange_name(exchange: ccxt.Exchange) -> str:
     match exchange:
@@ -69,15 +71,18 @@ def get_exchange_name(exchange: ccxt.Exchange) -> str:
 
 
 def get_bag_size(exchange: ccxt.Exchange, symbol: str) -> Decimal:
-    exchange_symbol = get_exchange_symbol_from_exchange(exchange, symbol)
-    exchange_symbol_name = exchange_symbol.name
-    
-    symbol_info = exchange.market(exchange_symbol_name)
-    return Decimal(str(symbol_info['contractSize'])) * exchange_symbol.multiplier
+    return get_exchange_market_meta(exchange, symbol).bag_size
 
 
-@lru_cache
 def get_bag_size_by_ex_name(ex_name: str, symbol: str) -> Decimal:
+    meta = get_market_meta(ex_name, symbol)
+    if meta is not None:
+        return meta.bag_size
+    return _get_bag_size_by_ex_name(ex_name, symbol)
+
+
+@lru_cache
+def _get_bag_size_by_ex_name(ex_name: str, symbol: str) -> Decimal:
     exchange: ccxt.Exchange = _exchanges.get(ex_name, None)
     if exchange is None:
         match ex_name:
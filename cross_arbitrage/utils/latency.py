@@ -0,0 +1,170 @@
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import redis
+
+from cross_arbitrage.utils.context import CancelContext, sleep_with_context
+
+# a stage latency is the time from the previous stage to this one. the
+# orderbook stages are counted for the exchange whose update triggered the
+# aggregation, the order stages for the maker exchange
+LATENCY_STAGES = [
+    "ws_recv",  # exchange event time -> websocket receive
+    "decode",  # receive -> normalized orderbook
+    "publish",  # decode -> redis publish
+    "agg",  # publish -> aggregated stream entry
+    "order_read",  # aggregation -> read by order_loop
+    "signal",  # read -> OrderSignal created
+    "maker_sent",  # signal -> maker order sent
+    "maker_ack",  # maker order sent -> acked
+    "taker_ack",  # taker hedge order sent -> acked
+    "tick_to_order",  # exchange event time -> maker order sent
+]
+
+# upper bounds in ms, 0.05ms to ~70s by steps of 20%
+LATENCY_BUCKETS = [round(0.05 * 1.2 ** i, 4) for i in range(78)]
+
+
+class StageTimestamps(NamedTuple):
+    """
+    ms timestamps of one orderbook from the exchange event to the hedge ack
+    """
+
+    # exchange event time, converted to the local clock
+    exchange: Optional[float] = None
+    ws_recv: Optional[float] = None
+    decode: Optional[float] = None
+    publish: Optional[float] = None
+    agg: Optional[float] = None
+    order_read: Optional[float] = None
+    signal: Optional[float] = None
+    maker_sent: Optional[float] = None
+    maker_ack: Optional[float] = None
+    taker_sent: Optional[float] = None
+    taker_ack: Optional[float] = None
+
+
+def stage_now() -> float:
+    """
+    return: the current time in ms with µs precision
+    """
+    return round(time.time() * 1000, 3)
+
+
+def get_latency_key(exchange: str, symbol: str) -> str:
+    return f"latency:hist:{exchange}:{symbol}"
+
+
+class LatencyHistogram:
+    def __init__(self, counts: List[int] = None):
+        # the last bucket counts everything above the bounds
+        self.counts = counts or [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, ms: float, count: int = 1):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, ms)] += count
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        return: the upper bound in ms of the bucket holding the q quantile
+        """
+        total = self.total
+        if total == 0:
+            return None
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return LATENCY_BUCKETS[min(i, len(LATENCY_BUCKETS) - 1)]
+        return LATENCY_BUCKETS[-1]
+
+
+class LatencyRecorder:
+    """
+    count stage latencies per (exchange, symbol, stage) in memory, `run`
+    adds the counts to redis hashes every `flush_interval` seconds
+    """
+
+    def __init__(self, redis_url: str, flush_interval: float = 1.0):
+        self.rc = redis.Redis.from_url(redis_url)
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+
+    def record(self, exchange: str, symbol: str, stage: str, ms: float):
+        field = f"{stage}:{bisect.bisect_left(LATENCY_BUCKETS, ms)}"
+        with self.lock:
+            self.pending[(exchange, symbol)][field] += 1
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(lambda: defaultdict(int))
+        if not pending:
+            return
+        with self.rc.pipeline(transaction=False) as pipe:
+            for (exchange, symbol), fields in pending.items():
+                key = get_latency_key(exchange, symbol)
+                for field, count in fields.items():
+                    pipe.hincrby(key, field, count)
+            pipe.execute()
+
+    def run(self, ctx: CancelContext):
+        while not ctx.is_canceled():
+            sleep_with_context(ctx, self.flush_interval)
+            try:
+                self.flush()
+            except redis.RedisError as e:
+                logging.warning(f"flush latency histograms failed: {type(e)}: {e}")
+
+
+_recorder: Optional[LatencyRecorder] = None
+
+
+def start_latency_recorder(ctx: CancelContext, redis_url: str, name: str) -> LatencyRecorder:
+    """
+    start the process wide recorder used by `record_latency`
+    """
+    global _recorder
+    if _recorder is None:
+        _recorder = LatencyRecorder(redis_url)
+        threading.Thread(
+            target=_recorder.run, args=(ctx,),
+            name=f"{name}_latency_recorder_thread", daemon=True,
+        ).start()
+    return _recorder
+
+
+def record_latency(exchange: str, symbol: str, stage: str, start_ms, end_ms):
+    if _recorder is None or start_ms is None or end_ms is None:
+        return
+    _recorder.record(exchange, symbol, stage, float(end_ms) - float(start_ms))
+
+
+def load_latency_histograms(
+    rc: redis.Redis, exchange: str = "*", symbol: str = "*"
+) -> Dict[Tuple[str, str, str], LatencyHistogram]:
+    """
+    return: {(exchange, symbol, stage): `LatencyHistogram`}
+    """
+    ret = {}
+    for key in rc.scan_iter(match=get_latency_key(exchange, symbol)):
+        if isinstance(key, bytes):
+            key = key.decode()
+        _, _, key_exchange, key_symbol = key.split(":", 3)
+        for field, count in rc.hgetall(key).items():
+            if isinstance(field, bytes):
+                field = field.decode()
+            stage, index = field.rsplit(":", 1)
+            hist = ret.setdefault((key_exchange, key_symbol, stage), LatencyHistogram())
+            hist.counts[int(index)] += int(count)
+    return ret
@@ -0,0 +1,166 @@
+import logging
+import threading
+from decimal import Decimal
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import ccxt
+
+from cross_arbitrage.utils.context import CancelContext, sleep_with_context
+from cross_arbitrage.utils.symbol_mapping import ExchangeSymbol, symbol_mapping
+
+
+class MarketMeta(NamedTuple):
+    """
+    the market facts of one (exchange, common symbol) the order path needs,
+    quantities in common symbol units, amounts in exchange contracts
+    """
+
+    exchange: str
+    symbol: str
+    exchange_symbol: str
+    multiplier: Decimal
+    contract_size: Decimal
+    # contract_size * multiplier, the qty of one exchange amount
+    bag_size: Decimal
+    # smallest qty `get_symbol_min_amount` allows for this exchange
+    min_qty: Decimal
+    # minimum order amount, None if the exchange has no limit
+    min_amount: Optional[Decimal]
+    amount_step: Decimal
+    price_step: Optional[Decimal]
+
+    def amount_to_precision(self, amount) -> Decimal:
+        """
+        truncate an exchange amount to the amount step, like
+        `ccxt.Exchange.amount_to_precision`
+        """
+        amount = Decimal(str(amount))
+        ret = (amount // self.amount_step) * self.amount_step
+        if ret == 0:
+            raise ccxt.ArgumentsRequired(
+                f"{self.exchange} amount of {self.exchange_symbol} must be greater "
+                f"than minimum amount precision of {self.amount_step}")
+        return ret
+
+
+def _precision_step(exchange: ccxt.Exchange, precision) -> Optional[Decimal]:
+    if precision is None:
+        return None
+    if exchange.precisionMode == ccxt.TICK_SIZE:
+        return Decimal(str(precision))
+    return Decimal(1).scaleb(-int(precision))
+
+
+def build_market_meta(ex_name: str, exchange: ccxt.Exchange, symbol: str,
+                      exchange_symbol: ExchangeSymbol) -> MarketMeta:
+    market = exchange.market(exchange_symbol.name)
+    multiplier = Decimal(exchange_symbol.multiplier)
+    contract_size = Decimal(str(market['contractSize']))
+    bag_size = contract_size * multiplier
+    amount_step = _precision_step(exchange, market['precision']['amount'])
+    match exchange:
+        case ccxt.okex():
+            min_qty = bag_size
+        case ccxt.binanceusdm():
+            min_qty = amount_step * multiplier
+        case _:
+            raise Exception(f"unsupport exchange: {ex_name}")
+    min_amount = market['limits']['amount']['min']
+    return MarketMeta(
+        exchange=ex_name,
+        symbol=symbol,
+        exchange_symbol=exchange_symbol.name,
+        multiplier=multiplier,
+        contract_size=contract_size,
+        bag_size=bag_size,
+        min_qty=min_qty,
+        min_amount=Decimal(str(min_amount)) if min_amount is not None else None,
+        amount_step=amount_step,
+        price_step=_precision_step(exchange, market['precision']['price']),
+    )
+
+
+class MarketMetaTable:
+    """
+    immutable `MarketMeta` rows of every mapped symbol, a refresh builds a
+    new table and swaps the module reference, so readers take no lock
+    """
+
+    def __init__(self, rows: Tuple[MarketMeta, ...]):
+        self.rows = rows
+        self.index: Dict[Tuple[str, str], int] = {
+            (row.exchange, row.symbol): i for i, row in enumerate(rows)
+        }
+
+    def get(self, ex_name: str, symbol: str) -> Optional[MarketMeta]:
+        i = self.index.get((ex_name, symbol))
+        return None if i is None else self.rows[i]
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, exchanges: Dict[str, ccxt.Exchange]) -> 'MarketMetaTable':
+        rows = []
+        for ex_name, exchange in exchanges.items():
+            exchange.load_markets()
+            for symbol, mapping in symbol_mapping.items():
+                if ex_name not in mapping:
+                    continue
+                try:
+                    rows.append(build_market_meta(ex_name, exchange, symbol, mapping[ex_name]))
+                except ccxt.BadSymbol:
+                    # mapped but not listed on the exchange
+                    continue
+        return cls(tuple(rows))
+
+
+_table: MarketMetaTable = MarketMetaTable(())
+_exchanges: Dict[str, ccxt.Exchange] = {}
+
+
+def get_market_meta(ex_name: str, symbol: str) -> Optional[MarketMeta]:
+    """
+    return: the `MarketMeta` of the current table, None if not loaded
+    """
+    return _table.get(ex_name, symbol)
+
+
+def refresh_market_meta(reload: bool = False) -> MarketMetaTable:
+    global _table
+    if reload:
+        for exchange in _exchanges.values():
+            exchange.load_markets(reload=True)
+    _table = MarketMetaTable.build(_exchanges)
+    return _table
+
+
+def market_meta_refresh_loop(ctx: CancelContext, interval: float):
+    while not ctx.is_canceled():
+        sleep_with_context(ctx, interval)
+        if ctx.is_canceled():
+            break
+        try:
+            table = refresh_market_meta(reload=True)
+            logging.info(f"--------> market meta refreshed: {len(table)} markets")
+        except Exception as ex:
+            logging.warning(f"refresh market meta failed: {type(ex)}: {ex}")
+
+
+def start_market_meta(
+    ctx: CancelContext, exchanges: Dict[str, ccxt.Exchange], name: str,
+    interval: float = 3600,
+) -> MarketMetaTable:
+    """
+    build the process wide table from the loaded markets of `exchanges` and
+    reload the markets every `interval` seconds in the background
+    """
+    started = bool(_exchanges)
+    _exchanges.update(exchanges)
+    table = refresh_market_meta()
+    if not started:
+        threading.Thread(
+            target=market_meta_refresh_loop, args=(ctx, interval),
+            name=f"{name}_market_meta_refresh_thread", daemon=True,
+        ).start()
+    return table
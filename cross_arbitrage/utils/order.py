@@ -11,7 +11,7 @@ from cross_arbitrage.order.globals import exchanges
 from cross_arbitrage.order.model import OrderSide
 from cross_arbitrage.order.order_book import OrderSignal
 from cross_arbitrage.order.position_status import PositionDirection
-from cross_arbitrage.utils.exchange import create_exchange, get_bag_size
+from cross_arbitrage.utils.exchange import create_exchange, get_exchange_market_meta
 from cross_arbitrage.utils.symbol_mapping import get_ccxt_symbol, get_common_symbol_from_ccxt, get_exchange_symbol, get_exchange_symbol_from_exchange
 
 
@@ -36,16 +36,11 @@ def get_order_status_key(order_id: str, ex_name: str):
 
 
 def normalize_order_qty(exchange: ccxt.Exchange, symbol: str, qty: Union[float, str, Decimal]):
-    exchange.load_markets()
-    
-    exchange_symbol = get_exchange_symbol_from_exchange(exchange, symbol)
-    symbol_info = exchange.market(exchange_symbol.name)
-    bag_size = get_bag_size(exchange, symbol)
+    meta = get_exchange_market_meta(exchange, symbol)
     match exchange:
         case ccxt.okex() | ccxt.binanceusdm():
-            exchange_amount = Decimal(str(qty)) / bag_size
-            aligned_exchange_amount = exchange.amount_to_precision(exchange_symbol.name, exchange_amount)
-            return Decimal(str(aligned_exchange_amount)) * bag_size
+            exchange_amount = Decimal(str(qty)) / meta.bag_size
+            return meta.amount_to_precision(exchange_amount) * meta.bag_size
         # case ccxt.binanceusdm():
         #     return Decimal(exchange.amount_to_precision(symbol, Decimal(str(qty)) / Decimal(str(exchange_symbol.multiplier)))) * Decimal(str(exchange_symbol.multiplier))
         case _:
@@ -0,0 +1,268 @@
+import orjson as json
+import pytest
+import redis
+
+from cross_arbitrage.config.redis import RedisConfig
+from cross_arbitrage.fetch.agg_orderbook import (_DRAIN_NOTIFY_SCRIPT,
+                                                 EntrySplicer, FusedAggregator,
+                                                 OrderbookAggregator,
+                                                 mark_raw_stale,
+                                                 raw_orderbook_stamps)
+from cross_arbitrage.fetch.staleness import FeedWatchdog
+from cross_arbitrage.fetch.utils.common import now_ms
+from cross_arbitrage.fetch.utils.redis import (get_ob_notify_key,
+                                               get_ob_stale_key,
+                                               get_ob_storage_key)
+
+
+class _Pipeline:
+    def __init__(self, rc):
+        self.rc = rc
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def rpop(self, key):
+        self.commands.append(lambda: self.rc.rpop(key))
+
+    def set(self, key, value):
+        self.commands.append(lambda: self.rc.data.__setitem__(key, value))
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self.commands.append(lambda: self.rc.xadd(stream, fields))
+
+    def execute(self):
+        ret = [command() for command in self.commands]
+        self.commands = []
+        return ret
+
+
+class _Redis:
+    """
+    the commands of the python aggregation, the drain script in python
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.lists = {}
+        self.streams = []
+        # raised by the aggregation script
+        self.script_error = AssertionError("not a python aggregation")
+
+    def register_script(self, script):
+        def drain(keys, args=(), client=None):
+            return [i + 1 for i, key in enumerate(keys) if self.rpop(key) is not None]
+
+        def unavailable(keys, args=(), client=None):
+            raise self.script_error
+
+        return drain if script == _DRAIN_NOTIFY_SCRIPT else unavailable
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    def rpop(self, key):
+        items = self.lists.get(key)
+        return items.pop() if items else None
+
+    def brpop(self, keys, timeout=0):
+        for key in keys:
+            item = self.rpop(key)
+            if item is not None:
+                return key.encode(), item
+        return None
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def xadd(self, stream, fields):
+        self.streams.append((stream, fields))
+        return b"0-1"
+
+
+def _ob(ex, symbol, ts):
+    return {"ex": ex, "symbol": symbol, "ts": ts, "bids": [[1, 1]], "asks": [[2, 1]]}
+
+
+def test_fused_aggregator_keeps_latest_books():
+    agg = FusedAggregator(
+        None, ["okex", "binance"], RedisConfig(url="", orderbook_stream="stream")
+    )
+    agg.publish([_ob("okex", "BTC/USDT", 1), _ob("binance", "BTC/USDT", 2)])
+    agg.publish([_ob("okex", "BTC/USDT", 3), _ob("okex", "ETH/USDT", 4)])
+
+    changes = agg._take(0)
+    assert [(symbol, ex) for symbol, ex, _ in changes] == [
+        ("BTC/USDT", "okex"), ("BTC/USDT", "binance"), ("ETH/USDT", "okex"),
+    ]
+    legs = changes[0][2]
+    assert legs["okex"]["ts"] == 3
+    assert legs["binance"]["ts"] == 2
+    assert "publish_ts" in legs["okex"]
+    # the ETH binance leg is still missing
+    assert changes[2][2]["binance"] is None
+    assert agg._take(0) == []
+
+
+def test_fused_aggregator_marks_watchdog_flagged_legs():
+    rc = _Redis()
+    agg = FusedAggregator(
+        rc, ["okex", "binance"], RedisConfig(url="", orderbook_stream="stream")
+    )
+    watchdog = FeedWatchdog(
+        "binance", {"BTCUSDT": "BTC/USDT"}, lambda name: None,
+        stale_seconds=5, stale_legs=agg.stale_legs,
+    )
+    watchdog.check(watchdog.last_update["BTCUSDT"] + 6)
+    assert agg.stale_legs == {("binance", "BTC/USDT")}
+
+    agg.publish([_ob("okex", "BTC/USDT", 1), _ob("binance", "BTC/USDT", 2)])
+    # the okex update is skipped, the binance one is added marked stale
+    assert agg.flush(0) == 1
+    entries = [json.loads(fields["BTC/USDT"]) for _, fields in rc.streams]
+    assert [e["exchange"] for e in entries] == ["binance"]
+    assert entries[0]["binance"]["stale"] is True
+    assert "stale" not in entries[0]["okex"]
+    # the snapshot keys are not marked
+    assert "stale" not in json.loads(rc.data[get_ob_storage_key("binance", "BTC/USDT")])
+
+    watchdog.touch("BTCUSDT")
+    watchdog.check()
+    assert not agg.stale_legs
+    rc.streams.clear()
+    agg.publish([_ob("okex", "BTC/USDT", 3)])
+    assert agg.flush(0) == 1
+    assert "stale" not in json.loads(rc.streams[0][1]["BTC/USDT"])["binance"]
+
+
+def test_entry_splicer_matches_decoded_entry():
+    exchanges = ["okex", "binance"]
+    legs = [
+        dict(_ob("okex", "BTC/USDT", 1), recv_ts=2.5, publish_ts=3.25),
+        _ob("binance", "BTC/USDT", 2),
+    ]
+    raws = [json.dumps(leg) for leg in legs]
+    raws[1] = mark_raw_stale(raws[1])
+
+    entry = EntrySplicer(exchanges).splice("BTC/USDT", 10, "okex", raws)
+    assert json.loads(entry) == {
+        "symbol": "BTC/USDT",
+        "ts": 10,
+        "exchange": "okex",
+        "okex": legs[0],
+        "binance": dict(legs[1], stale=True),
+    }
+    assert raw_orderbook_stamps(raws[0]) == {"ts": 1, "recv_ts": 2.5, "publish_ts": 3.25}
+
+
+def _aggregator(rc, symbols, freshness_ms=0):
+    return OrderbookAggregator(
+        rc, "test", symbols, ["okex", "binance"],
+        RedisConfig(url="", orderbook_stream="stream"),
+        freshness_ms=freshness_ms, use_script=False,
+    )
+
+
+def _notify(rc, ex, symbol):
+    rc.lpush(get_ob_notify_key(ex, symbol), b"1")
+
+
+def _store(rc, ex, symbol, recv_ts):
+    rc.data[get_ob_storage_key(ex, symbol)] = json.dumps(
+        dict(_ob(ex, symbol, 1), recv_ts=recv_ts))
+
+
+def test_orderbook_aggregator_wait_groups_notifies():
+    rc = _Redis()
+    agg = _aggregator(rc, ["BTC/USDT", "ETH/USDT", "BNB/USDT"])
+    assert agg.wait() == {}
+
+    _notify(rc, "binance", "ETH/USDT")
+    _notify(rc, "okex", "BTC/USDT")
+    _notify(rc, "binance", "BTC/USDT")
+    _notify(rc, "okex", "BNB/USDT")
+    # the drain script
+    assert agg.wait() == {
+        "BTC/USDT": ["okex", "binance"],
+        "ETH/USDT": ["binance"],
+        "BNB/USDT": ["okex"],
+    }
+    assert agg.wait() == {}
+
+    # the pipelined RPOP fallback maps the same indexes
+    agg.scripting = False
+    _notify(rc, "okex", "ETH/USDT")
+    _notify(rc, "binance", "BNB/USDT")
+    _notify(rc, "binance", "BNB/USDT")
+    assert agg.wait() == {"ETH/USDT": ["okex"], "BNB/USDT": ["binance"]}
+    # the second BNB notify is still pending
+    assert agg.wait() == {"BNB/USDT": ["binance"]}
+
+
+def test_orderbook_aggregator_python_path():
+    rc = _Redis()
+    agg = _aggregator(rc, ["BTC/USDT", "ETH/USDT", "BNB/USDT"], freshness_ms=1000)
+    now = now_ms()
+    for ex in ["okex", "binance"]:
+        _store(rc, ex, "BTC/USDT", now)
+        _store(rc, ex, "BNB/USDT", now)
+    # ETH binance is missing, no entry
+    _store(rc, "okex", "ETH/USDT", now)
+    # BNB okex is flagged by the watchdog
+    rc.data[get_ob_stale_key("okex", "BNB/USDT")] = b"1"
+
+    count = agg.aggregate({
+        "BTC/USDT": ["okex", "binance"],
+        "ETH/USDT": ["okex"],
+        "BNB/USDT": ["okex", "binance"],
+    })
+    entries = [json.loads(fields[symbol]) for _, fields in rc.streams for symbol in fields]
+    # BNB: the okex update is added with the stale leg marked, the binance
+    # update is skipped because its other leg is stale
+    assert count == 3
+    assert [(e["symbol"], e["exchange"]) for e in entries] == [
+        ("BTC/USDT", "okex"), ("BTC/USDT", "binance"), ("BNB/USDT", "okex"),
+    ]
+    assert entries[2]["okex"]["stale"] is True
+    assert "stale" not in entries[2]["binance"]
+    assert agg.stats.skipped == 1
+
+    # a leg older than the freshness skips the updates of the other exchange
+    rc.streams.clear()
+    _store(rc, "binance", "BTC/USDT", now - 5000)
+    assert agg.aggregate({"BTC/USDT": ["okex", "binance"]}) == 1
+    assert [json.loads(f["BTC/USDT"])["exchange"] for _, f in rc.streams] == ["binance"]
+
+
+def test_orderbook_aggregator_script_errors():
+    rc = _Redis()
+    agg = OrderbookAggregator(
+        rc, "test", ["BTC/USDT"], ["okex", "binance"],
+        RedisConfig(url="", orderbook_stream="stream"),
+    )
+    now = now_ms()
+    for ex in ["okex", "binance"]:
+        _store(rc, ex, "BTC/USDT", now)
+
+    # a failing call is raised, scripting stays on
+    rc.script_error = redis.exceptions.ResponseError(
+        "OOM command not allowed when used memory > 'maxmemory'.")
+    with pytest.raises(redis.exceptions.ResponseError):
+        agg.aggregate({"BTC/USDT": ["okex"]})
+    assert agg.scripting
+    assert rc.streams == []
+
+    # disabled scripting falls back to the python aggregation for good
+    rc.script_error = redis.exceptions.ResponseError(
+        "Command # 1 (EVALSHA abc 5) of pipeline caused error: unknown command 'EVALSHA'")
+    assert agg.aggregate({"BTC/USDT": ["okex"]}) == 1
+    assert not agg.scripting
+    assert agg.aggregate({"BTC/USDT": ["binance"]}) == 1
+    assert len(rc.streams) == 2
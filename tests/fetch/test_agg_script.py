@@ -0,0 +1,96 @@
+import os
+
+import orjson as json
+import pytest
+import redis
+
+from cross_arbitrage.config.redis import RedisConfig
+from cross_arbitrage.fetch.agg_orderbook import OrderbookAggregator
+from cross_arbitrage.fetch.utils.common import now_ms
+from cross_arbitrage.fetch.utils.redis import (get_ob_notify_key,
+                                               get_ob_stale_key,
+                                               get_ob_storage_key)
+
+# runs the aggregation script on the server at TEST_REDIS_URL (its db is
+# flushed), or in the lua interpreter of fakeredis
+REDIS_URL = os.environ.get("TEST_REDIS_URL")
+STREAM = "test_agg_script_stream"
+EXCHANGES = ["okex", "binance"]
+
+
+@pytest.fixture
+def rc():
+    if REDIS_URL:
+        rc = redis.Redis.from_url(REDIS_URL)
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        rc = fakeredis.FakeRedis()
+    rc.flushdb()
+    yield rc
+    rc.flushdb()
+
+
+def _store(rc, ex, symbol, recv_ts):
+    rc.set(get_ob_storage_key(ex, symbol), json.dumps({
+        "symbol": symbol, "ts": recv_ts - 5, "recv_ts": recv_ts,
+        "bids": [[1, 1]], "asks": [[2, 1]],
+    }))
+
+
+def _aggregate(rc, use_script, triggers):
+    rc.delete(STREAM)
+    agg = OrderbookAggregator(
+        rc, "test", list(triggers), EXCHANGES,
+        RedisConfig(url="", orderbook_stream=STREAM),
+        freshness_ms=1000, use_script=use_script,
+    )
+    begin = now_ms()
+    count = agg.aggregate(triggers)
+    end = now_ms()
+    assert agg.scripting
+    entries = [json.loads(v) for _, fields in rc.xrange(STREAM) for v in fields.values()]
+    for entry in entries:
+        # stamped with the local clock of the aggregator
+        assert begin <= entry.pop("ts") <= end
+    return count, agg.stats.skipped, entries
+
+
+def test_agg_script_matches_python(rc):
+    now = now_ms()
+    for ex in EXCHANGES:
+        _store(rc, ex, "BTC/USDT", now)
+        _store(rc, ex, "BNB/USDT", now)
+    _store(rc, "okex", "ETH/USDT", now)
+    _store(rc, "okex", "DOGE/USDT", now)
+    _store(rc, "binance", "DOGE/USDT", now - 5000)
+    rc.set(get_ob_stale_key("okex", "BNB/USDT"), b"1")
+    triggers = {
+        "BTC/USDT": ["okex", "binance"],
+        "ETH/USDT": ["okex"],
+        "BNB/USDT": ["okex", "binance"],
+        "DOGE/USDT": ["okex", "binance"],
+    }
+
+    script = _aggregate(rc, True, triggers)
+    python = _aggregate(rc, False, triggers)
+    assert script == python
+    count, skipped, entries = script
+    assert (count, skipped) == (4, 2)
+    assert [(e["symbol"], e["exchange"]) for e in entries] == [
+        ("BTC/USDT", "okex"), ("BTC/USDT", "binance"),
+        ("BNB/USDT", "okex"), ("DOGE/USDT", "binance"),
+    ]
+    assert entries[2]["okex"]["stale"] is True
+
+
+def test_drain_script(rc):
+    agg = OrderbookAggregator(
+        rc, "test", ["BTC/USDT", "ETH/USDT"], EXCHANGES,
+        RedisConfig(url="", orderbook_stream=STREAM),
+    )
+    for ex, symbol in [("binance", "ETH/USDT"), ("okex", "BTC/USDT"), ("binance", "BTC/USDT")]:
+        rc.lpush(get_ob_notify_key(ex, symbol), b"1")
+    assert agg.wait() == {"BTC/USDT": ["okex", "binance"], "ETH/USDT": ["binance"]}
+    assert agg.scripting
+    assert agg.wait(timeout=1) == {}
@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from cross_arbitrage.fetch.book_engine import (BboMerger, BboQuote,
+                                               BinanceBookSync, BookSide,
+                                               L2Book, OkexBookSync,
+                                               okex_checksum)
+
+
+def test_book_side():
+    bids = BookSide(descending=True)
+    for price, size in [("10.1", "1"), ("10.3", "2"), ("10.2", "3")]:
+        bids.update(price, size)
+    assert bids.top(5) == [("10.3", "2"), ("10.2", "3"), ("10.1", "1")]
+
+    bids.update("10.2", "4")
+    bids.update("10.3", "0")
+    bids.update("9.9", "0")
+    assert bids.top(5) == [("10.2", "4"), ("10.1", "1")]
+
+
+def test_okex_book_sync():
+    resubscribed = []
+    sync = OkexBookSync("BTC-USDT-SWAP", resubscribed.append)
+    book = L2Book()
+    book.reset([["100.1", "2"], ["100.0", "1"]], [["100.2", "3"]])
+    snapshot = {
+        "bids": [["100.1", "2", "0", "1"], ["100.0", "1", "0", "1"]],
+        "asks": [["100.2", "3", "0", "1"]],
+        "ts": "1",
+        "checksum": okex_checksum(book),
+        "prevSeqId": -1,
+        "seqId": 10,
+    }
+    assert sync.on_message("snapshot", snapshot) is sync.book
+
+    book.apply([["100.1", "0"]], [["100.3", "1"]])
+    update = {
+        "bids": [["100.1", "0", "0", "0"]],
+        "asks": [["100.3", "1", "0", "1"]],
+        "ts": "2",
+        "checksum": okex_checksum(book),
+        "prevSeqId": 10,
+        "seqId": 11,
+    }
+    assert sync.on_message("update", update) is sync.book
+    assert sync.book.top(5) == ([("100.0", "1")], [("100.2", "3"), ("100.3", "1")])
+
+    # sequence gap resubscribes and drops updates until a new snapshot
+    update = dict(update, prevSeqId=12, seqId=13)
+    assert sync.on_message("update", update) is None
+    assert resubscribed == ["BTC-USDT-SWAP"]
+    assert sync.on_message("update", dict(update, prevSeqId=13, seqId=14)) is None
+
+
+def _binance_event(first_id, last_id, prev_id, bids=(), asks=()):
+    return {
+        "e": "depthUpdate", "T": last_id, "s": "BTCUSDT",
+        "U": first_id, "u": last_id, "pu": prev_id,
+        "b": list(bids), "a": list(asks),
+    }
+
+
+def _wait_snapshot(sync):
+    # the snapshot may already be consumed when the executor was fast
+    if sync.snapshot_future is not None:
+        sync.snapshot_future.result()
+
+
+def test_binance_book_sync():
+    snapshots = [
+        {"lastUpdateId": 105, "bids": [["99", "1"]], "asks": [["101", "1"]]},
+        {"lastUpdateId": 200, "bids": [["98", "1"]], "asks": [["102", "1"]]},
+    ]
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        sync = BinanceBookSync("BTCUSDT", executor, lambda symbol: snapshots.pop(0))
+        assert sync.on_event(_binance_event(100, 103, 99)) is None
+        _wait_snapshot(sync)
+
+        # events before the snapshot are dropped, this one bridges it
+        book = sync.on_event(_binance_event(104, 110, 103, bids=[["99.5", "2"]]))
+        assert book is sync.book
+        assert book.top(5) == ([("99.5", "2"), ("99", "1")], [("101", "1")])
+
+        book = sync.on_event(_binance_event(111, 115, 110, asks=[["101", "0"]]))
+        assert book.top(5) == ([("99.5", "2"), ("99", "1")], [])
+
+        # gap on `pu` requests a new snapshot
+        sync.resync_time = 0
+        assert sync.on_event(_binance_event(190, 201, 180)) is None
+        assert sync.resync_count == 1
+        _wait_snapshot(sync)
+        book = sync.on_event(_binance_event(202, 205, 201, bids=[["97", "1"]]))
+        assert book.top(5) == ([("98", "1"), ("97", "1")], [("102", "1")])
+
+
+def test_bbo_merger():
+    merger = BboMerger()
+    quote = BboQuote(bid=("100.2", "1"), ask=("100.3", "2"), ts=5, version=12)
+    assert merger.on_bbo("BTCUSDT", quote) is None
+
+    bids = [["100.1", "3"], ["100.0", "4"]]
+    asks = [["100.4", "5"], ["100.5", "6"]]
+    # depth is newer, the quote is not applied
+    merged = merger.on_depth("BTCUSDT", bids, asks, 6, 13)
+    assert (merged.bids, merged.asks) == (bids, asks)
+
+    # quote crosses the first ask level, which is dropped
+    quote = BboQuote(bid=("100.2", "1"), ask=("100.45", "2"), ts=7, version=14)
+    merged = merger.on_bbo("BTCUSDT", quote)
+    assert merged.bids == [("100.2", "1"), ["100.1", "3"]]
+    assert merged.asks == [("100.45", "2"), ["100.5", "6"]]
+    assert (merged.depth_ts, merged.bbo_ts) == (6, 7)
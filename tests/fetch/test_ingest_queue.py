@@ -0,0 +1,75 @@
+from cross_arbitrage.fetch.ingest_queue import (PartitionedQueue,
+                                                binance_conflate_key,
+                                                binance_route_key,
+                                                okex_conflate_key,
+                                                okex_route_key)
+
+
+def test_route_key():
+    okex_msg = '{"arg":{"channel":"books5","instId":"BTC-USDT-SWAP"},"data":[{"asks":[],"bids":[],"instId":"BTC-USDT-SWAP","ts":"1"}]}'
+    binance_msg = '{"e":"depthUpdate","E":1,"T":1,"s":"BTCUSDT","U":1,"u":2,"b":[],"a":[]}'
+    assert okex_route_key(okex_msg) == "BTC-USDT-SWAP"
+    assert binance_route_key(binance_msg) == "BTCUSDT"
+    assert binance_route_key(binance_msg.encode()) == "BTCUSDT"
+    assert okex_route_key('{"event":"subscribe"}') is None
+
+
+def test_okex_conflate_key_skips_events():
+    data_msg = '{"arg":{"channel":"books","instId":"BTC-USDT-SWAP"},"action":"update","data":[]}'
+    assert okex_conflate_key(data_msg) == ("books", "BTC-USDT-SWAP")
+    assert okex_conflate_key(data_msg.encode()) == ("books", "BTC-USDT-SWAP")
+    ack_msg = '{"event":"subscribe","arg":{"channel":"books","instId":"BTC-USDT-SWAP"}}'
+    assert okex_conflate_key(ack_msg) is None
+    assert okex_conflate_key(ack_msg.encode()) is None
+    error_msg = '{"event":"error","code":"60012","msg":"Invalid request: {\\"channel\\":\\"books\\",\\"instId\\":\\"BTC-USDT-SWAP\\"}"}'
+    assert okex_conflate_key(error_msg) is None
+
+
+def test_partitioned_queue_keeps_symbol_order():
+    q = PartitionedQueue("binance", 4, binance_route_key)
+    symbols = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "APEUSDT", "ARBUSDT"]
+    for i in range(10):
+        for s in symbols:
+            q.put(f'{{"e":"depthUpdate","s":"{s}","u":{i}}}')
+    assert q.qsize() == 50
+
+    for s in symbols:
+        partition = q[q.partition_index(s)]
+        items = [m for _, m, _ in list(partition.queue) if f'"s":"{s}"' in m]
+        assert items == [f'{{"e":"depthUpdate","s":"{s}","u":{i}}}' for i in range(10)]
+
+
+def test_connection_queue_counts_messages():
+    q = PartitionedQueue("binance", 2, binance_route_key)
+    conn = q.connection(1, "binance/0/1")
+    conn.put('{"e":"depthUpdate","s":"BTCUSDT","u":1}', 1.0)
+    conn.put('{"e":"depthUpdate","s":"ETHUSDT","u":1}', 2.0)
+    assert (conn.name, conn.message_count) == ("binance/0/1", 2)
+    assert q.message_count == 2
+    partition = q[q.partition_index("BTCUSDT")]
+    assert list(partition.queue)[0] == (1.0, '{"e":"depthUpdate","s":"BTCUSDT","u":1}', 1)
+
+
+def test_conflating_partition_keeps_latest():
+    q = PartitionedQueue("binance", 1, binance_route_key, binance_conflate_key)
+    for i in range(3):
+        q.put(f'{{"e":"depthUpdate","s":"BTCUSDT","u":{i}}}', float(i))
+        q.put(f'{{"e":"depthUpdate","s":"ETHUSDT","u":{i}}}', float(i))
+    q.put('{"e":"bookTicker","s":"BTCUSDT","u":9}', 3.0)
+    q.put('{"result":null,"id":1}', 4.0)
+    q.put('{"result":null,"id":2}', 5.0)
+    # a lagging redundant connection does not overwrite the other one
+    q.put('{"e":"depthUpdate","s":"BTCUSDT","u":1}', 6.0, conn_id=1)
+
+    partition = q[0]
+    assert partition.qsize() == 6
+    assert partition.conflated_count == 4
+    items = [partition.get_nowait() for _ in range(partition.qsize())]
+    assert items == [
+        (2.0, '{"e":"depthUpdate","s":"BTCUSDT","u":2}', 0),
+        (2.0, '{"e":"depthUpdate","s":"ETHUSDT","u":2}', 0),
+        (3.0, '{"e":"bookTicker","s":"BTCUSDT","u":9}', 0),
+        (4.0, '{"result":null,"id":1}', 0),
+        (5.0, '{"result":null,"id":2}', 0),
+        (6.0, '{"e":"depthUpdate","s":"BTCUSDT","u":1}', 1),
+    ]
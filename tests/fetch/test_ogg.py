@@ -1,4 +1,9 @@
-from cross_arbitrage.fetch.fetch_orderbook import normalize_orderbook_5
+from decimal import Decimal
+
+from cross_arbitrage.fetch.utils.orderbook import normalize_orderbook_5
+from cross_arbitrage.fetch.utils.orderbook import (best_price, book_array,
+                                                   level_price_decimal,
+                                                   normalize_levels_to_ticks)
 
 
 def test_normalize_orderbook():
@@ -19,3 +24,24 @@ def test_normalize_orderbook():
 
     res = normalize_orderbook_5(ask, 1000)
     assert res == expect
+
+
+def test_normalize_levels_to_ticks():
+    ask = [
+        ["7403.89", "0.002"],
+        ["7403.90", "3.906"],
+        ["7404.00", "1.428"],
+    ]
+    res = normalize_levels_to_ticks(ask, 0.01)
+    assert res == [[740389, 0.002], [740390, 3.906], [740400, 1.428]]
+
+    # same orderbook in tick format, with a 1000 multiplier
+    ob = {"tick": 0.00001, "asks": res, "bids": [[740388, 1.0]]}
+    assert level_price_decimal(ob, "asks") == Decimal("7.40389")
+    assert abs(best_price(ob, "bids") - 7.40388) < 1e-12
+    assert book_array(ob, "asks").shape == (3, 2)
+
+    # legacy string format
+    ob = {"asks": [["7.40389", "0.002"]]}
+    assert level_price_decimal(ob, "asks") == Decimal("7.40389")
+    assert best_price(ob, "asks") == 7.40389
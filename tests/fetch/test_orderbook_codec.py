@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+import numpy as np
+
+from cross_arbitrage.fetch.utils.orderbook import (best_price, book_array,
+                                                   level_price_decimal)
+from cross_arbitrage.fetch.utils.orderbook_codec import (decode_orderbook_entry,
+                                                         encode_orderbook_entry)
+
+
+def test_orderbook_entry_round_trip():
+    legs = {
+        "okex": {
+            "ex": "okex", "symbol": "BTC/USDT", "ts": 1000, "tick": 0.1,
+            "bids": [[300000, 1.5], [299999, 2.0]], "asks": [[300001, 0.25]],
+            "recv_ts": 1003.125, "decode_ts": 1003.25, "publish_ts": 1003.5,
+        },
+        "binance": {
+            "ex": "binance", "symbol": "BTC/USDT", "ts": 1001,
+            "bids": [["30000.1", "3"]], "asks": [["30000.2", "4"], ["30000.3", "5"], ["30000.4", "6"]],
+            "stale": True,
+        },
+    }
+    raw = encode_orderbook_entry(["okex", "binance"], 1010, "binance", legs)
+    # the readers may list the exchanges in another order
+    entry = decode_orderbook_entry(["binance", "okex"], "BTC/USDT", raw)
+
+    assert entry["symbol"] == "BTC/USDT"
+    assert entry["ts"] == 1010
+    assert entry["exchange"] == "binance"
+    okex, binance = entry["okex"], entry["binance"]
+    assert okex["ts"] == 1000
+    assert (okex["recv_ts"], okex["decode_ts"], okex["publish_ts"]) == (1003.125, 1003.25, 1003.5)
+    assert okex["tick"] == 0.1
+    assert not okex.get("stale")
+    assert np.array_equal(okex["bids"], [[300000, 1.5], [299999, 2.0]])
+    assert level_price_decimal(okex, "asks") == Decimal("30000.1")
+    assert binance["recv_ts"] is None
+    assert binance["stale"]
+    assert "tick" not in binance
+    assert len(binance["asks"]) == 3
+    assert best_price(binance, "asks") == 30000.2
+    assert level_price_decimal(binance, "bids") == Decimal("30000.1")
+    assert book_array(binance, "asks")[:, 1].tolist() == [4, 5, 6]
+    # 5 + 7 * 2 int64 header, (1 + 4 * 3) float64 per leg
+    assert len(raw) == 19 * 8 + 2 * 13 * 8
+    # little endian whatever the host is: the version, then 2 legs
+    assert raw[:16] == (2).to_bytes(8, "little") + (2).to_bytes(8, "little")
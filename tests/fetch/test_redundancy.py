@@ -0,0 +1,25 @@
+from cross_arbitrage.fetch.redundancy import (FirstArrivalFilter,
+                                              RedundancyStats)
+
+
+def test_first_arrival_filter():
+    stats = RedundancyStats("binance ws", 2)
+    arrival = FirstArrivalFilter(stats)
+    key = ("depthUpdate", "BTCUSDT")
+
+    assert arrival.accept(key, 10, 0, 100.002, 100.0)
+    # same update id from the other connection 3ms later
+    assert not arrival.accept(key, 10, 1, 100.005, 100.0)
+    assert arrival.accept(key, 11, 1, 100.006, 100.001)
+    # older update from a lagging connection
+    assert not arrival.accept(key, 10, 0, 100.010, 100.0)
+
+    conn0, conn1 = stats.connections
+    assert (conn0.wins, conn0.duplicates) == (1, 1)
+    assert (conn1.wins, conn1.duplicates) == (1, 1)
+    assert abs(conn1.behind_sum - 0.003) < 1e-9
+
+    # timestamps are not strict, a sequence restart is forced
+    assert arrival.accept(("books5", "BTC-USDT-SWAP"), 1000, 0, 1.0, 1.0, strict=False)
+    assert arrival.accept(("books5", "BTC-USDT-SWAP"), 1000, 1, 1.0, 1.0, strict=False)
+    assert arrival.accept(key, 3, 0, 100.02, 100.0, force=True)
@@ -0,0 +1,35 @@
+from cross_arbitrage.fetch.staleness import FeedWatchdog
+from cross_arbitrage.fetch.utils.orderbook import is_stale_orderbook
+
+
+def test_feed_watchdog_resubscribes_silent_symbol():
+    resubscribed = []
+    watchdog = FeedWatchdog(
+        "okex", {"BTC-USDT-SWAP": "BTC/USDT", "ETH-USDT-SWAP": "ETH/USDT"},
+        resubscribed.append, stale_seconds=5,
+    )
+    start = watchdog.last_update["BTC-USDT-SWAP"]
+    watchdog.last_update["BTC-USDT-SWAP"] = start + 4
+
+    assert watchdog.check(start + 3) == []
+    # ETH never updated since the start
+    assert watchdog.check(start + 6) == ["ETH-USDT-SWAP"]
+    # not again until another `stale_seconds`
+    assert watchdog.check(start + 8) == []
+    assert watchdog.check(start + 11) == ["BTC-USDT-SWAP", "ETH-USDT-SWAP"]
+    assert resubscribed == ["ETH-USDT-SWAP", "BTC-USDT-SWAP", "ETH-USDT-SWAP"]
+
+    watchdog.last_update["ETH-USDT-SWAP"] = start + 12
+    assert watchdog.check(start + 13) == []
+    assert "ETH-USDT-SWAP" not in watchdog.stale
+    assert "BTC-USDT-SWAP" in watchdog.stale
+
+
+def test_is_stale_orderbook():
+    ob = {"ts": 1000, "recv_ts": 1005.0}
+    assert not is_stale_orderbook("okex", ob, 2000, 0)
+    assert not is_stale_orderbook("okex", ob, 1100, 100)
+    assert is_stale_orderbook("okex", ob, 1106, 100)
+    assert is_stale_orderbook("okex", dict(ob, stale=True), 1006, 0)
+    # without a receive time, the exchange time
+    assert is_stale_orderbook("okex", {"ts": 1000}, 1101, 100)
@@ -0,0 +1,45 @@
+import numpy as np
+
+from cross_arbitrage.order.order_book import (evaluate_signal_rows,
+                                              get_signal_stage_ts)
+from cross_arbitrage.utils import clock
+from cross_arbitrage.utils.clock import ClockSample, ExchangeClock
+
+
+def test_evaluate_signal_rows():
+    nan = np.nan
+    prices = np.array([
+        # maker ask, taker ask, maker bid, taker bid
+        [101.0, 100.0, 99.0, 98.0],  # maker ask above the taker ask: sell
+        [100.0, 100.0, 97.0, 99.0],  # maker bid below the taker bid: buy
+        [100.0, 100.0, 99.0, 99.0],  # none
+        [nan, 100.0, 97.0, 99.0],  # empty maker asks, still a buy
+        [101.0, nan, nan, 99.0],  # empty sides never fire
+        [101.0, 100.0, 97.0, 99.0],  # both: sell first
+    ])
+    factors = np.array([[1.005, 0.995]] * len(prices))
+
+    sell, buy = evaluate_signal_rows(prices, factors)
+    assert sell.tolist() == [True, False, False, False, False, True]
+    assert buy.tolist() == [False, True, False, True, False, False]
+
+
+def test_signal_stage_ts_uses_trigger_clock(monkeypatch):
+    clocks = {}
+    for ex_name, offset in [("okex", 50.0), ("binance", -30.0)]:
+        clocks[ex_name] = ExchangeClock(ex_name, lambda: 0)
+        clocks[ex_name].estimate = ClockSample(offset=offset, rtt=1.0, ts=0.0)
+    monkeypatch.setattr(clock, "_clocks", clocks)
+
+    ob = {
+        "exchange": "binance",
+        "ts": 1100.0,
+        "okex": {"ts": 1000.0},
+        "binance": {"ts": 1000.0, "recv_ts": 1040.0},
+    }
+    stage_ts = get_signal_stage_ts(ob)
+    assert stage_ts.exchange == 1030.0
+    assert stage_ts.ws_recv == 1040.0
+
+    ob["exchange"] = "okex"
+    assert get_signal_stage_ts(ob).exchange == 950.0
@@ -0,0 +1,37 @@
+import pytest
+
+from cross_arbitrage.order.config import OrderConfig
+
+
+def _config(symbol_datas):
+    return OrderConfig.load({
+        "log": {"level": "info", "dir": "/tmp"},
+        "redis": {"url": "redis://localhost:6379/3", "orderbook_stream": "stream:orderbook"},
+        "network": {},
+        "exchanges": {},
+        "dyn_threshold": {},
+        "output_data": {"order_loop": "order_loop.csv"},
+        "cross_arbitrage_symbol_datas": symbol_datas,
+    })
+
+
+def test_symbol_index():
+    config = _config([
+        {"symbol_name": "BTC/USDT", "makeonly_exchange_name": "[both]"},
+        {"symbol_name": "ETH/USDT"},
+    ])
+    assert config.symbol_names() == {"BTC/USDT", "ETH/USDT"}
+    assert [d.makeonly_exchange_name for d in config.get_symbol_datas("BTC/USDT")] == ["binance", "okex"]
+    eth = config.get_symbol_data_by_makeonly("ETH/USDT", "okex")
+    assert eth is config.get_symbol_datas("ETH/USDT")[0]
+    assert eth.max_notional_per_symbol == 100.0
+
+    with pytest.raises(Exception):
+        config.get_symbol_datas("XMR/USDT")
+    with pytest.raises(Exception):
+        config.get_symbol_data_by_makeonly("ETH/USDT", "binance")
+
+    config.cross_arbitrage_symbol_datas.append(
+        config.cross_arbitrage_symbol_datas[-1].copy(update={"symbol_name": "XMR/USDT"}))
+    config.build_symbol_index()
+    assert "XMR/USDT" in config.symbol_names()
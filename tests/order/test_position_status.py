@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+import orjson
+
+from cross_arbitrage.order import position_status
+from cross_arbitrage.order.position_status import (PositionDirection,
+                                                   PositionMirror,
+                                                   PositionStatus,
+                                                   get_mirrored_position_status)
+
+
+def _message(field: str, position: PositionStatus) -> bytes:
+    return orjson.dumps({'field': field, 'data': position.dict()},
+                        default=position_status._json_default)
+
+
+def test_position_mirror():
+    mirror = PositionMirror("redis://localhost:6379/3")
+    long = PositionStatus(direction=PositionDirection.long, qty=Decimal("1.5"),
+                          avg_price=Decimal("100.1"))
+
+    mirror.apply_message(_message("okex:BTC/USDT", long))
+    assert mirror.version == 1
+    assert mirror.get("okex", "BTC/USDT") == long
+    assert mirror.get("binance", "BTC/USDT") is None
+
+    # the same position from a resync is not a change
+    assert not mirror.apply(b"okex:BTC/USDT", orjson.dumps(long.dict(), default=position_status._json_default))
+    assert mirror.version == 1
+
+    short = long.copy(update={"direction": PositionDirection.short})
+    mirror.apply_message(_message("okex:BTC/USDT", short))
+    assert mirror.version == 2
+    assert mirror.get("okex", "BTC/USDT").direction == PositionDirection.short
+
+
+def test_get_mirrored_position_status(monkeypatch):
+    mirror = PositionMirror("redis://localhost:6379/3")
+    monkeypatch.setattr(position_status, "_position_mirror", mirror)
+    # not loaded yet, the callers read redis
+    assert get_mirrored_position_status("okex", "BTC/USDT") == (False, None)
+
+    mirror.ready = True
+    assert get_mirrored_position_status("okex", "BTC/USDT") == (True, None)
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+from cross_arbitrage.config.symbol import SymbolConfig as SymbolData
+from cross_arbitrage.config.symbol import ThresholdConfig as ThresholdData
+from cross_arbitrage.order.threshold import SymbolConfig, Threshold
+
+
+class _Redis:
+    def __init__(self):
+        self.data = {}
+
+    def hgetall(self, key):
+        return dict(self.data)
+
+
+def _config():
+    return SimpleNamespace(
+        debug=False,
+        cross_arbitrage_symbol_datas=[
+            SymbolData(
+                symbol_name="BTC/USDT",
+                makeonly_exchange_name="okex",
+                long_threshold_data=ThresholdData(
+                    increase_position_threshold=-0.0012,
+                    decrease_position_threshold=-0.0002,
+                    cancel_increase_position_threshold=-0.0006,
+                    cancel_decrease_position_threshold=-0.0001,
+                ),
+                short_threshold_data=ThresholdData(
+                    increase_position_threshold=0.0012,
+                    decrease_position_threshold=0.0002,
+                    cancel_increase_position_threshold=0.0006,
+                    cancel_decrease_position_threshold=0.0001,
+                ),
+            ),
+            SymbolData(symbol_name="ETH/USDT", makeonly_exchange_name="binance"),
+        ],
+    )
+
+
+def test_threshold_snapshot():
+    rc = _Redis()
+    threshold = Threshold(_config(), rc, makeonly_exchange="okex")
+
+    # the config thresholds before any refresh
+    snapshot = threshold.snapshot
+    assert snapshot.version == 1
+    assert list(snapshot.thresholds) == ["BTC/USDT"]
+    btc = snapshot.thresholds["BTC/USDT"]
+    assert btc.short_increase == 0.0012
+    assert btc.long_cancel_decrease == -0.0001
+
+    # unchanged thresholds keep the version
+    threshold.refresh_thresholds()
+    assert threshold.snapshot is snapshot
+
+    dyn = threshold.get_symbol_thresholds("BTC/USDT").copy(deep=True)
+    dyn.short_threshold.increase_position_threshold = dyn.short_threshold.increase_position_threshold * 2
+    rc.data[b"BTC/USDT"] = dyn.json_bytes()
+    threshold.refresh_thresholds()
+    assert threshold.snapshot.version == 2
+    assert threshold.snapshot.thresholds["BTC/USDT"].short_increase == 0.0024
+    assert isinstance(threshold.get_symbol_thresholds("BTC/USDT"), SymbolConfig)
+    # the old snapshot is untouched
+    assert snapshot.thresholds["BTC/USDT"].short_increase == 0.0012
@@ -0,0 +1,42 @@
+import itertools
+import time
+
+from cross_arbitrage.utils.clock import ExchangeClock
+
+
+def _fake_fetch_time(offset_ms: float, delays: list):
+    """
+    server time `offset_ms` ahead, stamped after half of each request delay
+    """
+    delay_iter = itertools.cycle(delays)
+
+    def fetch_time_ms():
+        delay = next(delay_iter)
+        time.sleep(delay / 2)
+        server_ms = time.time() * 1000 + offset_ms
+        time.sleep(delay / 2)
+        return server_ms
+
+    return fetch_time_ms
+
+
+def test_exchange_clock_keeps_min_rtt_sample():
+    clock = ExchangeClock("test", _fake_fetch_time(500, [0.03, 0.002, 0.02]), samples_per_round=3)
+    assert clock.offset == 0.0
+
+    estimate = clock.update()
+    assert estimate.rtt < 15
+    assert abs(clock.offset - 500) < 5
+
+
+def test_exchange_clock_failed_round_keeps_estimate():
+    clock = ExchangeClock("test", _fake_fetch_time(-200, [0.001]), samples_per_round=2)
+    clock.update()
+    offset = clock.offset
+
+    def failing():
+        raise TimeoutError("timeout")
+
+    clock.fetch_time_ms = failing
+    assert clock.update() is not None
+    assert clock.offset == offset
@@ -103,6 +103,17 @@ def test_csv_model_stat():
         'signal.maker_position.avg_price',
         'signal.maker_position.mark_price',
         'signal.is_reduce_position',
+        'signal.stage_ts.exchange',
+        'signal.stage_ts.ws_recv',
+        'signal.stage_ts.decode',
+        'signal.stage_ts.publish',
+        'signal.stage_ts.agg',
+        'signal.stage_ts.order_read',
+        'signal.stage_ts.signal',
+        'signal.stage_ts.maker_sent',
+        'signal.stage_ts.maker_ack',
+        'signal.stage_ts.taker_sent',
+        'signal.stage_ts.taker_ack',
         'status.timestamp',
         'status.status',
         'status.order_id',
@@ -131,6 +142,17 @@ def test_csv_model_stat():
         'signal.maker_position.avg_price': None,
         'signal.maker_position.mark_price': None,
         'signal.is_reduce_position': False,
+        'signal.stage_ts.exchange': None,
+        'signal.stage_ts.ws_recv': None,
+        'signal.stage_ts.decode': None,
+        'signal.stage_ts.publish': None,
+        'signal.stage_ts.agg': None,
+        'signal.stage_ts.order_read': None,
+        'signal.stage_ts.signal': None,
+        'signal.stage_ts.maker_sent': None,
+        'signal.stage_ts.maker_ack': None,
+        'signal.stage_ts.taker_sent': None,
+        'signal.stage_ts.taker_ack': None,
         'status.status': 'ok',
         'status.order_id': None,
         'status.post_qty': None,
@@ -0,0 +1,16 @@
+from cross_arbitrage.utils.latency import LATENCY_BUCKETS, LatencyHistogram
+
+
+def test_latency_histogram_percentile():
+    hist = LatencyHistogram()
+    assert hist.percentile(0.5) is None
+    for ms in range(1, 101):
+        hist.add(float(ms))
+    assert hist.total == 100
+    p50, p90, p99 = (hist.percentile(q) for q in (0.5, 0.9, 0.99))
+    # bucket upper bounds are at most 20% above the value
+    assert 50 <= p50 <= 60
+    assert 90 <= p90 <= 108
+    assert 99 <= p99 <= 119
+    hist.add(10 ** 9)
+    assert hist.percentile(1.0) == LATENCY_BUCKETS[-1]
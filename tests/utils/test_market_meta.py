@@ -0,0 +1,95 @@
+from decimal import Decimal
+
+import ccxt
+import pytest
+
+from cross_arbitrage.exchange.stub_exchange import StubBinanceUsdm, StubOkex
+from cross_arbitrage.order.market import align_qty
+from cross_arbitrage.utils import market_meta
+from cross_arbitrage.utils.context import CancelContext
+from cross_arbitrage.utils.exchange import get_bag_size, get_symbol_min_amount
+from cross_arbitrage.utils.market_meta import MarketMetaTable, get_market_meta
+from cross_arbitrage.utils.order import normalize_order_qty
+from cross_arbitrage.utils.symbol_mapping import init_symbol_mapping
+
+
+def _market(market_id, symbol, contract_size, amount_precision, price_precision, min_amount):
+    return {
+        market_id: {
+            "id": market_id,
+            "symbol": symbol,
+            "spot": False,
+            "contractSize": contract_size,
+            "precision": {"amount": amount_precision, "price": price_precision},
+            "limits": {"amount": {"min": min_amount}},
+        }
+    }
+
+
+@pytest.fixture()
+def exchanges():
+    init_symbol_mapping({
+        "APE/USDT": {"okex": "APE-USDT-SWAP", "binance": "APEUSDT"},
+        "PEPE/USDT": {
+            "okex": "PEPE-USDT-SWAP",
+            "binance": {"name": "1000PEPEUSDT", "multiplier": 1000},
+        },
+        "NOPE/USDT": {"okex": "NOPE-USDT-SWAP"},
+    })
+    okex = StubOkex({
+        **_market("APE-USDT-SWAP", "APE/USDT:USDT", 0.1, 1.0, 0.001, 1.0),
+        **_market("PEPE-USDT-SWAP", "PEPE/USDT:USDT", 10000000, 1.0, 1e-9, 1.0),
+    })
+    binance = StubBinanceUsdm({
+        **_market("APEUSDT", "APE/USDT:USDT", 1, 0, 4, 1),
+        **_market("1000PEPEUSDT", "1000PEPE/USDT:USDT", 1, 0, 7, 1),
+    })
+    yield {"okex": okex, "binance": binance}
+    market_meta._exchanges.clear()
+    market_meta._table = MarketMetaTable(())
+
+
+def test_market_meta_table(exchanges):
+    table = MarketMetaTable.build(exchanges)
+    # NOPE is not listed
+    assert len(table) == 4
+    assert table.get("okex", "NOPE/USDT") is None
+
+    okex_ape = table.get("okex", "APE/USDT")
+    assert okex_ape.bag_size == Decimal("0.1")
+    assert okex_ape.amount_step == Decimal("1.0")
+    assert okex_ape.price_step == Decimal("0.001")
+    binance_pepe = table.get("binance", "PEPE/USDT")
+    assert binance_pepe.exchange_symbol == "1000PEPEUSDT"
+    assert binance_pepe.bag_size == Decimal(1000)
+    assert binance_pepe.min_qty == Decimal(1000)
+    assert binance_pepe.min_amount == Decimal(1)
+
+
+def test_amount_to_precision_matches_ccxt(exchanges):
+    table = MarketMetaTable.build(exchanges)
+    for ex_name, symbol, ccxt_symbol in [
+        ("okex", "APE/USDT", "APE/USDT:USDT"),
+        ("binance", "APE/USDT", "APE/USDT:USDT"),
+    ]:
+        meta = table.get(ex_name, symbol)
+        for amount in ["127.9", "1", "3.5"]:
+            assert meta.amount_to_precision(amount) == Decimal(
+                exchanges[ex_name].amount_to_precision(ccxt_symbol, amount))
+        with pytest.raises(ccxt.ArgumentsRequired):
+            meta.amount_to_precision("0.3")
+
+
+def test_helpers_use_table(exchanges):
+    table = market_meta.start_market_meta(CancelContext(), exchanges, "test")
+    assert get_market_meta("okex", "APE/USDT") is table.get("okex", "APE/USDT")
+
+    assert get_symbol_min_amount(exchanges, "APE/USDT") == Decimal(1)
+    assert get_symbol_min_amount(exchanges, "PEPE/USDT") == Decimal(10000000)
+    assert get_bag_size(exchanges["okex"], "PEPE/USDT") == Decimal(10000000)
+    assert normalize_order_qty(exchanges["okex"], "APE/USDT", "12.79") == Decimal("12.7")
+    assert normalize_order_qty(exchanges["binance"], "APE/USDT", "12.79") == Decimal("12")
+    assert align_qty(exchanges["binance"], "PEPE/USDT", Decimal("29660000")) == (
+        Decimal("29660000"), Decimal(0))
+    assert align_qty(exchanges["okex"], "PEPE/USDT", Decimal("29660000")) == (
+        Decimal("20000000"), Decimal("9660000"))